@@ -0,0 +1,9 @@
+"""Offline benchmarks for the PyGit CLI operations.
+
+    python -m benchmarks.generate <dir> [shape options]     build a synthetic repo
+    python -m benchmarks.run [shape options]                time add/commit/status/
+                                                            checkout/merge/log and
+                                                            compare with a baseline
+
+See benchmarks/run.py for the measurements and the regression thresholds.
+"""
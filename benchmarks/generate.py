@@ -0,0 +1,134 @@
+"""Synthetic repository generator.
+
+A shape fixes the file count, directory depth, file size range (log-uniform,
+so most files are small and a few are large), number of commits, number of
+branches forked off the history and the share of binary-like files. The same
+shape and seed always produce the same tree and history.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pygit_v3 import PyGit  # noqa: E402
+
+SHAPES = {
+    "small": {"files": 200, "depth": 2, "min_size": 64, "max_size": 16 * 1024,
+              "commits": 20, "branches": 2, "binary_share": 0.1},
+    "medium": {"files": 5000, "depth": 4, "min_size": 64, "max_size": 64 * 1024,
+               "commits": 100, "branches": 4, "binary_share": 0.1},
+    "large": {"files": 50000, "depth": 6, "min_size": 64, "max_size": 256 * 1024,
+              "commits": 200, "branches": 8, "binary_share": 0.05},
+}
+
+# PyGit reads worktree files as text, so "binary" files are control-character
+# heavy content that still decodes, like generated or minified assets
+BINARY_ALPHABET = "".join(chr(c) for c in range(1, 32) if chr(c) not in "\r\n") + "\x7fÿĀ☃"
+TEXT_WORDS = ["index", "commit", "branch", "merge", "object", "pack", "status", "tree",
+              "hash", "blob", "remote", "fetch", "push", "tag", "log", "diff"]
+
+
+def add_shape_arguments(parser):
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="small",
+                        help="preset to start from (default: small)")
+    for key, value in SHAPES["small"].items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=None,
+                            help=f"override the preset's {key}")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def shape_from_args(args):
+    shape = dict(SHAPES[args.shape])
+    for key in shape:
+        value = getattr(args, key)
+        if value is not None:
+            shape[key] = value
+    shape["seed"] = args.seed
+    return shape
+
+
+def _content(rng, size, binary):
+    if binary:
+        return "".join(rng.choice(BINARY_ALPHABET) for _ in range(size))
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(TEXT_WORDS) for _ in range(rng.randint(4, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size] + "\n"
+
+
+def _file_paths(rng, count, depth):
+    paths = []
+    for number in range(count):
+        parts = [f"d{rng.randrange(8)}" for _ in range(rng.randint(0, depth))]
+        paths.append("/".join(parts + [f"file{number}.txt"]))
+    return paths
+
+
+def _quiet(call, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return call(*args)
+
+
+def generate_repo(path, files, depth, min_size, max_size, commits, branches, binary_share, seed=0):
+    """Create a PyGit repository of the given shape at path (which must not exist)"""
+    rng = random.Random(seed)
+    root = Path(path)
+    root.mkdir(parents=True)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        pygit = PyGit()
+        _quiet(pygit.init)
+        with open(pygit.config_path, 'w') as f:
+            json.dump({"maintenance.auto": False}, f)
+
+        paths = _file_paths(rng, files, depth)
+        binary = set(rng.sample(paths, int(len(paths) * binary_share)))
+
+        def write(rel_path):
+            size = int(min_size * (max_size / min_size) ** rng.random())
+            target = Path(rel_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, 'w') as f:
+                f.write(_content(rng, size, rel_path in binary))
+
+        for rel_path in paths:
+            write(rel_path)
+        _quiet(pygit.add, ".")
+        _quiet(pygit.commit, "initial import")
+
+        # Later commits touch a few percent of the files each
+        branch_points = set(rng.sample(range(1, max(commits, 2)), min(branches, max(commits - 1, 0))))
+        for number in range(1, commits):
+            for rel_path in rng.sample(paths, max(1, len(paths) // 50)):
+                write(rel_path)
+            _quiet(pygit.add, ".")
+            _quiet(pygit.commit, f"change {number}")
+            if number in branch_points:
+                _quiet(pygit.branch, f"branch{sorted(branch_points).index(number)}")
+    finally:
+        os.chdir(cwd)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PyGit repository")
+    parser.add_argument("path")
+    add_shape_arguments(parser)
+    args = parser.parse_args()
+    shape = shape_from_args(args)
+    generate_repo(args.path, **shape)
+    print(f"Generated {args.path}: " + ", ".join(f"{key}={value}" for key, value in shape.items()))
+
+
+if __name__ == "__main__":
+    main()
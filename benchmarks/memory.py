@@ -0,0 +1,83 @@
+"""Memory per entry of the in-memory index and tree listings.
+
+    python -m benchmarks.memory [--entries N] [--depth D] [--seed S]
+
+Builds N synthetic paths with random SHA-1s and measures, with tracemalloc,
+what holding them costs as plain str -> str dicts (what json.load gives)
+and as the CompactPathMaps that staged files and commit trees are kept in,
+both for one map and for the index plus HEAD tree pair status works with.
+Also times building each (the compact map from a parsed dict, as when the
+index or a commit is loaded) and one lookup per path in random order.
+"""
+import argparse
+import gc
+import hashlib
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.generate import _file_paths  # noqa: E402
+from pygit_v3 import CompactPathMap  # noqa: E402
+
+
+def _measure(build):
+    """(object, bytes still allocated after build, build time)"""
+    # Timed without tracemalloc, which slows every allocation down
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    built = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, size, elapsed
+
+
+def _lookup_time(mapping, paths):
+    start = time.perf_counter()
+    for path in paths:
+        mapping[path]
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure index memory per entry")
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    paths = _file_paths(rng, args.entries, args.depth)
+    pairs = sorted((path, hashlib.sha1(path.encode()).hexdigest()) for path in paths)
+    rng.shuffle(paths)
+
+    # Fresh string copies each time, as json.load would produce, in the
+    # sorted order commits and the index are written in
+    def as_dict():
+        return {"".join(path): "".join(obj_hash) for path, obj_hash in pairs}
+
+    print(f"{args.entries} entries")
+    print(f"{'':<22}{'bytes/entry':>14}{'build':>12}{'lookups':>12}")
+    # Status and commit hold the staged index and the HEAD tree at once, and
+    # after `add .` both list the same paths, which the compact form shares
+    for copies, label in ((1, "one map"), (2, "index + HEAD tree")):
+        plain, plain_bytes, plain_build = _measure(lambda: [as_dict() for _ in range(copies)])
+        compact, compact_bytes, compact_build = _measure(
+            lambda: [CompactPathMap(as_dict()) for _ in range(copies)])
+        for name, maps, size, build in (("dict", plain, plain_bytes, plain_build),
+                                        ("compact", compact, compact_bytes, compact_build)):
+            print(f"{name + ', ' + label:<22}{size / args.entries:>14.1f}{build * 1000:>10.1f}ms"
+                  f"{_lookup_time(maps[0], paths) * 1000:>10.1f}ms")
+        print(f"{label}: compact uses {compact_bytes / plain_bytes:.0%} of the dicts' memory")
+        del plain, compact, maps
+
+
+if __name__ == "__main__":
+    main()
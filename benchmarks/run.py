@@ -0,0 +1,155 @@
+"""Time PyGit operations on a synthetic repository and check for regressions.
+
+    python -m benchmarks.run [--shape small|medium|large] [--files N ...]
+                             [--operations add,status,...] [--repeats N]
+                             [--baseline FILE] [--save-baseline] [--drop-caches]
+
+Every operation runs on its own copy of the generated repository, in a fresh
+interpreter (benchmarks/worker.py). For each one we report:
+
+    cold     the first run in a new process: in-process caches empty, and the
+             page cache too with --drop-caches (needs root)
+    warm     the median of the following runs in the same process
+    process  wall time of the whole cold process, interpreter start included
+    rss      peak resident set size of the worker
+    syscalls read+write syscalls during the timed part (/proc/self/io)
+
+Results are compared with the baseline file when it exists and was recorded
+for the same shape; a metric more than its threshold above the baseline is a
+regression and makes the run exit with status 1.
+"""
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import add_shape_arguments, generate_repo, shape_from_args
+
+OPERATIONS = ["add", "commit", "status", "checkout", "merge", "log"]
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Allowed growth over the baseline before a metric counts as a regression
+THRESHOLDS = {"cold": 0.25, "warm": 0.25, "process": 0.25, "rss": 0.15, "syscalls": 0.10}
+# Timings closer than this to the baseline are noise, whatever the ratio
+MIN_TIME_DELTA = 0.005
+TIME_METRICS = ("cold", "warm", "process")
+
+
+def _drop_caches():
+    subprocess.run(["sync"], check=False)
+    try:
+        with open("/proc/sys/vm/drop_caches", 'w') as f:
+            f.write("3\n")
+    except OSError as e:
+        print(f"Cannot drop the page cache ({e}); cold runs will use a warm page cache", file=sys.stderr)
+
+
+def run_operation(template, workdir, operation, repeats, drop_caches):
+    repo = workdir / operation
+    shutil.copytree(template, repo, symlinks=True)
+    if drop_caches:
+        _drop_caches()
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-m", "benchmarks.worker", str(repo), operation, str(repeats + 1)],
+                            cwd=Path(__file__).resolve().parent.parent,
+                            capture_output=True, text=True, check=True).stdout
+    process = time.perf_counter() - start
+    measured = json.loads(output)
+    cold, warm = measured["samples"][0], measured["samples"][1:]
+    shutil.rmtree(repo)
+    return {
+        "cold": cold["wall"],
+        "warm": statistics.median(sample["wall"] for sample in warm) if warm else None,
+        "process": process,
+        "rss": measured["peak_rss"],
+        "syscalls": cold["syscalls"],
+        "bytes_read": cold["bytes_read"],
+    }
+
+
+def compare(results, baseline, thresholds):
+    """List of (operation, metric, baseline value, new value) regressions"""
+    regressions = []
+    for operation, metrics in results.items():
+        previous = baseline.get(operation, {})
+        for metric, limit in thresholds.items():
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None or new <= old * (1 + limit):
+                continue
+            if metric not in TIME_METRICS or new - old > MIN_TIME_DELTA:
+                regressions.append((operation, metric, old, new))
+    return regressions
+
+
+def _format(metric, value):
+    if value is None:
+        return "-"
+    if metric == "rss":
+        return f"{value / (1 << 20):.1f}M"
+    if metric in ("syscalls", "bytes_read"):
+        return str(value)
+    return f"{value * 1000:.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PyGit operations")
+    add_shape_arguments(parser)
+    parser.add_argument("--operations", default=",".join(OPERATIONS),
+                        help="comma-separated subset of " + ",".join(OPERATIONS))
+    parser.add_argument("--repeats", type=int, default=5, help="warm runs per operation")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--drop-caches", action="store_true", help="drop the page cache before cold runs")
+    for metric, limit in THRESHOLDS.items():
+        parser.add_argument(f"--threshold-{metric}", type=float, default=limit,
+                            help=f"allowed {metric} growth over the baseline (default {limit * 100:.0f}%%)")
+    args = parser.parse_args()
+
+    shape = shape_from_args(args)
+    operations = [name for name in args.operations.split(",") if name]
+    unknown = [name for name in operations if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operation {unknown[0]}")
+
+    with tempfile.TemporaryDirectory(prefix="pygit-bench-") as tmp:
+        workdir = Path(tmp)
+        print("Generating repository: " + ", ".join(f"{key}={value}" for key, value in shape.items()))
+        template = generate_repo(workdir / "template", **shape)
+        results = {}
+        for operation in operations:
+            results[operation] = run_operation(template, workdir, operation, args.repeats, args.drop_caches)
+
+    metrics = ["cold", "warm", "process", "rss", "syscalls", "bytes_read"]
+    print(f"{'operation':<10}" + "".join(f"{metric:>12}" for metric in metrics))
+    for operation, values in results.items():
+        print(f"{operation:<10}" + "".join(f"{_format(metric, values[metric]):>12}" for metric in metrics))
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({"shape": shape, "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline.exists():
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get("shape") != shape:
+            print("Baseline was recorded for a different shape; not comparing")
+        else:
+            thresholds = {metric: getattr(args, f"threshold_{metric}") for metric in THRESHOLDS}
+            regressions = compare(results, baseline["results"], thresholds)
+            for operation, metric, old, new in regressions:
+                print(f"REGRESSION {operation} {metric}: {_format(metric, old)} -> {_format(metric, new)}")
+            if regressions:
+                status = 1
+            else:
+                print("No regressions against the baseline")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
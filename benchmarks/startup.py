@@ -0,0 +1,83 @@
+"""Startup-time check for `pygit status`.
+
+    python -m benchmarks.startup [--budget MS] [--runs N] [--entry FILE]
+
+Times `status` in a small synthetic repository in fresh processes, subtracts
+the bare interpreter start (`python -c pass`) and fails when the median
+overhead exceeds the budget. It also fails if status loads any of the
+modules that only network or terminal commands need.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import generate_repo
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = 60
+# Modules `status` must not import
+FORBIDDEN_MODULES = {"requests", "urllib3", "http.client", "getpass", "readline", "base64", "zipfile", "tarfile"}
+
+
+def _median_wall(command, cwd, runs, env):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _imported_modules(command, cwd, env):
+    """Modules imported by command, read from -X importtime (excluding interpreter start-up)"""
+    bare = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], cwd=cwd, env=env,
+                          capture_output=True, text=True).stderr
+    output = subprocess.run([command[0], "-X", "importtime"] + command[1:], cwd=cwd, env=env,
+                            capture_output=True, text=True).stderr
+
+    def names(text):
+        return {line.rsplit("|", 1)[1].strip() for line in text.splitlines() if line.startswith("import time:")}
+    return names(output) - names(bare)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check `pygit status` startup overhead")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"allowed median overhead over a bare interpreter in ms (default {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--entry", default=str(ROOT / "pygit_client.py"),
+                        help="script to run (default: the slim pygit_client.py entry point)")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYGIT_NO_DAEMON="1")
+    env.pop("PYGIT_TRACE", None)
+    with tempfile.TemporaryDirectory(prefix="pygit-startup-") as tmp:
+        repo = generate_repo(Path(tmp) / "repo", files=20, depth=1, min_size=64, max_size=1024,
+                             commits=2, branches=1, binary_share=0.0)
+        command = [sys.executable, os.path.abspath(args.entry), "status"]
+        # One untimed run writes the stat cache and .pyc files
+        subprocess.run(command, cwd=repo, env=env, check=True, stdout=subprocess.DEVNULL)
+        bare = _median_wall([sys.executable, "-c", "pass"], repo, args.runs, env)
+        status = _median_wall(command, repo, args.runs, env)
+        forbidden = sorted(_imported_modules(command, repo, env) & FORBIDDEN_MODULES)
+
+    overhead_ms = (status - bare) * 1000
+    print(f"interpreter {bare * 1000:.1f}ms, status {status * 1000:.1f}ms, "
+          f"overhead {overhead_ms:.1f}ms (budget {args.budget:.0f}ms)")
+    failed = False
+    if overhead_ms > args.budget:
+        print("FAIL: status startup is over budget")
+        failed = True
+    if forbidden:
+        print("FAIL: status imported " + ", ".join(forbidden))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Runs one benchmarked operation inside a fresh interpreter and prints its measurements.
+
+    python -m benchmarks.worker <repo> <operation> <repeats>
+
+The first iteration is the cold run (new process, empty in-process caches);
+further iterations reuse the same PyGit instance and are reported as warm.
+Setup steps (editing files, staging, preparing branches) are not timed.
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pygit_v3 import PyGit  # noqa: E402
+
+
+def _quiet(call, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return call(*args)
+
+
+def _proc_io():
+    """Syscall and byte counters for this process, or zeros off Linux"""
+    counters = {}
+    try:
+        with open("/proc/self/io", 'r') as f:
+            for line in f:
+                key, value = line.split(":")
+                counters[key] = int(value)
+    except OSError:
+        pass
+    return counters
+
+
+def _index():
+    with open(".pygit/index.json", 'r') as f:
+        return json.load(f)
+
+
+def _touch_some(rng, share=0.02):
+    files = [p for p in Path(".").rglob("*.txt") if ".pygit" not in p.parts]
+    for path in rng.sample(files, max(1, int(len(files) * share))):
+        with open(path, 'a') as f:
+            f.write(f"edit {rng.random()}\n")
+
+
+class Operations:
+    """setup_<op> prepares one iteration, run_<op> is the timed part"""
+
+    def __init__(self, pygit):
+        self.pygit = pygit
+        self.rng = random.Random(1)
+        self.round = 0
+
+    def setup_add(self):
+        _touch_some(self.rng)
+
+    def run_add(self):
+        self.pygit.add(".")
+
+    def setup_commit(self):
+        _touch_some(self.rng)
+        self.pygit.add(".")
+
+    def run_commit(self):
+        self.pygit.commit(f"benchmark commit {self.round}")
+
+    def setup_status(self):
+        if self.round == 0:
+            _touch_some(self.rng)
+
+    def run_status(self):
+        self.pygit.status()
+
+    def setup_checkout(self):
+        index = _index()
+        others = [name for name in index["branches"] if name != index["current_branch"]]
+        if not others:
+            self.pygit.branch("benchmark-other")
+            others = ["benchmark-other"]
+        self.target = "main" if index["current_branch"] != "main" else others[0]
+
+    def run_checkout(self):
+        self.pygit.checkout(self.target)
+
+    def setup_merge(self):
+        base = _index()["current_branch"]
+        self.topic = f"benchmark-topic-{self.round}"
+        self.pygit.branch(self.topic)
+        self.pygit.checkout(self.topic)
+        _touch_some(self.rng)
+        self.pygit.add(".")
+        self.pygit.commit("topic work")
+        self.pygit.checkout(base)
+
+    def run_merge(self):
+        self.pygit.merge(self.topic)
+
+    def setup_log(self):
+        pass
+
+    def run_log(self):
+        self.pygit.log()
+
+
+def measure(operation, repeats):
+    operations = Operations(PyGit())
+    setup = getattr(operations, f"setup_{operation}")
+    run = getattr(operations, f"run_{operation}")
+    samples = []
+    for iteration in range(repeats):
+        operations.round = iteration
+        _quiet(setup)
+        before = _proc_io()
+        start = time.perf_counter()
+        _quiet(run)
+        wall = time.perf_counter() - start
+        after = _proc_io()
+        samples.append({
+            "wall": wall,
+            "syscalls": sum(after.get(key, 0) - before.get(key, 0) for key in ("syscr", "syscw")),
+            "bytes_read": after.get("rchar", 0) - before.get("rchar", 0),
+            "bytes_written": after.get("wchar", 0) - before.get("wchar", 0),
+        })
+    # ru_maxrss is KiB on Linux
+    return {"samples": samples, "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+if __name__ == "__main__":
+    repo, operation, repeats = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    os.chdir(repo)
+    print(json.dumps(measure(operation, repeats)))
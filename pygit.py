@@ -2,24 +2,82 @@ import os
 import hashlib
 import json
 import datetime
-import shutil
 import sys
-import readline  # For command history and arrow key support
+import time
 from pathlib import Path
-from subprocess import call
+
+from pygit_v3 import ObjectCache
 
 class PyGit:
     def __init__(self, repo_path="."):
+        self._set_repo_path(repo_path)
+
+    def _set_repo_path(self, repo_path):
+        """Point at a (possibly different) repository and drop all warm state"""
         self.repo_path = Path(repo_path)
         self.git_dir = self.repo_path / ".pygit"
         self.objects_dir = self.git_dir / "objects"
         self.commits_dir = self.git_dir / "commits"
         self.index_file = self.git_dir / "index.json"
         self.ignore_file = self.repo_path / ".pygitignore"
+        # The terminal runs many commands in one process, so keep the parsed
+        # index (validated against its stat), commits (immutable) and the
+        # hashes of unchanged working files between commands
+        self._index_cache = None
+        self._commit_cache = ObjectCache()
+        self._file_hash_cache = {}
 
     def is_initialized(self):
         return self.git_dir.exists()
 
+    def _load_index(self):
+        """The parsed index, shared with the cache rather than copied.
+
+        Every command that changes it saves it before returning; one that
+        fails half-way drops the cache (see interactive_terminal), so unsaved
+        changes never outlive the command.
+        """
+        st = os.stat(self.index_file)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        # As in _hash_file: a rewrite in the same timestamp tick would keep the key
+        racy = time.time_ns() - st.st_mtime_ns < 1_000_000_000
+        if self._index_cache is None or self._index_cache[0] != key or racy:
+            with open(self.index_file, 'r') as f:
+                self._index_cache = (key, json.load(f))
+        return self._index_cache[1]
+
+    def _save_index(self, index):
+        with open(self.index_file, 'w') as f:
+            json.dump(index, f)
+        st = os.stat(self.index_file)
+        self._index_cache = ((st.st_ino, st.st_mtime_ns, st.st_size), index)
+
+    def _load_commit(self, commit_hash):
+        commit = self._commit_cache.get("commit", commit_hash)
+        if commit is None:
+            with open(self.commits_dir / commit_hash, 'r') as f:
+                data = f.read()
+            commit = json.loads(data)
+            self._commit_cache.put("commit", commit_hash, commit, len(data))
+        return commit
+
+    def _hash_file(self, file_path):
+        """Hash a working file, reusing the last hash while its stat is unchanged.
+
+        Files modified within the last second are always rehashed, since a
+        second write in the same timestamp tick would otherwise go unseen.
+        """
+        st = os.stat(file_path)
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self._file_hash_cache.get(str(file_path))
+        if cached and cached[0] == key:
+            return cached[1]
+        with open(file_path, 'r') as f:
+            obj_hash = self.hash_object(f.read())
+        if time.time_ns() - st.st_mtime_ns > 1_000_000_000:
+            self._file_hash_cache[str(file_path)] = (key, obj_hash)
+        return obj_hash
+
     def init(self):
         if self.is_initialized():
             print("Repository already exists!")
@@ -47,8 +105,7 @@ class PyGit:
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         if file_path == ".":
             files_added = False
@@ -73,19 +130,16 @@ class PyGit:
         obj_hash = self.hash_object(content)
         with open(self.objects_dir / obj_hash, 'w') as f:
             f.write(content)
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index["staged"][str(file_path)] = obj_hash
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
+        self._save_index(index)
         print(f"Added {file_path} to staging area")
 
     def commit(self, message):
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         if not index["staged"]:
             print("Nothing to commit!")
@@ -102,21 +156,18 @@ class PyGit:
         index["branches"][index["current_branch"]] = commit_hash
         index["head"] = commit_hash
         index["staged"] = {}
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
+        self._save_index(index)
         print(f"Committed: {commit_hash[:7]} {message}")
 
     def log(self):
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         current_hash = index["branches"][index["current_branch"]]
         while current_hash:
-            with open(self.commits_dir / current_hash, 'r') as f:
-                commit = json.load(f)
+            commit = self._load_commit(current_hash)
             print(f"commit {current_hash[:7]}\nDate: {commit['timestamp']}\n    {commit['message']}\n")
             current_hash = commit["parent"]
 
@@ -124,17 +175,15 @@ class PyGit:
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         print(f"On branch {index['current_branch']}")
         committed_files = {}
         current_head = index["branches"][index["current_branch"]]
         if current_head:
-            with open(self.commits_dir / current_head, 'r') as f:
-                last_commit = json.load(f)
+            last_commit = self._load_commit(current_head)
             committed_files = last_commit["files"]
-        current_files = {str(fp): self.hash_object(open(fp, 'r').read()) 
+        current_files = {str(fp): self._hash_file(fp)
                         for fp in self.repo_path.glob("*") 
                         if fp.is_file() and fp.name not in {".pygit", ".pygitignore"}}
         staged = index["staged"]
@@ -163,8 +212,7 @@ class PyGit:
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         if not args:
             for branch_name, commit_hash in index["branches"].items():
@@ -178,8 +226,7 @@ class PyGit:
                 print(f"Branch '{branch_name}' already exists!")
                 return
             index["branches"][branch_name] = index["branches"][index["current_branch"]]
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
+            self._save_index(index)
             print(f"Created branch '{branch_name}'")
         elif len(args) == 2 and args[0] == "-d":
             branch_name = args[1]
@@ -190,8 +237,7 @@ class PyGit:
                 print("Cannot delete the current branch!")
                 return
             del index["branches"][branch_name]
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
+            self._save_index(index)
             print(f"Deleted branch '{branch_name}'")
         elif len(args) == 3 and args[0] == "-m":
             old_name, new_name = args[1], args[2]
@@ -205,23 +251,20 @@ class PyGit:
             del index["branches"][old_name]
             if index["current_branch"] == old_name:
                 index["current_branch"] = new_name
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
+            self._save_index(index)
             print(f"Renamed branch '{old_name}' to '{new_name}'")
         else:
             print("Invalid branch command usage")
 
     def _get_working_dir_changes(self):
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         committed_files = {}
         current_head = index["branches"][index["current_branch"]]
         if current_head:
-            with open(self.commits_dir / current_head, 'r') as f:
-                last_commit = json.load(f)
+            last_commit = self._load_commit(current_head)
             committed_files = last_commit["files"]
-        current_files = {str(fp): self.hash_object(open(fp, 'r').read()) 
+        current_files = {str(fp): self._hash_file(fp)
                         for fp in self.repo_path.glob("*") 
                         if fp.is_file() and fp.name not in {".pygit", ".pygitignore"}}
         has_staged = bool(index["staged"])
@@ -230,14 +273,12 @@ class PyGit:
         return has_staged, has_modified
 
     def _restore_branch_state(self, branch_name):
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         target_commit = index["branches"][branch_name]
         target_files = {}
         if target_commit:
-            with open(self.commits_dir / target_commit, 'r') as f:
-                commit = json.load(f)
+            commit = self._load_commit(target_commit)
             target_files = commit["files"]
         for file_path in self.repo_path.glob("*"):
             if file_path.is_file() and file_path.name not in {".pygit", ".pygitignore"}:
@@ -253,8 +294,7 @@ class PyGit:
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         if branch_name not in index["branches"]:
             print(f"Branch '{branch_name}' does not exist!")
@@ -274,16 +314,14 @@ class PyGit:
         index["current_branch"] = branch_name
         index["head"] = index["branches"][branch_name]
         self._restore_branch_state(branch_name)
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
+        self._save_index(index)
         print(f"Switched to branch '{branch_name}'")
 
     def merge(self, branch_name):
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
+        index = self._load_index()
         index = self._ensure_branch_structure(index)
         if branch_name not in index["branches"]:
             print(f"Branch '{branch_name}' does not exist!")
@@ -300,8 +338,7 @@ class PyGit:
         if not source_commit:
             print(f"Branch '{branch_name}' has no commits to merge!")
             return
-        with open(self.commits_dir / source_commit, 'r') as f:
-            source_data = json.load(f)
+        source_data = self._load_commit(source_commit)
         commit = {
             "timestamp": datetime.datetime.now().isoformat(),
             "message": f"Merge branch '{branch_name}' into '{current_branch}'",
@@ -315,8 +352,7 @@ class PyGit:
         index["branches"][current_branch] = commit_hash
         index["head"] = commit_hash
         self._restore_branch_state(current_branch)
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
+        self._save_index(index)
         print(f"Merged '{branch_name}' into '{current_branch}'")
 
     def help(self):
@@ -343,6 +379,7 @@ class PyGit:
 
     def interactive_terminal(self):
         """Enhanced terminal-like interface with history and basic commands"""
+        import readline  # For command history and arrow key support; only the terminal needs it
         print("Welcome to PyGit Terminal! Type 'help' for commands, 'exit' to quit.")
         readline.set_history_length(1000)  # Store up to 1000 commands
         while True:
@@ -377,12 +414,7 @@ class PyGit:
                 elif cmd == "cd" and rest:
                     try:
                         os.chdir(rest[0])
-                        self.repo_path = Path(os.getcwd())  # Update repo path
-                        self.git_dir = self.repo_path / ".pygit"
-                        self.objects_dir = self.git_dir / "objects"
-                        self.commits_dir = self.git_dir / "commits"
-                        self.index_file = self.git_dir / "index.json"
-                        self.ignore_file = self.repo_path / ".pygitignore"
+                        self._set_repo_path(os.getcwd())  # Update repo path and reset warm state
                     except Exception as e:
                         print(f"Error changing directory: {e}")
                 elif cmd in {"ls", "dir"}:
@@ -398,6 +430,8 @@ class PyGit:
                 else:
                     print(f"Unknown command: {cmd}. Type 'help' for available commands.")
             except Exception as e:
+                # The command may have changed the cached index without saving it
+                self._index_cache = None
                 print(f"Error: {e}")
 
 def main():
@@ -0,0 +1,527 @@
+"""Library API for PyGit: a Repository whose methods return result objects.
+
+    from pygit_api import Repository
+    repo = Repository("path/to/worktree")
+    if not repo.status().clean:
+        repo.add(".")
+        commit = repo.commit("Snapshot")
+    for commit in repo.log(limit=10):
+        print(commit.hash, commit.message)
+
+The CLI in pygit_v3 formats these results; failures raise PyGitError carrying
+the message the CLI prints. A Repository wraps one PyGit instance, so its
+object cache, pack indexes and bitmaps are shared by every call.
+"""
+import datetime
+import difflib
+import json
+import os
+from pathlib import Path
+
+from pygit_v3 import CompactPathMap, PyGit, trace_region
+
+NOT_A_REPOSITORY = "Not a PyGit repository! Please run 'init' first."
+
+
+class PyGitError(Exception):
+    """An operation that the CLI would refuse with a message"""
+
+
+class UncommittedChangesError(PyGitError):
+    def __init__(self, staged, modified):
+        super().__init__("You have uncommitted changes")
+        self.staged = staged
+        self.modified = modified
+
+
+class StatusEntry:
+    __slots__ = ("path", "state")
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state  # "staged", "modified" or "untracked"
+
+    def __repr__(self):
+        return f"StatusEntry({self.path!r}, {self.state!r})"
+
+
+class Status:
+    __slots__ = ("branch", "entries")
+
+    def __init__(self, branch, entries):
+        self.branch = branch
+        self.entries = entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def _paths(self, state):
+        return [entry.path for entry in self.entries if entry.state == state]
+
+    @property
+    def staged(self):
+        return self._paths("staged")
+
+    @property
+    def modified(self):
+        return self._paths("modified")
+
+    @property
+    def untracked(self):
+        return self._paths("untracked")
+
+    @property
+    def clean(self):
+        return not self.entries
+
+    def __repr__(self):
+        return f"Status(branch={self.branch!r}, entries={self.entries!r})"
+
+
+class Commit:
+    __slots__ = ("hash", "timestamp", "message", "parent", "merge_parent", "files", "grafted")
+
+    def __init__(self, commit_hash, data, grafted=False):
+        self.hash = commit_hash
+        self.timestamp = data["timestamp"]
+        self.message = data["message"]
+        self.parent = data.get("parent")
+        self.merge_parent = data.get("merge_parent")
+        self.files = data["files"]  # path -> blob hash (a CompactPathMap once read back); do not modify
+        self.grafted = grafted
+
+    def __repr__(self):
+        return f"Commit({self.hash[:7]!r}, {self.message!r})"
+
+
+class Branch:
+    __slots__ = ("name", "commit", "current")
+
+    def __init__(self, name, commit, current):
+        self.name = name
+        self.commit = commit
+        self.current = current
+
+    def __repr__(self):
+        return f"Branch({self.name!r}, {self.commit and self.commit[:7]!r}{', current' if self.current else ''})"
+
+
+class DiffHunk:
+    __slots__ = ("old_start", "old_count", "new_start", "new_count", "lines")
+
+    def __init__(self, old_start, old_count, new_start, new_count, lines):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.lines = lines  # each prefixed with " ", "-" or "+"
+
+    @property
+    def header(self):
+        return f"@@ -{self.old_start},{self.old_count} +{self.new_start},{self.new_count} @@"
+
+    def __repr__(self):
+        return f"DiffHunk({self.header!r})"
+
+
+class FileDiff:
+    __slots__ = ("path", "change", "hunks")
+
+    def __init__(self, path, change, hunks):
+        self.path = path
+        self.change = change  # "added", "deleted" or "modified"
+        self.hunks = hunks
+
+    def __repr__(self):
+        return f"FileDiff({self.path!r}, {self.change!r}, {len(self.hunks)} hunks)"
+
+
+def _hunks(old_text, new_text, context=3):
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in old_lines[i1:i2])
+                continue
+            lines.extend("-" + line for line in old_lines[i1:i2])
+            lines.extend("+" + line for line in new_lines[j1:j2])
+        first, last = group[0], group[-1]
+        old_count, new_count = last[2] - first[1], last[4] - first[3]
+        # Unified diff numbering: an empty range starts at the line before it
+        hunks.append(DiffHunk(first[1] + 1 if old_count else first[1], old_count,
+                              first[3] + 1 if new_count else first[3], new_count, lines))
+    return hunks
+
+
+class Repository:
+    """A PyGit working tree, with results returned as objects instead of printed"""
+
+    def __init__(self, path=".", pygit=None):
+        self.git = pygit or PyGit(path)
+
+    def _index(self):
+        if not self.git.is_initialized():
+            raise PyGitError(NOT_A_REPOSITORY)
+        return self.git._load_index()
+
+    def _head_files(self, index):
+        head = index["branches"][index["current_branch"]]
+        return self.git._read_commit(head)["files"] if head else {}
+
+    def _status(self, index):
+        committed_files = self._head_files(index)
+        current_files = self.git._scan_worktree(index)
+        staged = index["staged"]
+        entries = [StatusEntry(path, "staged") for path in staged]
+        # Walk the committed tree and probe the worktree dict: lookups in a
+        # CompactPathMap are binary searches, dict lookups are not
+        for path, committed_hash in committed_files.items():
+            current_hash = current_files.get(path)
+            if (current_hash and committed_hash != current_hash and
+                    staged.get(path) != current_hash):
+                entries.append(StatusEntry(path, "modified"))
+        tracked = set(committed_files)
+        tracked.update(staged)
+        entries.extend(StatusEntry(path, "untracked") for path in current_files if path not in tracked)
+        return Status(index["current_branch"], entries), current_files
+
+    def status(self):
+        """Staged, modified and untracked files"""
+        index = self._index()
+        status, _ = self._status(index)
+        # Persist the refreshed stat cache
+        self.git._save_index(index)
+        return status
+
+    @property
+    def current_branch(self):
+        return self._index()["current_branch"]
+
+    def branches(self):
+        index = self._index()
+        return [Branch(name, commit_hash, name == index["current_branch"])
+                for name, commit_hash in index["branches"].items()]
+
+    def resolve(self, rev):
+        """Commit hash for a branch, origin/<branch>, HEAD or (abbreviated) hash"""
+        commit_hash = self.git._resolve_rev(rev, self._index())
+        if not commit_hash:
+            raise PyGitError(f"Unknown revision '{rev}'")
+        return commit_hash
+
+    def get_commit(self, rev):
+        commit_hash = self.resolve(rev)
+        return Commit(commit_hash, self.git._read_commit(commit_hash), commit_hash in self.git._read_shallow())
+
+    def log(self, rev=None, limit=None):
+        """Yield commits from rev (default: the current branch) following first parents"""
+        index = self._index()
+        current_hash = self.resolve(rev) if rev else index["branches"][index["current_branch"]]
+        shallow = self.git._read_shallow()
+        count = 0
+        while current_hash and (limit is None or count < limit):
+            grafted = current_hash in shallow
+            yield Commit(current_hash, self.git._read_commit(current_hash), grafted)
+            count += 1
+            if grafted:
+                break
+            current_hash = self.git._read_commit(current_hash)["parent"]
+
+    def diff(self, old=None, new=None, context=3):
+        """Per-file hunks between two revisions; old defaults to HEAD, new to the working tree"""
+        index = self._index()
+        old_files = self.git._read_commit(self.resolve(old))["files"] if old else self._head_files(index)
+        if new:
+            new_files = self.git._read_commit(self.resolve(new))["files"]
+            read_new = self.git._read_object
+        else:
+            _, current_files = self._status(index)
+            self.git._save_index(index)
+            new_files = current_files
+            cone = self.git._sparse_cone()
+            if cone:
+                # Paths outside the sparse-checkout cone are not checked out; they are as in HEAD
+                new_files = dict(current_files)
+                new_files.update((path, obj_hash) for path, obj_hash in self._head_files(index).items()
+                                 if not self.git._in_sparse_cone(path, False, cone))
+
+            def read_new(obj_hash, path=None):
+                if path not in current_files:
+                    return self.git._read_object(obj_hash)
+                with open(self.git.repo_path / path, 'r') as f:
+                    return f.read()
+        diffs = []
+        with trace_region("diff"):
+            for path in sorted(set(old_files) | set(new_files)):
+                old_hash, new_hash = old_files.get(path), new_files.get(path)
+                if old_hash == new_hash:
+                    continue
+                old_text = self.git._read_object(old_hash) if old_hash else ""
+                if not new_hash:
+                    new_text = ""
+                elif new:
+                    new_text = read_new(new_hash)
+                else:
+                    new_text = read_new(new_hash, path)
+                change = "added" if not old_hash else "deleted" if not new_hash else "modified"
+                diffs.append(FileDiff(path, change, _hunks(old_text, new_text, context)))
+        return diffs
+
+    def add(self, path):
+        """Stage a file, or every worktree file for "."; returns the staged paths"""
+        index = self._index()
+        if path == ".":
+            current_files = self.git._scan_worktree(index)
+            for rel_path, obj_hash in current_files.items():
+                if not self.git._has_object("blob", obj_hash):
+                    with open(self.git.repo_path / rel_path, 'r') as f:
+                        current_files[rel_path] = self.git._write_blob(f.read())
+            index["staged"].update(current_files)
+            self.git._save_index(index)
+            return sorted(current_files)
+
+        # Relative paths name files in this repository, wherever the caller runs
+        root = self.git.repo_path.resolve()
+        file_path = Path(os.path.normpath(root / path))
+        try:
+            rel_path = file_path.relative_to(root).as_posix()
+        except ValueError:
+            raise PyGitError(f"{path} is outside the repository") from None
+        if not file_path.exists():
+            raise PyGitError(f"File {path} does not exist!")
+        if rel_path.split("/")[0] == ".pygit" or rel_path == ".pygitignore":
+            return []
+        try:
+            with open(file_path, 'r') as f:
+                index["staged"][rel_path] = self.git._write_blob(f.read())
+        except UnicodeDecodeError:
+            raise PyGitError(f"{path} is a binary file; only text files can be added") from None
+        self.git._save_index(index)
+        return [rel_path]
+
+    def _write_commit(self, index, data):
+        data["files"] = dict(data["files"].items())
+        commit_hash = self.git.hash_object(json.dumps(data))
+        self.git._write_commit(commit_hash, data)
+        index["branches"][index["current_branch"]] = commit_hash
+        index["head"] = commit_hash
+        return Commit(commit_hash, data)
+
+    def commit(self, message):
+        """Commit the staged files on the current branch"""
+        index = self._index()
+        if not index["staged"]:
+            raise PyGitError("Nothing to commit!")
+        files = index["staged"]
+        cone = self.git._sparse_cone()
+        if cone:
+            # Paths outside the sparse-checkout cone are never staged; keep HEAD's
+            files = CompactPathMap((path, obj_hash) for path, obj_hash in self._head_files(index).items()
+                                   if not self.git._in_sparse_cone(path, False, cone))
+            files.update(index["staged"])
+        commit = self._write_commit(index, {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "message": message,
+            "files": files,
+            "parent": index["branches"][index["current_branch"]]
+        })
+        index["staged"] = {}
+        self.git._save_index(index)
+        return commit
+
+    def create_branch(self, name):
+        index = self._index()
+        if name in index["branches"]:
+            raise PyGitError(f"Branch '{name}' already exists!")
+        index["branches"][name] = index["branches"][index["current_branch"]]
+        self.git._save_index(index)
+        return Branch(name, index["branches"][name], False)
+
+    def _require_not_checked_out_elsewhere(self, name):
+        path = self.git._branch_worktree(name)
+        if path:
+            raise PyGitError(f"Branch '{name}' is checked out in worktree {path}")
+
+    def delete_branch(self, name):
+        index = self._index()
+        if name not in index["branches"]:
+            raise PyGitError(f"Branch '{name}' does not exist!")
+        if name == index["current_branch"]:
+            raise PyGitError("Cannot delete the current branch!")
+        self._require_not_checked_out_elsewhere(name)
+        del index["branches"][name]
+        self.git._save_index(index)
+
+    def rename_branch(self, old_name, new_name):
+        index = self._index()
+        if old_name not in index["branches"]:
+            raise PyGitError(f"Branch '{old_name}' does not exist!")
+        if new_name in index["branches"]:
+            raise PyGitError(f"Branch '{new_name}' already exists!")
+        self._require_not_checked_out_elsewhere(old_name)
+        index["branches"][new_name] = index["branches"].pop(old_name)
+        if index["current_branch"] == old_name:
+            index["current_branch"] = new_name
+        self.git._save_index(index)
+
+    def _require_clean(self, index):
+        status, _ = self._status(index)
+        modified = status.modified
+        if index["staged"] or modified:
+            raise UncommittedChangesError(list(index["staged"]), modified)
+
+    def checkout(self, name):
+        """Switch to a branch, refusing if there are uncommitted changes"""
+        index = self._index()
+        if name not in index["branches"]:
+            raise PyGitError(f"Branch '{name}' does not exist!")
+        if name == index["current_branch"]:
+            raise PyGitError(f"Already on branch '{name}'")
+        self._require_not_checked_out_elsewhere(name)
+        self._require_clean(index)
+        previous = index["branches"][index["current_branch"]]
+        index["current_branch"] = name
+        index["head"] = index["branches"][name]
+        self.git._save_index(index)
+        self.git._restore_branch_state(name, previous)
+
+    def merge(self, name):
+        """Record a merge commit taking the other branch's files; returns it"""
+        index = self._index()
+        if name not in index["branches"]:
+            raise PyGitError(f"Branch '{name}' does not exist!")
+        self._require_clean(index)
+        current_branch = index["current_branch"]
+        if name == current_branch:
+            raise PyGitError("Cannot merge branch with itself!")
+        source_commit = index["branches"][name]
+        if not source_commit:
+            raise PyGitError(f"Branch '{name}' has no commits to merge!")
+        previous = index["branches"][current_branch]
+        commit = self._write_commit(index, {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "message": f"Merge branch '{name}' into '{current_branch}'",
+            "files": self.git._read_commit(source_commit)["files"],
+            "parent": index["branches"][current_branch],
+            "merge_parent": source_commit
+        })
+        self.git._save_index(index)
+        self.git._restore_branch_state(current_branch, previous)
+        return commit
+
+    def stash_list(self):
+        """Stash entries, newest (stash@{0}) first"""
+        self._index()
+        return [Commit(h, self.git._read_commit(h)) for h in self.git._read_stash()]
+
+    def _stash_hash(self, position):
+        stash = self.git._read_stash()
+        if not stash:
+            raise PyGitError("No stash entries found.")
+        if not 0 <= position < len(stash):
+            raise PyGitError(f"stash@{{{position}}} does not exist")
+        return stash[position]
+
+    def stash_push(self, message=None):
+        """Save the staging area and tracked worktree changes, then reset them to HEAD.
+
+        The stash is a commit whose files are the tracked worktree files, plus
+        HEAD's files outside the sparse-checkout cone, with HEAD as parent and, as merge parent, a commit holding the staging area.
+        File hashes come from the stat cache, so only changed files are read
+        and only content not already stored is written.
+        """
+        index = self._index()
+        head = index["branches"][index["current_branch"]]
+        head_files = self._head_files(index)
+        status, current_files = self._status(index)
+        staged = index["staged"]
+        # Paths outside the sparse-checkout cone are never scanned; keep HEAD's
+        cone = self.git._sparse_cone()
+        outside = {path: obj_hash for path, obj_hash in head_files.items()
+                   if not self.git._in_sparse_cone(path, False, cone)} if cone else {}
+        tracked = [path for path in head_files if path not in outside]
+        worktree = {path: current_files[path] for path in set(tracked) | set(staged) if path in current_files}
+        deleted = [path for path in tracked if path not in current_files]
+        if not staged and not status.modified and not deleted:
+            raise PyGitError("No local changes to save")
+
+        changed = [path for path, obj_hash in worktree.items() if head_files.get(path) != obj_hash]
+        for path in changed:
+            if not self.git._has_object("blob", worktree[path]):
+                with open(self.git.repo_path / path, 'r') as f:
+                    self.git._write_blob(f.read())
+
+        base = f"{index['current_branch']}: " + (
+            f"{head[:7]} {self.git._read_commit(head)['message']}" if head else "(no commits)")
+        timestamp = datetime.datetime.now().isoformat()
+        index_commit = {"timestamp": timestamp, "message": f"index on {base}",
+                        "files": dict(staged.items()), "parent": head}
+        index_hash = self.git.hash_object(json.dumps(index_commit))
+        self.git._write_commit(index_hash, index_commit)
+        stash_commit = {"timestamp": timestamp, "message": message or f"WIP on {base}",
+                        "files": dict(sorted({**outside, **worktree}.items())), "parent": head, "merge_parent": index_hash}
+        stash_hash = self.git.hash_object(json.dumps(stash_commit))
+        self.git._write_commit(stash_hash, stash_commit)
+        self.git._write_stash([stash_hash] + self.git._read_stash())
+
+        # Put back only what differs from HEAD
+        zero_copy_min = self.git._zero_copy_min_size()
+        for path in changed:
+            if path in head_files:
+                self.git._checkout_blob(head_files[path], self.git.repo_path / path, zero_copy_min)
+            else:
+                os.remove(self.git.repo_path / path)
+        for path in deleted:
+            self.git._checkout_blob(head_files[path], self.git.repo_path / path, zero_copy_min)
+        index["staged"] = CompactPathMap()
+        self.git._save_index(index)
+        return Commit(stash_hash, stash_commit)
+
+    def stash_apply(self, position=0):
+        """Restore a stash entry's worktree changes and staging area, keeping the entry"""
+        stash_hash = self._stash_hash(position)
+        stash = self.git._read_commit(stash_hash)
+        base_files = self.git._read_commit(stash["parent"])["files"] if stash["parent"] else {}
+        stash_files = stash["files"]
+        changed = sorted(path for path in set(stash_files) | set(base_files)
+                         if stash_files.get(path) != base_files.get(path))
+
+        index = self._index()
+        head_files = self._head_files(index)
+        _, current_files = self._status(index)
+        conflicts = [path for path in changed if current_files.get(path) != head_files.get(path)]
+        if conflicts:
+            raise PyGitError("Your local changes would be overwritten by the stash: " + ", ".join(conflicts))
+        # Files changed on HEAD since the stash was made would lose those changes
+        conflicts = [path for path in changed
+                     if head_files.get(path) not in (base_files.get(path), stash_files.get(path))]
+        if conflicts:
+            raise PyGitError("Committed changes would be overwritten by the stash: " + ", ".join(conflicts))
+
+        zero_copy_min = self.git._zero_copy_min_size()
+        for path in changed:
+            target = self.git.repo_path / path
+            if path in stash_files:
+                self.git._checkout_blob(stash_files[path], target, zero_copy_min)
+            elif target.exists():
+                os.remove(target)
+        index["staged"].update(self.git._read_commit(stash["merge_parent"])["files"].items())
+        self.git._save_index(index)
+        return Commit(stash_hash, stash)
+
+    def stash_drop(self, position=0):
+        stash_hash = self._stash_hash(position)
+        stash = self.git._read_stash()
+        del stash[position]
+        self.git._write_stash(stash)
+        return Commit(stash_hash, self.git._read_commit(stash_hash))
+
+    def stash_pop(self, position=0):
+        """Apply a stash entry and drop it; on conflicts it is kept"""
+        commit = self.stash_apply(position)
+        self.stash_drop(position)
+        return commit
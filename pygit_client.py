@@ -0,0 +1,115 @@
+"""Thin client for the PyGit daemon (pygit_daemon.py).
+
+`forward(argv)` hands a CLI command to a running daemon and streams its
+output back; it returns None when the command must run in-process instead.
+Run as `python pygit_client.py <command>` it only imports the full CLI when
+no daemon answers. Kept free of heavy imports since it sits on the startup
+path of every CLI call.
+
+Wire format: the client sends one JSON line {"argv": [...], "cwd": ...,
+"env": {...}}; the daemon answers with frames of a one-byte channel ("o"
+stdout, "e" stderr, "x" exit status) and a 4-byte big-endian length, then
+the payload.
+"""
+import json
+import os
+import socket
+import struct
+import sys
+
+FRAME_HEADER = struct.Struct(">cI")
+
+# Commands worth forwarding: fast, non-interactive and confined to the repo.
+# Anything prompting for input or serving/spawning long-lived work runs in-process.
+DAEMON_COMMANDS = {"add", "commit", "log", "diff", "status", "branch", "checkout", "merge", "stash",
+                   "fsck", "gc", "bundle", "archive"}
+
+# Environment variables that change a command's behaviour and so travel with it
+FORWARDED_ENV = ("PYGIT_CACHE_STATS", "PYGIT_TRACE")
+
+
+def socket_path():
+    """The per-user socket, overridable with PYGIT_DAEMON_SOCKET.
+
+    Without XDG_RUNTIME_DIR it lives in a pygit-<uid> directory under the
+    shared temp directory, which the daemon creates with mode 0700.
+    """
+    if os.environ.get("PYGIT_DAEMON_SOCKET"):
+        return os.environ["PYGIT_DAEMON_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, f"pygit-daemon-{os.getuid()}.sock")
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f"pygit-{os.getuid()}", "daemon.sock")
+
+
+def _served_by_us(sock, path):
+    """True if the daemon at the other end runs as this user.
+
+    Checked before any argv or cwd is sent, so a socket another user planted
+    at our path gets nothing. Uses the peer's credentials where the platform
+    has SO_PEERCRED, and otherwise requires the socket file and its directory
+    to be ours and closed to everyone else.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+    for checked in (path, os.path.dirname(path) or "."):
+        st = os.stat(checked)
+        if st.st_uid != os.getuid() or (checked != path and st.st_mode & 0o022):
+            return False
+    return not os.stat(path).st_mode & 0o077
+
+
+def _recv_exact(sock, count):
+    data = b""
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError("daemon closed the connection")
+        data += chunk
+    return data
+
+
+def forward(argv):
+    """Run argv through the daemon, streaming its output; None if it must run in-process"""
+    if len(argv) < 2 or argv[1] not in DAEMON_COMMANDS or os.environ.get("PYGIT_NO_DAEMON"):
+        return None
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    path = socket_path()
+    try:
+        sock.connect(path)
+        trusted = _served_by_us(sock, path)
+    except OSError:
+        sock.close()
+        return None
+    if not trusted:
+        sock.close()
+        print(f"Ignoring daemon socket {path}: it belongs to another user", file=sys.stderr)
+        return None
+    with sock:
+        request = {"argv": argv, "cwd": os.getcwd(),
+                   "env": {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ}}
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        outputs = {b"o": sys.stdout, b"e": sys.stderr}
+        while True:
+            channel, length = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+            payload = _recv_exact(sock, length)
+            if channel == b"x":
+                return int(payload)
+            out = outputs[channel]
+            out.flush()
+            out.buffer.write(payload)
+            out.buffer.flush()
+
+
+if __name__ == "__main__":
+    status = forward(sys.argv)
+    if status is None:
+        from pygit_v3 import main
+        main()
+    else:
+        sys.exit(status)
@@ -0,0 +1,158 @@
+"""Optional background daemon that runs PyGit CLI commands with warm state.
+
+`pygit daemon` listens on a Unix domain socket and keeps one PyGit instance
+(pack indexes, bitmaps, the object cache) per working directory it has seen.
+Clients (pygit_client.py) send one JSON request line and get the command's
+output back as frames. Commands run one at a time, since they chdir and
+redirect the process-wide stdout/stderr.
+"""
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from pygit_client import FORWARDED_ENV, FRAME_HEADER, socket_path
+
+
+class _FrameWriter(io.RawIOBase):
+    """Writable stream that sends everything written to it as frames on one channel"""
+
+    def __init__(self, sock, channel):
+        self._sock = sock
+        self._channel = channel
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self._sock.sendall(FRAME_HEADER.pack(self._channel, len(data)) + data)
+        return len(data)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        status = self.server.run(request, self.connection)
+        self.connection.sendall(FRAME_HEADER.pack(b"x", len(str(status))) + str(status).encode())
+
+
+class PyGitDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._repos = {}
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def run(self, request, sock):
+        """Run one forwarded command in its cwd with stdout/stderr sent back as frames"""
+        from pygit_v3 import PyGit, main
+        stdout = io.TextIOWrapper(_FrameWriter(sock, b"o"), encoding="utf-8", write_through=True)
+        stderr = io.TextIOWrapper(_FrameWriter(sock, b"e"), encoding="utf-8", write_through=True)
+        with self._lock:
+            saved_cwd, saved_env = os.getcwd(), dict(os.environ)
+            try:
+                os.chdir(request["cwd"])
+                for name in FORWARDED_ENV:
+                    os.environ.pop(name, None)
+                os.environ.update(request.get("env", {}))
+                cwd = os.getcwd()
+                if cwd not in self._repos:
+                    self._repos[cwd] = PyGit()
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    try:
+                        main(request["argv"], self._repos[cwd])
+                        status = 0
+                    except SystemExit as e:
+                        status = e.code if isinstance(e.code, int) else 1
+                    except Exception as e:
+                        print(f"Error: {e}", file=sys.stderr)
+                        status = 1
+            except OSError as e:
+                stderr.write(f"Error: {e}\n")
+                status = 1
+            finally:
+                os.chdir(saved_cwd)
+                os.environ.clear()
+                os.environ.update(saved_env)
+        return status
+
+
+def _daemon_running(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def run_daemon(*args):
+    """`pygit daemon [--socket <path>]` serves until interrupted; `pygit daemon stop` ends it"""
+    path = socket_path()
+    args = list(args)
+    if "--socket" in args:
+        position = args.index("--socket")
+        if position + 1 >= len(args):
+            print("Usage: pygit daemon [start|stop] [--socket <path>]")
+            return
+        path = args[position + 1]
+        del args[position:position + 2]
+    action = args[0] if args else "start"
+
+    pid_path = path + ".pid"
+    if action == "stop":
+        try:
+            with open(pid_path, 'r') as f:
+                os.kill(int(f.read().strip()), signal.SIGTERM)
+            print("Daemon stopped")
+        except (FileNotFoundError, ValueError, ProcessLookupError):
+            print("No daemon is running")
+        return
+    if action != "start":
+        print("Usage: pygit daemon [start|stop] [--socket <path>]")
+        return
+
+    if path == socket_path() and not (os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("PYGIT_DAEMON_SOCKET")):
+        # The shared temp directory: keep the socket in a directory only we can enter
+        socket_dir = os.path.dirname(path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        st = os.stat(socket_dir)
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            print(f"Refusing to use {socket_dir}: it must be owned by you with mode 0700")
+            return
+    if os.path.exists(path):
+        if _daemon_running(path):
+            print(f"A daemon is already listening on {path}")
+            return
+        os.remove(path)
+    server = PyGitDaemon(path)
+    with open(pid_path, 'w') as f:
+        f.write(str(os.getpid()))
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"PyGit daemon listening on {path}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for leftover in (path, pid_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(leftover)
+
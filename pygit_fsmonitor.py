@@ -0,0 +1,268 @@
+"""Linux inotify filesystem monitor for PyGit working trees.
+
+`pygit fsmonitor start` runs a detached watcher that appends the repo-relative
+path of every changed file or directory to .pygit/fsmonitor/journal. The
+journal starts with a "<pid> <generation>" header written once every
+directory is watched. A token "<pid>:<generation>:<offset>" names a position
+in it, so `changed_since(token)` returns exactly the paths touched after that
+point. Tokens go stale when the watcher restarts, rotates its journal, or
+overflows the kernel queue (journaled as a "!" line); callers must then fall
+back to a full scan.
+
+Events reach the journal a moment after the change, so callers first `sync`:
+it creates a cookie file in the working tree and waits until the watcher has
+journaled it, which means every earlier change is journaled too.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+OVERFLOW_MARK = "!"
+COOKIE_PREFIX = ".pygit-fsmonitor-cookie-"
+SYNC_TIMEOUT = 1.0
+# The watcher starts a new journal generation (invalidating tokens) past this size
+JOURNAL_ROTATE_BYTES = 16 * 1024 * 1024
+
+
+def _journal_path(git_dir):
+    return os.path.join(git_dir, "fsmonitor", "journal")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_header(journal):
+    header = journal.readline()
+    try:
+        pid, generation = header.split()
+        return int(pid), int(generation), len(header)
+    except ValueError:
+        return None
+
+
+def current_token(git_dir):
+    """Token for the end of the journal, or None if no watcher is running"""
+    try:
+        with open(_journal_path(git_dir), 'rb') as journal:
+            header = _read_header(journal)
+            if not header or not _pid_alive(header[0]):
+                return None
+            end = journal.seek(0, os.SEEK_END)
+    except FileNotFoundError:
+        return None
+    return f"{header[0]}:{header[1]}:{end}"
+
+
+def changed_since(git_dir, token):
+    """(new token, set of changed repo-relative paths) since token, or None when it is stale"""
+    if not token:
+        return None
+    try:
+        pid, generation, offset = (int(part) for part in token.split(":"))
+    except ValueError:
+        return None
+    try:
+        with open(_journal_path(git_dir), 'rb') as journal:
+            header = _read_header(journal)
+            if header is None or header[:2] != (pid, generation) or not _pid_alive(pid):
+                return None
+            if offset < header[2]:
+                return None
+            journal.seek(offset)
+            data = journal.read()
+    except FileNotFoundError:
+        return None
+    # A line still being written is left for the next caller
+    complete = data[:data.rfind(b"\n") + 1]
+    paths = set(os.fsdecode(line) for line in complete.splitlines()
+                if not line.startswith(COOKIE_PREFIX.encode()))
+    if OVERFLOW_MARK in paths:
+        return None
+    return f"{pid}:{generation}:{offset + len(complete)}", paths
+
+
+def sync(repo_path, git_dir, timeout=SYNC_TIMEOUT):
+    """Wait until every change made before the call is in the journal.
+
+    Returns False if the watcher did not journal the cookie within timeout;
+    the journal may then be behind, and callers should scan the whole tree.
+    """
+    cookie = os.path.join(repo_path, f"{COOKIE_PREFIX}{os.getpid()}-{time.time_ns()}")
+    line = b"\n" + os.fsencode(os.path.basename(cookie)) + b"\n"
+    try:
+        with open(_journal_path(git_dir), 'rb') as journal:
+            header = _read_header(journal)
+            if not header or not _pid_alive(header[0]):
+                return False
+            journal.seek(0, os.SEEK_END)
+            os.close(os.open(cookie, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+            deadline = time.monotonic() + timeout
+            # Starts with a newline so the cookie matches only as a whole line
+            data = b"\n"
+            while True:
+                data += journal.read()
+                if line in data:
+                    return True
+                if time.monotonic() > deadline:
+                    return False
+                time.sleep(0.001)
+    except OSError:
+        return False
+    finally:
+        try:
+            os.remove(cookie)
+        except FileNotFoundError:
+            pass
+
+
+class InotifyWatcher:
+    """Recursive inotify watch of a working tree, skipping .pygit"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def watch_tree(self, directory):
+        """Watch directory and everything below it; returns the files found"""
+        found = []
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            wd = self._add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                continue
+            self._dirs[wd] = current
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not (current == self.root and entry.name == ".pygit"):
+                                pending.append(entry.path)
+                        else:
+                            found.append(entry.path)
+            except OSError:
+                continue
+        return found
+
+    def relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def read_events(self, timeout=None):
+        """Block for events; returns changed absolute paths, or None on queue overflow"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed = []
+        position = 0
+        while position < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, position)
+            position += EVENT_HEADER.size
+            name = data[position:position + length].rstrip(b"\0")
+            position += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            changed.append(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may land in a new directory before its watch exists
+                changed.extend(self.watch_tree(path))
+        return changed
+
+
+def run(repo_path=".", git_dir=None):
+    """Watch the working tree and journal changes until SIGTERM.
+
+    git_dir is where the journal goes: the worktree's own directory under
+    .pygit/worktrees for a linked worktree, .pygit otherwise.
+    """
+    git_dir = git_dir or os.path.join(repo_path, ".pygit")
+    os.makedirs(os.path.join(git_dir, "fsmonitor"), exist_ok=True)
+    watcher = InotifyWatcher(repo_path)
+    watcher.watch_tree(watcher.root)
+    pygit_dir = os.path.join(watcher.root, ".pygit")
+
+    def open_journal():
+        journal_path = _journal_path(git_dir)
+        tmp_path = journal_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f"{os.getpid()} {time.time_ns()}\n")
+        os.replace(tmp_path, journal_path)
+        return open(journal_path, 'ab', buffering=0)
+
+    running = [True]
+    signal.signal(signal.SIGTERM, lambda *_: running.__setitem__(0, False))
+    journal = open_journal()
+    try:
+        while running[0]:
+            changed = watcher.read_events(timeout=1.0)
+            if changed is None:
+                journal.write(OVERFLOW_MARK.encode() + b"\n")
+                continue
+            lines = []
+            for path in changed:
+                if path == pygit_dir or path.startswith(pygit_dir + os.sep):
+                    continue
+                lines.append(os.fsencode(watcher.relative(path)) + b"\n")
+            if lines:
+                journal.write(b"".join(lines))
+            if journal.tell() > JOURNAL_ROTATE_BYTES:
+                journal.close()
+                journal = open_journal()
+    finally:
+        journal.close()
+        try:
+            os.remove(_journal_path(git_dir))
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else ".")
@@ -0,0 +1,376 @@
+"""Built-in HTTP server for the PyGit push/clone protocol, on asyncio.
+
+Repositories are served from <root>/<username>/<repoName>. If <root> is itself
+a PyGit repository it is also served under any username, by its own name, so
+`pygit serve` inside a repository is enough for local testing.
+
+Pushes never move a branch checked out in a served working tree. Repositories
+the server creates itself are bare ("core.bare" in their config).
+
+Endpoints (all under /api/repos/<username>/<repoName>):
+    GET  info/refs          ref advertisement and capabilities
+    POST upload-pack        {"want": [...], "have": [...], "depth": n, "filter": spec} -> pack stream
+    POST receive-pack       JSON line of ref updates followed by a pack stream
+    GET  objects/<hash>     single blob, for lazy fetches after a partial clone
+plus the legacy multipart POST /api/push-repository.
+"""
+import asyncio
+import datetime
+import email.parser
+import email.policy
+import hashlib
+import json
+import re
+import tempfile
+from pathlib import Path
+from urllib.parse import urlparse
+
+from pygit_v3 import PyGit
+
+REPO_ROUTE = re.compile(r"^/api/repos/([^/]+)/([^/]+)/(info/refs|upload-pack|receive-pack|objects/[0-9a-f]{40})$")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 500: "Internal Server Error"}
+CAPABILITIES = ["upload-pack", "receive-pack", "shallow", "filter"]
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PyGitServer:
+    def __init__(self, root=".", host="127.0.0.1", port=5000, allow_create=False):
+        self.root = Path(root).resolve()
+        self.host = host
+        self.port = port
+        # Pushes to a missing repository create it only when the server was
+        # started with --allow-create, since clients are not authenticated
+        self.allow_create = allow_create
+        self._ref_locks = {}
+
+    def _repo(self, username, repo_name, create=False):
+        if username.startswith(".") or repo_name.startswith("."):
+            raise HTTPError(400, "Invalid repository name")
+        path = self.root / username / repo_name
+        if not (path / ".pygit").exists():
+            if (self.root / ".pygit").exists() and self.root.name == repo_name:
+                path = self.root
+            elif create and self.allow_create:
+                path.mkdir(parents=True, exist_ok=True)
+                repo = PyGit(path)
+                repo.init()
+                # Only ever pushed to, so its branches can move without a checkout
+                with open(repo.config_path, 'w') as f:
+                    json.dump({"core.bare": True}, f)
+            else:
+                raise HTTPError(404, f"Repository {username}/{repo_name} not found")
+        return PyGit(path)
+
+    def _ref_lock(self, repo):
+        """Serialise ref updates per repository"""
+        key = str(repo.git_dir.resolve())
+        if key not in self._ref_locks:
+            self._ref_locks[key] = asyncio.Lock()
+        return self._ref_locks[key]
+
+    def _read_index(self, repo):
+        return repo._load_index()
+
+    def _write_index(self, repo, index):
+        # Atomic and under refs.lock, like every local index write
+        repo._save_index(index)
+
+    # HTTP plumbing
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._send_json(writer, 400, {"error": "Malformed request line"}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    await self.dispatch(method, target, headers, reader, writer)
+                except HTTPError as e:
+                    # The body may not have been read, so the connection can't be reused
+                    await self._send_json(writer, e.status, {"error": e.message}, close=True)
+                    break
+                except Exception as e:
+                    await self._send_json(writer, 500, {"error": str(e)}, close=True)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _iter_body(self, reader, headers):
+        """Yield the request body in chunks, whether sized or chunked"""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Trailer section ends with an empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readline()
+        else:
+            remaining = int(headers.get("content-length", 0))
+            while remaining:
+                chunk = await reader.read(min(65536, remaining))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(chunk)
+                yield chunk
+
+    async def _read_body(self, reader, headers):
+        return b"".join([chunk async for chunk in self._iter_body(reader, headers)])
+
+    def _status_line(self, status):
+        return f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+
+    async def _send(self, writer, status, body, content_type, close=False):
+        head = self._status_line(status)
+        head += f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+        if close:
+            head += "Connection: close\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, close=False):
+        await self._send(writer, status, json.dumps(payload).encode(), "application/json", close)
+
+    async def _send_stream(self, writer, chunks, content_type, extra_headers=None):
+        """Send an iterable of byte chunks with chunked transfer encoding"""
+        head = self._status_line(200)
+        head += f"Content-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n"
+        for name, value in (extra_headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n")
+        for chunk in chunks:
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, reader, writer):
+        parsed = urlparse(target)
+        if parsed.path == "/api/push-repository":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            return await self.legacy_push(headers, reader, writer)
+
+        match = REPO_ROUTE.match(parsed.path)
+        if not match:
+            raise HTTPError(404, f"No route for {parsed.path}")
+        username, repo_name, action = match.groups()
+        expected = "POST" if action in ("upload-pack", "receive-pack") else "GET"
+        if method != expected:
+            raise HTTPError(405, f"Use {expected}")
+
+        if action == "receive-pack":
+            return await self.receive_pack(self._repo(username, repo_name, create=True), headers, reader, writer)
+        repo = self._repo(username, repo_name)
+        if action == "info/refs":
+            return await self.advertise_refs(repo, writer)
+        if action == "upload-pack":
+            request = json.loads(await self._read_body(reader, headers) or b"{}")
+            return await self.upload_pack(repo, request, writer)
+        return await self.send_object(repo, action.split("/")[1], writer)
+
+    # Protocol endpoints
+
+    async def advertise_refs(self, repo, writer):
+        index = self._read_index(repo)
+        await self._send_json(writer, 200, {
+            "branches": index["branches"],
+            "head": index["current_branch"],
+            "capabilities": CAPABILITIES
+        })
+
+    async def upload_pack(self, repo, request, writer):
+        wants = request.get("want", [])
+        missing = [h for h in wants if not repo._has_object("commit", h)]
+        if missing:
+            raise HTTPError(404, f"Unknown commit {missing[0]}")
+        depth = request.get("depth")
+        if depth is not None and (not isinstance(depth, int) or depth < 1):
+            raise HTTPError(400, "depth must be a positive number")
+        filter_spec = request.get("filter")
+        blob_filter = repo._parse_filter_spec(filter_spec) if filter_spec else {}
+        if blob_filter is None:
+            raise HTTPError(400, f"Unsupported filter {filter_spec}")
+        objects, shallow = await asyncio.to_thread(
+            repo._collect_objects, wants, request.get("have", []), depth)
+        if blob_filter:
+            objects = await asyncio.to_thread(self._filter_objects, repo, objects, wants, blob_filter)
+        await self._send_stream(writer, repo._iter_pack(objects), "application/x-pygit-pack",
+                                {"X-PyGit-Shallow": ",".join(shallow)})
+
+    async def receive_pack(self, repo, headers, reader, writer):
+        # Spool to disk so a large push never sits in memory
+        with tempfile.TemporaryFile() as spool:
+            async for chunk in self._iter_body(reader, headers):
+                spool.write(chunk)
+            spool.seek(0)
+            try:
+                updates = json.loads(spool.readline())["updates"]
+                await asyncio.to_thread(repo._unpack, spool)
+            except (ValueError, KeyError) as e:
+                raise HTTPError(400, f"Bad pack: {e}")
+
+        results = {}
+        checkout = False
+        async with self._ref_lock(repo):
+            index = self._read_index(repo)
+            for update in updates:
+                branch, old, new = update["branch"], update.get("old"), update["new"]
+                if index["branches"].get(branch) != old:
+                    results[branch] = "rejected: stale old value, fetch first"
+                elif not repo._has_object("commit", new):
+                    results[branch] = "rejected: missing commit"
+                elif repo._checked_out_at(branch, index):
+                    # Its working tree would no longer match the branch
+                    results[branch] = "rejected: branch is checked out on the server"
+                else:
+                    index["branches"][branch] = new
+                    if index["current_branch"] == branch:
+                        index["head"] = new
+                        # An unborn current branch just got its first commit
+                        checkout = not repo._is_bare()
+                    results[branch] = "ok"
+            await asyncio.to_thread(self._write_index, repo, index)
+            if checkout:
+                await asyncio.to_thread(repo._restore_branch_state, index["current_branch"])
+        status = 200 if all(result == "ok" for result in results.values()) else 409
+        await self._send_json(writer, status, {"results": results})
+
+    def _filter_objects(self, repo, objects, wants, blob_filter):
+        """Drop the blobs a partial clone leaves on the server.
+
+        Blobs of the wanted tips are always sent, so the client can check
+        them out; other blobs only when within the size limit. A path filter
+        keeps just the blobs in its cone, which the client checks out sparsely.
+        """
+        prefix = blob_filter.get("path")
+        blob_limit = blob_filter.get("blob_limit")
+        cone = repo._make_cone([prefix]) if prefix else None
+        tip_blobs = {obj_hash for tip in wants for path, obj_hash in repo._read_commit(tip)["files"].items()
+                     if repo._in_sparse_cone(path, False, cone)}
+        in_cone = set(tip_blobs)
+        if prefix:
+            for kind, obj_hash in objects:
+                if kind == "commit":
+                    in_cone.update(h for path, h in repo._read_commit(obj_hash)["files"].items()
+                                   if repo._in_sparse_cone(path, False, cone))
+        kept = []
+        for kind, obj_hash in objects:
+            if kind == "blob" and obj_hash not in tip_blobs:
+                if prefix and obj_hash not in in_cone:
+                    continue
+                size = repo._object_size("blob", obj_hash)
+                if blob_limit is not None and (size is None or size > blob_limit):
+                    continue
+            kept.append((kind, obj_hash))
+        return kept
+
+    async def send_object(self, repo, obj_hash, writer):
+        if not repo._has_object("blob", obj_hash):
+            raise HTTPError(404, f"Object {obj_hash} not found")
+
+        def chunks():
+            with repo._open_object(obj_hash) as f:
+                while True:
+                    chunk = f.read(65536)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        await self._send_stream(writer, chunks(), "application/octet-stream")
+
+    async def legacy_push(self, headers, reader, writer):
+        """Accept the multipart upload of the latest commit's files used by older clients"""
+        body = await self._read_body(reader, headers)
+        content_type = headers.get("content-type", "")
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+        if not message.is_multipart():
+            raise HTTPError(400, "Expected multipart/form-data")
+
+        fields = {}
+        uploads = []
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            filename = part.get_filename()
+            payload = part.get_payload(decode=True)
+            if filename is not None:
+                uploads.append((filename, payload))
+            elif name:
+                fields[name] = payload.decode("utf-8")
+        if "username" not in fields or "repoName" not in fields:
+            raise HTTPError(400, "username and repoName are required")
+
+        repo = self._repo(fields["username"], fields["repoName"], create=True)
+        files = {}
+        for filename, payload in uploads:
+            obj_hash = hashlib.sha1(payload).hexdigest()
+            with open(repo.objects_dir / obj_hash, 'wb') as f:
+                f.write(payload)
+            files[filename] = obj_hash
+
+        async with self._ref_lock(repo):
+            index = self._read_index(repo)
+            branch = index["current_branch"]
+            if repo._checked_out_at(branch, index):
+                raise HTTPError(409, f"Branch '{branch}' is checked out on the server")
+            commit = {
+                "timestamp": datetime.datetime.now().isoformat(),
+                "message": fields.get("commitMessage", ""),
+                "files": files,
+                "parent": index["branches"].get(branch)
+            }
+            commit_hash = repo.hash_object(json.dumps(commit))
+            with open(repo.commits_dir / commit_hash, 'w') as f:
+                json.dump(commit, f)
+            index["branches"][branch] = commit_hash
+            index["head"] = commit_hash
+            await asyncio.to_thread(self._write_index, repo, index)
+            if not repo._is_bare():
+                # The branch was unborn, so nothing is checked out yet
+                await asyncio.to_thread(repo._restore_branch_state, branch)
+        await self._send_json(writer, 200, {"message": "Push received", "commit": commit_hash})
+
+    async def start(self):
+        """Start listening; returns the asyncio server (handy for tests and benchmarks)"""
+        return await asyncio.start_server(self.handle_client, self.host, self.port)
+
+    async def serve_forever(self):
+        server = await self.start()
+        print(f"Serving PyGit repositories from {self.root} on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+
+def serve(root=".", host="127.0.0.1", port=5000, allow_create=False):
+    try:
+        asyncio.run(PyGitServer(root, host, port, allow_create).serve_forever())
+    except KeyboardInterrupt:
+        print("Server stopped")
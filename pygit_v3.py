@@ -1,23 +1,723 @@
 import os
+import bisect
 import hashlib
+import heapq
 import json
+import contextlib
 import datetime
-import shutil
+import fnmatch
+import io
+import itertools
+import struct
+import sys
+import time
+import zlib
+from collections import OrderedDict, deque
+from collections.abc import ItemsView, Mapping, MutableMapping, ValuesView
 from pathlib import Path
-import requests
-import base64
-import getpass
-from urllib.parse import urlparse
+
+# Pack streams: a signature line, then "<kind> <hash> <size>\n" + raw bytes
+# per object, then a trailer line
+PACK_SIGNATURE = b"PYGITPACK 1\n"
+PACK_TRAILER = b"end\n"
+
+# Bundles: signature, "-<hash>" prerequisite lines, "<hash> <branch>" ref
+# lines, a blank line, then a pack stream
+BUNDLE_SIGNATURE = b"# pygit bundle v1\n"
+
+# ioctl request for cloning a whole file on btrfs/XFS (reflink)
+FICLONE = 0x40049409
+
+# Pack indexes: a signature line, then one fixed-size record per object,
+# sorted by hash, so lookups are a binary search
+PACK_KINDS = ("blob", "commit")
+IDX_SIGNATURE = b"PYGITIDX 1\n"
+IDX_ENTRY = struct.Struct(">20sBQQ")  # raw hash, kind, offset, size
+
+# The multi-pack index: a signature line, the number of packs, one pack
+# name per line, then fixed-size records sorted by hash across all packs
+MIDX_SIGNATURE = b"PYGITMIDX 1\n"
+MIDX_ENTRY = struct.Struct(">20sIBQQ")  # raw hash, pack number, kind, offset, size
+
+# Bitmap files: a signature line, then per commit its raw hash, the length
+# of its compressed bitmap and the bitmap itself
+BITMAP_SIGNATURE = b"PYGITBITMAP 1\n"
+BITMAP_ENTRY = struct.Struct(">20sI")
+# Besides every branch tip, every Nth commit gets a bitmap
+BITMAP_COMMIT_INTERVAL = 64
+
+# Index keys shared by all worktrees of a repository; the rest are per worktree
+SHARED_REF_KEYS = ("branches", "remote_branches")
+REFS_LOCK_TIMEOUT = 10
+MISSING = object()
+
+# Loose objects younger than this survive gc even when unreachable
+DEFAULT_PRUNE_EXPIRE = 14 * 24 * 3600
+# Loose objects younger than this are left out of incremental repacks, which
+# run in the background while commands may still be writing them
+LOOSE_PACK_GRACE = 60
+
+# Auto maintenance thresholds (overridable in config.json) and the method
+# behind each `maintenance run --task=<name>`
+DEFAULT_MAINTENANCE_LOOSE_OBJECTS = 1000
+DEFAULT_MAINTENANCE_PACK_LIMIT = 20
+MAINTENANCE_LOCK_TIMEOUT = 3600
+MAINTENANCE_TASKS = {
+    "loose-objects": "_pack_loose_objects",
+    "gc": "_gc",
+    "multi-pack-index": "_maintain_multi_pack_index",
+}
+
+# In-process object cache: total budget in bytes (config core.objectCacheSize)
+# and the largest blob worth keeping
+DEFAULT_OBJECT_CACHE_BYTES = 32 * 1024 * 1024
+OBJECT_CACHE_MAX_BLOB = 256 * 1024
+
+# Zero-copy checkout (config checkout.zeroCopy): blobs of at least this many
+# bytes (checkout.zeroCopyMinSize) are copied file-to-file in the kernel
+DEFAULT_ZERO_COPY_MIN_SIZE = 1024 * 1024
+COPY_CHUNK = 64 * 1024 * 1024
+
+
+class MissingObjectError(FileNotFoundError):
+    """A blob is neither stored locally nor could be fetched from the promisor remote"""
+
+
+class ObjectCache:
+    """Byte-bounded LRU of parsed commits and small blobs, keyed by (kind, hash).
+
+    Objects are content-addressed so entries never go stale. Cached commit
+    dicts are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_OBJECT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, kind, obj_hash):
+        entry = self._entries.get((kind, obj_hash))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((kind, obj_hash))
+        self.hits += 1
+        return entry[0]
+
+    def put(self, kind, obj_hash, value, size):
+        if size > self.max_bytes or (kind, obj_hash) in self._entries:
+            return
+        self._entries[(kind, obj_hash)] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class _CompactItems(ItemsView):
+    def __iter__(self):
+        digests = self._mapping._digests
+        for position, path in enumerate(self._mapping._paths):
+            yield path, digests[position * 20:position * 20 + 20].hex()
+
+
+class _CompactValues(ValuesView):
+    def __iter__(self):
+        digests = self._mapping._digests
+        for position in range(len(self._mapping._paths)):
+            yield digests[position * 20:position * 20 + 20].hex()
+
+
+class CompactPathMap(MutableMapping):
+    """Path -> hex SHA-1 mapping for staged files and commit trees.
+
+    Paths are kept in one sorted list of interned strings (so the same path
+    in the index and in every cached commit is a single object) and the
+    digests, as raw 20-byte hashes, in one bytearray at the same positions.
+    Lookups are a binary search, so loops over every path should walk items()
+    (cheap, in sorted order) and probe dicts or sets rather than the reverse.
+    That is roughly a third of the memory of a str -> str dict, with nothing
+    per entry for the garbage collector to track.
+    """
+
+    __slots__ = ("_paths", "_digests")
+
+    def __init__(self, items=()):
+        if not isinstance(items, Mapping):
+            items = dict(items)
+        # Already-sorted input (anything we wrote ourselves) sorts in linear time
+        pairs = sorted(items.items())
+        self._paths = [sys.intern(path) for path, _ in pairs]
+        self._digests = bytearray.fromhex("".join(obj_hash for _, obj_hash in pairs))
+
+    def _position(self, path):
+        position = bisect.bisect_left(self._paths, path)
+        if position < len(self._paths) and self._paths[position] == path:
+            return position
+        return -1
+
+    def __getitem__(self, path):
+        position = self._position(path)
+        if position < 0:
+            raise KeyError(path)
+        return self._digests[position * 20:position * 20 + 20].hex()
+
+    def get(self, path, default=None):
+        position = self._position(path)
+        if position < 0:
+            return default
+        return self._digests[position * 20:position * 20 + 20].hex()
+
+    def __contains__(self, path):
+        return isinstance(path, str) and self._position(path) >= 0
+
+    def __setitem__(self, path, obj_hash):
+        digest = bytes.fromhex(obj_hash)
+        position = bisect.bisect_left(self._paths, path)
+        if position < len(self._paths) and self._paths[position] == path:
+            self._digests[position * 20:position * 20 + 20] = digest
+        else:
+            self._paths.insert(position, sys.intern(path))
+            self._digests[position * 20:position * 20] = digest
+
+    def __delitem__(self, path):
+        position = self._position(path)
+        if position < 0:
+            raise KeyError(path)
+        del self._paths[position]
+        del self._digests[position * 20:position * 20 + 20]
+
+    def update(self, other=(), **kwargs):
+        # One sort-merge instead of an insertion per path
+        changes = dict(other, **kwargs)
+        if len(changes) < 64:
+            for path, obj_hash in changes.items():
+                self[path] = obj_hash
+            return
+        merged = self.to_dict()
+        merged.update(changes)
+        rebuilt = CompactPathMap(merged)
+        self._paths, self._digests = rebuilt._paths, rebuilt._digests
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def items(self):
+        return _CompactItems(self)
+
+    def values(self):
+        return _CompactValues(self)
+
+    def to_dict(self):
+        """Plain dict for JSON serialization"""
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"CompactPathMap({len(self)} paths)"
+
+# Tracing: PYGIT_TRACE=1 (or "stderr") prints a region/counter summary after
+# the command; any other value is a file that gets one JSON line per region,
+# plus the counters, appended per command
+class Tracer:
+    """Nested region timers and counters for one command"""
+
+    def __init__(self, target):
+        self.target = target
+        self.regions = {}   # "outer/inner" -> [calls, seconds]
+        self.counters = {}
+        self._stack = []
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def region(self, name):
+        self._stack.append(name)
+        # Registered on entry so regions list outermost first
+        totals = self.regions.setdefault("/".join(self._stack), [0, 0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals[0] += 1
+            totals[1] += time.perf_counter() - start
+            self._stack.pop()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self, command):
+        total = time.perf_counter() - self._start
+        if self.target.lower() in ("1", "true", "stderr"):
+            for path, (calls, seconds) in self.regions.items():
+                depth = path.count("/")
+                name = path.rsplit("/", 1)[-1]
+                print(f"trace: {'  ' * depth}{name} {seconds * 1000:.1f}ms ({calls} calls)", file=sys.stderr)
+            for name, value in sorted(self.counters.items()):
+                print(f"trace: counter {name}={value}", file=sys.stderr)
+            return
+        records = [{"event": "region", "command": command, "region": path, "depth": path.count("/"),
+                    "calls": calls, "ms": round(seconds * 1000, 3)}
+                   for path, (calls, seconds) in self.regions.items()]
+        records.append({"event": "command", "command": command, "pid": os.getpid(),
+                        "ms": round(total * 1000, 3), "counters": self.counters})
+        with open(self.target, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+
+_tracer = None
+_NO_TRACE = contextlib.nullcontext()
+
+
+def trace_region(name):
+    """Time a region when tracing is on; a shared no-op context manager otherwise"""
+    return _tracer.region(name) if _tracer else _NO_TRACE
+
+
+def trace_count(name, amount=1):
+    if _tracer:
+        _tracer.count(name, amount)
+
+
+class PackIndex:
+    """Hash -> (kind, offset, size) lookup table for one pack file"""
+
+    def __init__(self, idx_path):
+        with open(idx_path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(IDX_SIGNATURE):
+            raise ValueError(f"{idx_path} is not a pack index")
+        self._data = memoryview(data)[len(IDX_SIGNATURE):]
+        self._count = len(self._data) // IDX_ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, position):
+        start = position * IDX_ENTRY.size
+        return bytes(self._data[start:start + 20])
+
+    def position(self, obj_hash):
+        """Index of obj_hash in the sorted table, or None"""
+        key = bytes.fromhex(obj_hash)
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._key(low) == key:
+            return low
+        return None
+
+    def entry(self, position):
+        raw_hash, kind, offset, size = IDX_ENTRY.unpack_from(self._data, position * IDX_ENTRY.size)
+        return raw_hash.hex(), PACK_KINDS[kind], offset, size
+
+    def lookup(self, obj_hash):
+        position = self.position(obj_hash)
+        if position is None:
+            return None
+        return self.entry(position)[1:]
+
+    def __iter__(self):
+        for raw_hash, kind, offset, size in IDX_ENTRY.iter_unpack(self._data):
+            yield raw_hash.hex(), PACK_KINDS[kind], offset, size
+
+
+class PackWriter:
+    """Write objects into a new pack, then its index, with a single fsync each"""
+
+    def __init__(self, packs_dir):
+        packs_dir.mkdir(exist_ok=True)
+        self.packs_dir = packs_dir
+        self._tmp_path = packs_dir / f".tmp-{os.getpid()}-{id(self)}.pack"
+        self._file = open(self._tmp_path, 'w+b')
+        self._digest = hashlib.sha1()
+        self._entries = {}
+        self._write(PACK_SIGNATURE)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, obj_hash):
+        return obj_hash in self._entries
+
+    def _write(self, data):
+        self._file.write(data)
+        self._digest.update(data)
+
+    def add(self, kind, obj_hash, source, size):
+        """Append an object given as bytes or as a binary stream of `size` bytes"""
+        if obj_hash in self._entries:
+            return
+        self._write(f"{kind} {obj_hash} {size}\n".encode())
+        offset = self._file.tell()
+        if isinstance(source, bytes):
+            self._write(source)
+        else:
+            remaining = size
+            while remaining:
+                chunk = source.read(min(65536, remaining))
+                if not chunk:
+                    raise ValueError(f"short read packing {obj_hash}")
+                self._write(chunk)
+                remaining -= len(chunk)
+        self._entries[obj_hash] = (kind, offset, size)
+
+    def read(self, obj_hash):
+        """Bytes of an object already added to this unfinished pack"""
+        _, offset, size = self._entries[obj_hash]
+        self._file.flush()
+        return os.pread(self._file.fileno(), size, offset)
+
+    def finish(self):
+        """Seal the pack and write its index; returns the pack path (None if empty)"""
+        if not self._entries:
+            self.abort()
+            return None
+        self._write(PACK_TRAILER)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        pack_path = self.packs_dir / f"pack-{self._digest.hexdigest()}.pack"
+        os.replace(self._tmp_path, pack_path)
+        idx_tmp = pack_path.with_name(f".{pack_path.stem}.idx.tmp")
+        with open(idx_tmp, 'wb') as f:
+            f.write(IDX_SIGNATURE)
+            for obj_hash in sorted(self._entries):
+                kind, offset, size = self._entries[obj_hash]
+                f.write(IDX_ENTRY.pack(bytes.fromhex(obj_hash), PACK_KINDS.index(kind), offset, size))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(idx_tmp, pack_path.with_suffix(".idx"))
+        return pack_path
+
+    def abort(self):
+        self._file.close()
+        if self._tmp_path.exists():
+            os.remove(self._tmp_path)
+
+
+class MultiPackIndex:
+    """One sorted hash -> (pack, kind, offset, size) table covering many packs"""
+
+    def __init__(self, midx_path):
+        with open(midx_path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MIDX_SIGNATURE):
+            raise ValueError(f"{midx_path} is not a multi-pack index")
+        position = len(MIDX_SIGNATURE)
+        (pack_count,) = struct.unpack_from(">I", data, position)
+        position += 4
+        self.pack_names = []
+        for _ in range(pack_count):
+            end = data.index(b"\n", position)
+            self.pack_names.append(data[position:end].decode())
+            position = end + 1
+        self._data = memoryview(data)[position:]
+        self._count = len(self._data) // MIDX_ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, position):
+        start = position * MIDX_ENTRY.size
+        return bytes(self._data[start:start + 20])
+
+    def lookup(self, obj_hash):
+        """(pack name, kind, offset, size) for obj_hash, or None"""
+        key = bytes.fromhex(obj_hash)
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._key(low) == key:
+            _, pack_id, kind, offset, size = MIDX_ENTRY.unpack_from(self._data, low * MIDX_ENTRY.size)
+            return self.pack_names[pack_id], PACK_KINDS[kind], offset, size
+        return None
+
+    def __iter__(self):
+        """Yield (hash, pack name, kind, offset, size) in hash order"""
+        for raw_hash, pack_id, kind, offset, size in MIDX_ENTRY.iter_unpack(self._data):
+            yield raw_hash.hex(), self.pack_names[pack_id], PACK_KINDS[kind], offset, size
+
+    @staticmethod
+    def write(midx_path, pack_names, entries):
+        """Write sorted (hash, pack name, kind, offset, size) entries, keeping the first of any duplicates"""
+        pack_ids = {name: pack_id for pack_id, name in enumerate(pack_names)}
+        tmp_path = midx_path.with_name(f".{midx_path.name}.tmp")
+        count = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(MIDX_SIGNATURE)
+            f.write(struct.pack(">I", len(pack_names)))
+            for name in pack_names:
+                f.write(f"{name}\n".encode())
+            previous = None
+            for obj_hash, pack_name, kind, offset, size in entries:
+                if obj_hash == previous:
+                    continue
+                previous = obj_hash
+                f.write(MIDX_ENTRY.pack(bytes.fromhex(obj_hash), pack_ids[pack_name],
+                                        PACK_KINDS.index(kind), offset, size))
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, midx_path)
+        return count
+
+
+class BitmapIndex:
+    """Reachability bitmaps for selected commits of one pack.
+
+    Bit i of a commit's bitmap is set when the object at position i of the
+    pack index is reachable from that commit. Bitmaps are stored as
+    zlib-compressed little-endian integers and only inflated when used.
+    """
+
+    def __init__(self, bitmap_path):
+        self._compressed = {}
+        self._cache = {}
+        with open(bitmap_path, 'rb') as f:
+            if f.readline() != BITMAP_SIGNATURE:
+                raise ValueError(f"{bitmap_path} is not a bitmap index")
+            while True:
+                header = f.read(BITMAP_ENTRY.size)
+                if len(header) < BITMAP_ENTRY.size:
+                    break
+                raw_hash, length = BITMAP_ENTRY.unpack(header)
+                self._compressed[raw_hash.hex()] = f.read(length)
+
+    def __len__(self):
+        return len(self._compressed)
+
+    def __contains__(self, commit_hash):
+        return commit_hash in self._compressed
+
+    def get(self, commit_hash):
+        if commit_hash not in self._cache:
+            compressed = self._compressed.get(commit_hash)
+            if compressed is None:
+                return None
+            self._cache[commit_hash] = int.from_bytes(zlib.decompress(compressed), "little")
+        return self._cache[commit_hash]
+
+    @staticmethod
+    def positions(bits):
+        """Yield the index of every set bit"""
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        for byte_index, byte in enumerate(data):
+            while byte:
+                lowest = byte & -byte
+                yield byte_index * 8 + lowest.bit_length() - 1
+                byte ^= lowest
+
+    @staticmethod
+    def write(bitmap_path, bitmaps):
+        tmp_path = bitmap_path.with_name(f".{bitmap_path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(BITMAP_SIGNATURE)
+            for commit_hash, bits in bitmaps.items():
+                compressed = zlib.compress(bits.to_bytes((bits.bit_length() + 7) // 8, "little"))
+                f.write(BITMAP_ENTRY.pack(bytes.fromhex(commit_hash), len(compressed)))
+                f.write(compressed)
+        os.replace(tmp_path, bitmap_path)
+
+
+class ObjectSlice(io.RawIOBase):
+    """Read-only view of one object's bytes inside a pack"""
+
+    def __init__(self, pack_path, offset, size):
+        self._file = open(pack_path, 'rb')
+        self._file.seek(offset)
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._remaining)])
+        self._remaining -= count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+class FastImportStream:
+    """Line reader for a git fast-export stream: commands, with one line of
+    look-ahead, and `data` payloads in counted or delimited form"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._pending = None
+        self.line_number = 0
+
+    def readline(self):
+        """Next command line without its newline, or None at the end"""
+        if self._pending is not None:
+            line, self._pending = self._pending, None
+            return line
+        raw = self._stream.readline()
+        if not raw:
+            return None
+        self.line_number += 1
+        return raw.rstrip(b"\n").decode("utf-8", "surrogateescape")
+
+    def unread(self, line):
+        self._pending = line
+
+    def next_command(self):
+        """Next line that is not blank or a comment"""
+        while True:
+            line = self.readline()
+            if line is None or (line and not line.startswith("#")):
+                return line
+
+    def read_data(self):
+        """Payload of the `data` command that must come next, as bytes"""
+        line = self.readline()
+        if line is None or not line.startswith("data "):
+            raise ValueError(f"expected data, got {line!r}")
+        spec = line[len("data "):]
+        if spec.startswith("<<"):
+            delimiter = spec[2:].encode() + b"\n"
+            chunks = []
+            for raw in iter(self._stream.readline, b""):
+                self.line_number += 1
+                if raw == delimiter:
+                    return b"".join(chunks)
+                chunks.append(raw)
+            raise ValueError("unterminated data")
+        size = int(spec)
+        data = self._stream.read(size)
+        if len(data) != size:
+            raise ValueError("truncated data")
+        self.line_number += data.count(b"\n")
+        # The payload may be followed by a newline of its own
+        line = self.readline()
+        if line != "":
+            self.unread(line)
+        return data
+
+    @staticmethod
+    def path(text):
+        """A path that runs to the end of the line, C-quoted or not"""
+        return FastImportStream.split_path(text)[0] if text.startswith('"') else text
+
+    @staticmethod
+    def split_path(text):
+        """(path, rest) for a path that is C-quoted or runs to the next space"""
+        if not text.startswith('"'):
+            path, _, rest = text.partition(" ")
+            return path, rest
+        raw = text.encode("utf-8", "surrogateescape")
+        escapes = {ord("n"): 10, ord("t"): 9, ord("a"): 7, ord("b"): 8, ord("f"): 12, ord("v"): 11,
+                   ord("r"): 13, ord('"'): 34, ord("\\"): 92}
+        out = bytearray()
+        position = 1
+        while position < len(raw):
+            byte = raw[position]
+            if byte == 34:
+                return out.decode("utf-8", "surrogateescape"), raw[position + 2:].decode("utf-8", "surrogateescape")
+            if byte == 92:
+                escaped = raw[position + 1:position + 2]
+                if escaped.isdigit():
+                    out.append(int(raw[position + 1:position + 4], 8))
+                    position += 4
+                    continue
+                if not escaped or escaped[0] not in escapes:
+                    raise ValueError(f"bad escape in path {text!r}")
+                out.append(escapes[escaped[0]])
+                position += 2
+                continue
+            out.append(byte)
+            position += 1
+        raise ValueError(f"unterminated path {text!r}")
+
+
+def _fsck_hash_batch(batch):
+    """Rehash one batch of stored objects; runs in a worker process for fsck.
+
+    A batch is ("loose", [(kind, hash, path), ...]) or
+    ("pack", pack_path, [(kind, hash, offset, size), ...]). Returns
+    (kind, hash, location, actual hash or None, error) for every mismatch.
+    """
+    problems = []
+    if batch[0] == "loose":
+        for kind, obj_hash, path in batch[1]:
+            digest = hashlib.sha1()
+            try:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            except OSError as e:
+                problems.append((kind, obj_hash, path, None, str(e)))
+                continue
+            if digest.hexdigest() != obj_hash:
+                problems.append((kind, obj_hash, path, digest.hexdigest(), None))
+        return problems
+
+    _, pack_path, entries = batch
+    with open(pack_path, 'rb') as f:
+        for kind, obj_hash, offset, size in entries:
+            f.seek(offset)
+            digest = hashlib.sha1()
+            remaining = size
+            while remaining:
+                chunk = f.read(min(1 << 20, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            if remaining:
+                problems.append((kind, obj_hash, f"{pack_path}@{offset}", None, "truncated pack entry"))
+            elif digest.hexdigest() != obj_hash:
+                problems.append((kind, obj_hash, f"{pack_path}@{offset}", digest.hexdigest(), None))
+    return problems
+
 
 class PyGit:
     def __init__(self, repo_path="."):
         self.repo_path = Path(repo_path)
         self.git_dir = self.repo_path / ".pygit"
+        # Per-worktree state (index, sparse cone, fsmonitor journal). In a
+        # linked worktree .pygit is a file naming .pygit/worktrees/<name> of
+        # the main repository, and git_dir is that repository's .pygit
+        self.worktree_dir = self.git_dir
+        if self.git_dir.is_file():
+            with open(self.git_dir, 'r') as f:
+                self.worktree_dir = Path(f.read().split(":", 1)[1].strip())
+            self.git_dir = self.worktree_dir.parent.parent
         self.objects_dir = self.git_dir / "objects"
         self.config_path = self.git_dir / 'config.json'
         self.commits_dir = self.git_dir / "commits"
-        self.index_file = self.git_dir / "index.json"
+        self.packs_dir = self.git_dir / "packs"
+        self.index_file = self.worktree_dir / "index.json"
         self.ignore_file = self.repo_path / ".pygitignore"
+        self.sparse_file = self.worktree_dir / "info" / "sparse-checkout"
+        self._pack_cache = None
+        self._bitmap_cache = {}
+        self._object_cache = None
+        self._refs_snapshot = None
+        self._index_file_id = None
 
     def is_initialized(self):
         """Check if repository is initialized"""
@@ -54,120 +754,613 @@ class PyGit:
             index["current_branch"] = "main"
         return index
 
+    def _load_index(self):
+        with trace_region("index.load"):
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+                self._index_file_id = self._file_id(os.fstat(f.fileno()))
+            if self.worktree_dir != self.git_dir:
+                # Branches live in the main index, shared by every worktree
+                with open(self.git_dir / "index.json", 'r') as f:
+                    shared = json.load(f)
+                for key in SHARED_REF_KEYS:
+                    if key in shared:
+                        index[key] = shared[key]
+            index = self._ensure_branch_structure(index)
+            index["staged"] = CompactPathMap(index.get("staged", {}))
+            self._refs_snapshot = {key: dict(index.get(key, {})) for key in SHARED_REF_KEYS}
+            return index
+
+    @staticmethod
+    def _file_id(st):
+        # Index writes go through os.replace, so a rewrite also changes the inode
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _has_worktrees(self):
+        return (self.git_dir / "worktrees").is_dir()
+
+    @contextlib.contextmanager
+    def _refs_lock(self):
+        """Exclusive lock on the shared branches while worktrees exist"""
+        lock_path = self.git_dir / "refs.lock"
+        deadline = time.time() + REFS_LOCK_TIMEOUT
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - lock_path.stat().st_mtime > REFS_LOCK_TIMEOUT:
+                        # Left behind by a crashed process
+                        os.remove(lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f"Could not lock {lock_path}")
+                time.sleep(0.01)
+        try:
+            os.close(fd)
+            yield
+        finally:
+            os.remove(lock_path)
+
+    def _merge_shared_refs(self, index, shared):
+        """Apply the branch changes made since _load_index onto shared, in place.
+
+        Another worktree may have moved other branches meanwhile; only the
+        entries this process changed are written over them.
+        """
+        snapshot = self._refs_snapshot or {}
+        for key in SHARED_REF_KEYS:
+            mine, seen = index.get(key, {}), snapshot.get(key, {})
+            merged = dict(shared.get(key, {}))
+            for name in set(mine) | set(seen):
+                if name not in mine:
+                    merged.pop(name, None)
+                elif mine[name] != seen.get(name, MISSING):
+                    merged[name] = mine[name]
+            if merged or key in shared or key in index:
+                shared[key] = merged
+        self._refs_snapshot = {key: dict(shared.get(key, {})) for key in SHARED_REF_KEYS}
+
+    def _write_index_file(self, path, index):
+        # Replaced atomically: other worktrees read it without taking the lock
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+    def _save_index(self, index):
+        if isinstance(index.get("staged"), CompactPathMap):
+            index = dict(index, staged=index["staged"].to_dict())
+        with trace_region("index.write"):
+            if not self._has_worktrees():
+                with self._refs_lock():
+                    # A push may have moved branches since we loaded the index; keep those moves
+                    if self._index_file_id and self._index_file_id != self._file_id(os.stat(self.index_file)):
+                        with open(self.index_file, 'r') as f:
+                            shared = json.load(f)
+                        self._merge_shared_refs(index, shared)
+                        index = dict(index, **{key: shared[key] for key in SHARED_REF_KEYS if key in shared})
+                    self._write_index_file(self.index_file, index)
+                    self._index_file_id = self._file_id(os.stat(self.index_file))
+                return
+            with self._refs_lock():
+                shared_file = self.git_dir / "index.json"
+                with open(shared_file, 'r') as f:
+                    shared = json.load(f)
+                self._merge_shared_refs(index, shared)
+                if self.worktree_dir == self.git_dir:
+                    shared = dict(index, **{key: shared[key] for key in SHARED_REF_KEYS if key in shared})
+                else:
+                    self._write_index_file(self.index_file,
+                                           {key: value for key, value in index.items() if key not in SHARED_REF_KEYS})
+                self._write_index_file(shared_file, shared)
+
     def hash_object(self, content):
         """Create a hash of content similar to Git's blob objects"""
         return hashlib.sha1(content.encode()).hexdigest()
 
-    def add(self, file_path):
-        """Add a file or all files to staging area"""
-        if not self.is_initialized():
-            print("Not a PyGit repository! Please run 'init' first.")
-            return
+    def _read_config(self):
+        """Load config.json, or an empty config if none exists yet"""
+        if not self.config_path.exists():
+            return {}
+        with open(self.config_path, 'r') as f:
+            return json.load(f)
 
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
+    def _pack_paths(self):
+        """Pack files that have an index, re-listed whenever the packs directory changes"""
+        try:
+            mtime = self.packs_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._pack_cache is None or self._pack_cache[0] != mtime:
+            pack_paths = [pack_path for pack_path in sorted(self.packs_dir.glob("pack-*.pack"))
+                          if pack_path.with_suffix(".idx").exists()]
+            midx_path = self.packs_dir / "multi-pack-index"
+            try:
+                midx = MultiPackIndex(midx_path) if midx_path.exists() else None
+            except ValueError:
+                midx = None
+            # PackIndex objects are only loaded when a lookup needs them
+            self._pack_cache = (mtime, pack_paths, {}, midx)
+        return self._pack_cache[1]
+
+    def _pack_index(self, pack_path):
+        loaded = self._pack_cache[2]
+        if pack_path not in loaded:
+            loaded[pack_path] = PackIndex(pack_path.with_suffix(".idx"))
+        return loaded[pack_path]
+
+    def _packs(self):
+        """(pack path, PackIndex) pairs for every pack"""
+        return [(pack_path, self._pack_index(pack_path)) for pack_path in self._pack_paths()]
+
+    def _multi_pack_index(self):
+        self._pack_paths()
+        return self._pack_cache[3] if self._pack_cache else None
+
+    def _find_packed(self, obj_hash):
+        """Locate an object in the packs: (pack path, kind, offset, size) or None.
+
+        The multi-pack index answers in one binary search; only packs it
+        doesn't cover yet are probed one by one.
+        """
+        pack_paths = self._pack_paths()
+        midx = self._multi_pack_index()
+        covered = set()
+        if midx:
+            found = midx.lookup(obj_hash)
+            if found and (self.packs_dir / found[0]).exists():
+                return (self.packs_dir / found[0],) + found[1:]
+            covered = set(midx.pack_names)
+        for pack_path in pack_paths:
+            if pack_path.name in covered:
+                continue
+            found = self._pack_index(pack_path).lookup(obj_hash)
+            if found:
+                return (pack_path,) + found
+        return None
 
-        if file_path == ".":
-            files_added = False
-            for item in self.repo_path.glob("*"):
-                if (item.is_file() and 
-                    item.name != ".pygit" and 
-                    item.name != ".pygitignore"):
-                    self._add_single_file(item)
-                    files_added = True
-            if not files_added:
-                print("No files to add")
-            return
+    def _midx_entries(self, pack_name):
+        """A pack's index entries in multi-pack index form"""
+        for obj_hash, kind, offset, size in self._pack_index(self.packs_dir / pack_name):
+            yield obj_hash, pack_name, kind, offset, size
+
+    def _update_multi_pack_index(self):
+        """Bring the multi-pack index up to date, reading only the packs it doesn't cover yet"""
+        pack_names = [pack_path.name for pack_path in self._pack_paths()]
+        midx_path = self.packs_dir / "multi-pack-index"
+        if not pack_names:
+            if midx_path.exists():
+                os.remove(midx_path)
+            return 0
+        midx = self._multi_pack_index()
+        kept = [name for name in midx.pack_names if name in pack_names] if midx else []
+        added = [name for name in pack_names if name not in kept]
+        if midx and not added and len(kept) == len(midx.pack_names):
+            return 0
+
+        streams = []
+        if midx and kept:
+            kept_set = set(kept)
+            streams.append(entry for entry in midx if entry[1] in kept_set)
+        for name in added:
+            streams.append(self._midx_entries(name))
+        MultiPackIndex.write(midx_path, kept + added, heapq.merge(*streams, key=lambda entry: entry[0]))
+        return len(added)
+
+    def _open_object(self, obj_hash, kind="blob"):
+        """Open a stored object for binary streaming, loose or packed.
+
+        Blobs filtered out by a partial clone are fetched from the remote first.
+        """
+        obj_path = self._object_file(kind, obj_hash)
+        # Background maintenance may pack a loose object, or repack a pack,
+        # between finding it and opening it; then look again in the new packs
+        for attempt in range(2):
+            try:
+                if obj_path.exists():
+                    return open(obj_path, 'rb')
+                packed = self._find_packed(obj_hash)
+                if packed and packed[1] == kind:
+                    pack_path, _, offset, size = packed
+                    return io.BufferedReader(ObjectSlice(pack_path, offset, size))
+                break
+            except FileNotFoundError:
+                self._pack_cache = None
+        if kind == "blob":
+            self._fetch_promised_object(obj_hash)
+        return open(obj_path, 'rb')
+
+    def _object_size(self, kind, obj_hash):
+        obj_path = self._object_file(kind, obj_hash)
+        if obj_path.exists():
+            return obj_path.stat().st_size
+        packed = self._find_packed(obj_hash)
+        if packed and packed[1] == kind:
+            return packed[3]
+        return None
 
-        file_path = Path(file_path)
-        if not file_path.exists():
-            print(f"File {file_path} does not exist!")
-            return
-        if file_path.name == ".pygit" or file_path.name == ".pygitignore":
+    def _read_raw(self, kind, obj_hash):
+        with self._open_object(obj_hash, kind) as f:
+            data = f.read()
+        trace_count("objects_read")
+        trace_count("bytes_read", len(data))
+        return data
+
+    @property
+    def object_cache(self):
+        """The instance's LRU of parsed commits and small blobs, sized from config on first use"""
+        if self._object_cache is None:
+            max_bytes = self._read_config().get("core.objectCacheSize", DEFAULT_OBJECT_CACHE_BYTES)
+            self._object_cache = ObjectCache(int(max_bytes))
+        return self._object_cache
+
+    def _read_object(self, obj_hash):
+        """Read a blob as text, fetching it from the promisor remote if it was filtered out"""
+        content = self.object_cache.get("blob", obj_hash)
+        if content is None:
+            with self._open_object(obj_hash) as f:
+                content = io.TextIOWrapper(f).read()
+            trace_count("objects_read")
+            trace_count("bytes_read", len(content))
+            if len(content) <= OBJECT_CACHE_MAX_BLOB:
+                self.object_cache.put("blob", obj_hash, content, len(content))
+        return content
+
+    def _fetch_promised_object(self, obj_hash):
+        """Lazily download a blob omitted by a partial clone.
+
+        Raises MissingObjectError when the blob cannot be fetched or the
+        remote sends content that doesn't match its hash.
+        """
+        import requests
+        config = self._read_config()
+        api_url = self._remote_api(config["remote"]) if config.get("promisor") and config.get("remote") else None
+        if not api_url:
+            raise MissingObjectError(f"Object {obj_hash} is missing")
+        try:
+            with trace_region("network"):
+                response = requests.get(f"{api_url}/objects/{obj_hash}")
+        except requests.RequestException as e:
+            raise MissingObjectError(f"Object {obj_hash} is missing and could not be fetched: {e}") from None
+        if response.status_code != 200:
+            raise MissingObjectError(f"Object {obj_hash} is missing and could not be fetched: "
+                                     f"remote answered {response.status_code}")
+        if hashlib.sha1(response.content).hexdigest() != obj_hash:
+            raise MissingObjectError(f"Object {obj_hash} is missing; the remote sent corrupt content for it")
+        self._write_loose("blob", obj_hash, response.content)
+
+    def _read_shallow(self):
+        """Return the set of shallow boundary commits (parents not present locally)"""
+        shallow_file = self.git_dir / "shallow"
+        if not shallow_file.exists():
+            return set()
+        with open(shallow_file, 'r') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _read_stash(self):
+        """Stash commit hashes, newest first"""
+        stash_file = self.git_dir / "stash"
+        if not stash_file.exists():
+            return []
+        with open(stash_file, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _write_stash(self, hashes):
+        stash_file = self.git_dir / "stash"
+        if not hashes:
+            if stash_file.exists():
+                os.remove(stash_file)
             return
-        
-        self._add_single_file(file_path)
+        tmp_path = stash_file.with_name(f"stash.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.writelines(h + "\n" for h in hashes)
+        os.replace(tmp_path, stash_file)
+
+    def _read_commit(self, commit_hash):
+        """Load a commit's JSON (cached; do not modify the returned dict)"""
+        commit = self.object_cache.get("commit", commit_hash)
+        if commit is None:
+            raw = self._read_raw("commit", commit_hash)
+            commit = json.loads(raw)
+            commit["files"] = CompactPathMap(commit.get("files", {}))
+            self.object_cache.put("commit", commit_hash, commit, len(raw))
+        return commit
+
+    def _object_file(self, kind, obj_hash):
+        """Path of a stored blob or commit"""
+        return (self.commits_dir if kind == "commit" else self.objects_dir) / obj_hash
+
+    def _has_object(self, kind, obj_hash):
+        if self._object_file(kind, obj_hash).exists():
+            return True
+        packed = self._find_packed(obj_hash)
+        return bool(packed) and packed[1] == kind
+
+    def _bitmap_pack(self):
+        """(pack path, PackIndex, BitmapIndex) for the pack carrying bitmaps, or None"""
+        for pack_path in self._pack_paths():
+            bitmap_path = pack_path.with_suffix(".bitmap")
+            if bitmap_path.exists():
+                if pack_path not in self._bitmap_cache:
+                    self._bitmap_cache[pack_path] = BitmapIndex(bitmap_path)
+                return pack_path, self._pack_index(pack_path), self._bitmap_cache[pack_path]
+        return None
 
-    def _add_single_file(self, file_path):
-        """Helper method to add a single file"""
-        with open(file_path, 'r') as f:
-            content = f.read()
+    def _reach_bitmap(self, tips, pack_index, bitmaps):
+        """Everything reachable from `tips`, using stored bitmaps as shortcuts.
+
+        Returns (bits, extra): a bitmap over pack_index positions, and the
+        (kind, hash) pairs reachable but not in that pack.
+        """
+        shallow = self._read_shallow()
+        bits = 0
+        walked = bytearray((len(pack_index) + 7) // 8)
+        extra = set()
+        seen = set()
+        pending = [h for h in tips if h]
+        while pending:
+            commit_hash = pending.pop()
+            if commit_hash in seen:
+                continue
+            seen.add(commit_hash)
+            known = bitmaps.get(commit_hash)
+            if known is not None:
+                bits |= known
+                continue
+            if not self._has_object("commit", commit_hash):
+                continue
+            commit = self._read_commit(commit_hash)
+            for kind, obj_hash in itertools.chain([("commit", commit_hash)],
+                                                  (("blob", h) for h in commit["files"].values())):
+                position = pack_index.position(obj_hash)
+                if position is None:
+                    extra.add((kind, obj_hash))
+                else:
+                    walked[position >> 3] |= 1 << (position & 7)
+            if commit_hash not in shallow:
+                pending.extend(p for p in (commit.get("parent"), commit.get("merge_parent")) if p)
+        return bits | int.from_bytes(walked, "little"), extra
+
+    def _collect_objects_with_bitmaps(self, wants, haves):
+        bitmap_pack = self._bitmap_pack()
+        if not bitmap_pack:
+            return None
+        _, pack_index, bitmaps = bitmap_pack
+        want_bits, want_extra = self._reach_bitmap(wants, pack_index, bitmaps)
+        have_bits, have_extra = self._reach_bitmap(haves, pack_index, bitmaps)
+        objects = [pack_index.entry(position)[1::-1]
+                   for position in BitmapIndex.positions(want_bits & ~have_bits)]
+        objects.extend(sorted(want_extra - have_extra))
+        objects.sort(key=lambda obj: obj[0] != "commit")
+        return objects
+
+    def _write_bitmaps(self, pack_path, tips):
+        """Store bitmaps for the branch tips and every Nth commit below them"""
+        pack_index = PackIndex(pack_path.with_suffix(".idx"))
+        order = []
+        seen = set()
+        pending = deque(h for h in tips if h)
+        while pending:
+            commit_hash = pending.popleft()
+            if commit_hash in seen or pack_index.position(commit_hash) is None:
+                continue
+            seen.add(commit_hash)
+            order.append(commit_hash)
+            commit = self._read_commit(commit_hash)
+            pending.extend(p for p in (commit.get("parent"), commit.get("merge_parent")) if p)
+
+        selected = set(h for h in tips if h in seen)
+        selected.update(order[::BITMAP_COMMIT_INTERVAL])
+        bitmaps = {}
+        # Oldest first, so each walk stops at the bitmaps computed before it
+        for commit_hash in reversed(order):
+            if commit_hash in selected:
+                bitmaps[commit_hash], _ = self._reach_bitmap([commit_hash], pack_index, bitmaps)
+        BitmapIndex.write(pack_path.with_suffix(".bitmap"), bitmaps)
+        return len(bitmaps)
+
+    def _collect_objects(self, wants, haves=(), depth=None):
+        """Work out which commits and blobs a peer holding `haves` needs to reach `wants`.
+
+        Returns (objects, shallow) where objects is a list of (kind, hash)
+        pairs, commits first, and shallow lists the commits whose parents
+        were cut off by `depth`.
+        """
+        if depth is None:
+            objects = self._collect_objects_with_bitmaps(wants, haves)
+            if objects is not None:
+                return objects, []
+
+        local_shallow = self._read_shallow()
+
+        # Everything the other side already has
+        have_commits = set()
+        have_blobs = set()
+        pending = [h for h in haves if h and self._has_object("commit", h)]
+        while pending:
+            commit_hash = pending.pop()
+            if commit_hash in have_commits or not self._has_object("commit", commit_hash):
+                continue
+            have_commits.add(commit_hash)
+            commit = self._read_commit(commit_hash)
+            have_blobs.update(commit["files"].values())
+            if commit_hash not in local_shallow:
+                pending.extend(p for p in (commit.get("parent"), commit.get("merge_parent")) if p)
+
+        commits = []
+        blobs = []
+        seen_blobs = set(have_blobs)
+        shallow = []
+        visited = set()
+        queue = deque((h, 1) for h in wants if h)
+        while queue:
+            commit_hash, commit_depth = queue.popleft()
+            if commit_hash in visited or commit_hash in have_commits:
+                continue
+            visited.add(commit_hash)
+            if not self._has_object("commit", commit_hash):
+                continue
+            commit = self._read_commit(commit_hash)
+            commits.append(commit_hash)
+            for obj_hash in commit["files"].values():
+                if obj_hash not in seen_blobs:
+                    seen_blobs.add(obj_hash)
+                    blobs.append(obj_hash)
+            parents = [p for p in (commit.get("parent"), commit.get("merge_parent")) if p]
+            if commit_hash in local_shallow or (depth and commit_depth >= depth):
+                if parents:
+                    shallow.append(commit_hash)
+                continue
+            queue.extend((p, commit_depth + 1) for p in parents)
+
+        objects = [("commit", h) for h in commits] + [("blob", h) for h in blobs]
+        return objects, shallow
+
+    def _iter_pack(self, objects, chunk_size=65536):
+        """Stream objects as a pack without holding any of them in memory"""
+        yield PACK_SIGNATURE
+        for kind, obj_hash in objects:
+            size = self._object_size(kind, obj_hash)
+            if size is None:
+                # Promised by our own remote; the receiver can fetch it lazily too
+                continue
+            yield f"{kind} {obj_hash} {size}\n".encode()
+            with self._open_object(obj_hash, kind) as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        yield PACK_TRAILER
+
+    def _unpack(self, stream, chunk_size=65536):
+        """Store every object from a pack stream, verifying each hash.
+
+        Returns the list of (kind, hash) pairs that were written.
+        """
+        if stream.readline() != PACK_SIGNATURE:
+            raise ValueError("not a PyGit pack")
+        received = []
+        while True:
+            header = stream.readline()
+            if not header or header == PACK_TRAILER:
+                break
+            kind, obj_hash, size = header.decode().split()
+            size = int(size)
+            target = self._object_file(kind, obj_hash)
+            tmp_path = target.with_name(f".{obj_hash}.tmp")
+            digest = hashlib.sha1()
+            with open(tmp_path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    chunk = stream.read(min(chunk_size, remaining))
+                    if not chunk:
+                        raise ValueError("truncated pack")
+                    digest.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if digest.hexdigest() != obj_hash:
+                os.remove(tmp_path)
+                raise ValueError(f"corrupt object {obj_hash} in pack")
+            os.replace(tmp_path, target)
+            received.append((kind, obj_hash))
+            trace_count("objects_written")
+            trace_count("bytes_written", size)
+        return received
 
+    def add(self, file_path):
+        """Add a file or all files to staging area"""
+        from pygit_api import PyGitError, Repository
+        try:
+            added = Repository(pygit=self).add(file_path)
+        except PyGitError as e:
+            print(e)
+            return
+        if file_path == "." and not added:
+            print("No files to add")
+        for rel_path in added:
+            print(f"Added {rel_path} to staging area")
+
+    def _write_loose(self, kind, obj_hash, data):
+        """Write a loose object through a temporary file, so no reader (or a
+        concurrent repack) ever sees it half-written"""
+        target = self._object_file(kind, obj_hash)
+        tmp_path = target.with_name(f".{obj_hash}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+    def _write_blob(self, content):
+        """Store text content as a loose blob and return its hash.
+
+        An existing loose copy is left alone: it may be hardlinked into
+        another repository, and its content is the same anyway.
+        """
         obj_hash = self.hash_object(content)
-        obj_path = self.objects_dir / obj_hash
-        with open(obj_path, 'w') as f:
-            f.write(content)
-
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-        
-        index["staged"][str(file_path)] = obj_hash
-        
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
-        
-        print(f"Added {file_path} to staging area")
+        if self._object_file("blob", obj_hash).exists():
+            return obj_hash
+        with trace_region("objects.write"):
+            self._write_loose("blob", obj_hash, content.encode())
+        trace_count("objects_written")
+        trace_count("bytes_written", len(content))
+        return obj_hash
+
+    def _write_commit(self, commit_hash, commit):
+        with trace_region("objects.write"):
+            self._write_loose("commit", commit_hash, json.dumps(commit).encode())
+        trace_count("objects_written")
 
     def commit(self, message):
         """Create a commit with staged changes"""
-        if not self.is_initialized():
-            print("Not a PyGit repository! Please run 'init' first.")
-            return
-
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-
-        if not index["staged"]:
-            print("Nothing to commit!")
+        from pygit_api import PyGitError, Repository
+        try:
+            commit = Repository(pygit=self).commit(message)
+        except PyGitError as e:
+            print(e)
             return
-
-        commit = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "message": message,
-            "files": index["staged"],
-            "parent": index["branches"][index["current_branch"]]
-        }
-        
-        commit_hash = self.hash_object(json.dumps(commit))
-        commit_path = self.commits_dir / commit_hash
-        with open(commit_path, 'w') as f:
-            json.dump(commit, f)
-
-        index["branches"][index["current_branch"]] = commit_hash
-        index["head"] = commit_hash
-        index["staged"] = {}
-        
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
-        
-        print(f"Committed: {commit_hash[:7]} {message}")
+        print(f"Committed: {commit.hash[:7]} {message}")
+        self._maybe_auto_maintenance()
 
     def log(self):
         """Show commit history"""
-        if not self.is_initialized():
-            print("Not a PyGit repository! Please run 'init' first.")
+        from pygit_api import PyGitError, Repository
+        try:
+            for commit in Repository(pygit=self).log():
+                print(f"commit {commit.hash[:7]}" + (" (grafted)" if commit.grafted else ""))
+                print(f"Date: {commit.timestamp}")
+                print(f"    {commit.message}\n")
+        except PyGitError as e:
+            print(e)
+
+    def diff(self, *revs):
+        """Show changes between HEAD (or the first rev) and the working tree (or the second rev)"""
+        from pygit_api import PyGitError, Repository
+        if len(revs) > 2:
+            print("Invalid diff command usage")
             return
+        try:
+            diffs = Repository(pygit=self).diff(*revs)
+        except PyGitError as e:
+            print(e)
+            return
+        for file_diff in diffs:
+            print(f"diff {file_diff.path} ({file_diff.change})")
+            print("--- " + ("/dev/null" if file_diff.change == "added" else f"a/{file_diff.path}"))
+            print("+++ " + ("/dev/null" if file_diff.change == "deleted" else f"b/{file_diff.path}"))
+            for hunk in file_diff.hunks:
+                print(hunk.header)
+                for line in hunk.lines:
+                    print(line)
 
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-        
-        current_hash = index["branches"][index["current_branch"]]
-        while current_hash:
-            commit_path = self.commits_dir / current_hash
-            with open(commit_path, 'r') as f:
-                commit = json.load(f)
-            
-            print(f"commit {current_hash[:7]}")
-            print(f"Date: {commit['timestamp']}")
-            print(f"    {commit['message']}\n")
-            
-            current_hash = commit["parent"]
-    
     def get_latest_commit_hash(self):
+        # The branch tip is authoritative; commit files may have been packed by gc
+        index = self._load_index()
+        if index["branches"][index["current_branch"]]:
+            return index["branches"][index["current_branch"]]
         try:
             commits = sorted(self.commits_dir.iterdir(), key=os.path.getmtime, reverse=True)
             if commits:
@@ -177,225 +1370,645 @@ class PyGit:
         return None
 
 
+    def _ignore_rules(self):
+        """Patterns from .pygitignore as (pattern, directories only, match full path)"""
+        rules = []
+        if self.ignore_file.exists():
+            with open(self.ignore_file, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    dir_only = line.endswith("/")
+                    line = line.strip("/")
+                    rules.append((line, dir_only, "/" in line))
+        return rules
+
+    def _ignore_rules_hash(self):
+        """Hash of .pygitignore plus the sparse-checkout cone, which together decide what is walked"""
+        digest = None
+        for path in (self.ignore_file, self.sparse_file):
+            if path.exists():
+                digest = digest or hashlib.sha1()
+                with open(path, 'rb') as f:
+                    digest.update(f.read() + b"\0")
+        return digest.hexdigest() if digest else None
+
+    def _sparse_cone(self):
+        """The sparse-checkout cone as (directories, their ancestors), or None for a full checkout"""
+        if not self.sparse_file.exists():
+            return None
+        with open(self.sparse_file, 'r') as f:
+            return self._make_cone(line.strip().strip("/") for line in f if line.strip().strip("/"))
+
+    @staticmethod
+    def _make_cone(dirs):
+        dirs = frozenset(dirs)
+        parents = frozenset(d.rsplit("/", i)[0] for d in dirs for i in range(1, d.count("/") + 1))
+        return dirs, parents
+
+    def _in_sparse_cone(self, rel_path, is_dir, cone):
+        """Cone mode: files at the top level and directly in an ancestor of a
+        cone directory, and everything under a cone directory"""
+        if cone is None:
+            return True
+        dirs, parents = cone
+        if is_dir and (rel_path in dirs or rel_path in parents):
+            return True
+        parent = rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+        if not is_dir and (not parent or parent in parents):
+            return True
+        parts = rel_path.split("/")
+        return any("/".join(parts[:depth]) in dirs for depth in range(1, len(parts)))
+
+    def _is_ignored(self, rel_path, is_dir, rules):
+        name = rel_path.rsplit("/", 1)[-1]
+        for pattern, dir_only, anchored in rules:
+            if dir_only and not is_dir:
+                continue
+            if fnmatch.fnmatchcase(rel_path if anchored else name, pattern):
+                return True
+        return False
+
+    def _path_ignored(self, rel_path, rules):
+        """Whether rel_path or any directory above it is ignored"""
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts) + 1):
+            if self._is_ignored("/".join(parts[:depth]), depth < len(parts), rules):
+                return True
+        return False
+
+    def _walk_worktree(self, rules, top="", untracked_cache=None, rules_hash=None, cone=None):
+        """Yield (repo-relative path, stat) for every non-ignored file under top.
+
+        Directories outside the sparse-checkout cone are never listed.
+
+        With an untracked cache (directory -> [mtime, ignore-rules hash, file
+        names, subdirectory names]) a directory whose mtime and rules are
+        unchanged is not re-listed: its cached names are stat'ed directly. The
+        cache is rebuilt in place from the directories visited.
+        """
+        previous = dict(untracked_cache) if untracked_cache is not None else {}
+        if untracked_cache is not None:
+            untracked_cache.clear()
+        pending = [top]
+        while pending:
+            rel_dir = pending.pop()
+            try:
+                dir_stat = os.stat(self.repo_path / rel_dir)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            cached = previous.get(rel_dir)
+            if cached and cached[0] == dir_stat.st_mtime_ns and cached[1] == rules_hash:
+                untracked_cache[rel_dir] = cached
+                for name in cached[2]:
+                    rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                    try:
+                        yield rel_path, os.stat(self.repo_path / rel_path)
+                    except FileNotFoundError:
+                        continue
+                pending.extend(f"{rel_dir}/{name}" if rel_dir else name for name in cached[3])
+                continue
+
+            try:
+                entries = list(os.scandir(self.repo_path / rel_dir))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            files, subdirs = [], []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if rel_path in (".pygit", ".pygitignore"):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if not self._is_ignored(rel_path, True, rules) and self._in_sparse_cone(rel_path, True, cone):
+                        subdirs.append(entry.name)
+                        pending.append(rel_path)
+                elif (entry.is_file() and not self._is_ignored(rel_path, False, rules) and
+                      self._in_sparse_cone(rel_path, False, cone)):
+                    files.append(entry.name)
+                    yield rel_path, entry.stat()
+            # A listing taken in the same timestamp tick as a later change would look current
+            if untracked_cache is not None and time.time_ns() - dir_stat.st_mtime_ns >= 1_000_000_000:
+                untracked_cache[rel_dir] = [dir_stat.st_mtime_ns, rules_hash, files, subdirs]
+
+    def _hash_worktree_file(self, rel_path, st, cached):
+        """Blob hash of a worktree file, reusing the stat cache entry while mtime and size match.
+
+        Returns (hash, new cache entry). Files modified within the last second
+        are cached without a hash, since a second write in the same timestamp
+        tick would go unnoticed. Blobs are text, so a file that isn't gets a
+        warning and None as hash, and is cached as binary.
+        """
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            if cached[2]:
+                return cached[2], cached
+            if len(cached) > 3:
+                return None, cached
+        with trace_region("hash"):
+            try:
+                with open(self.repo_path / rel_path, 'r') as f:
+                    content = f.read()
+            except UnicodeDecodeError:
+                print(f"Skipping binary file {rel_path} (list it in .pygitignore to silence this)",
+                      file=sys.stderr)
+                return None, [st.st_mtime_ns, st.st_size, None, "binary"]
+            obj_hash = self.hash_object(content)
+        trace_count("files_hashed")
+        trace_count("bytes_hashed", len(content))
+        racy = time.time_ns() - st.st_mtime_ns < 1_000_000_000
+        return obj_hash, [st.st_mtime_ns, st.st_size, None if racy else obj_hash]
+
+    def _fsmonitor_journal(self):
+        return self.worktree_dir / "fsmonitor" / "journal"
+
+    def _scan_worktree(self, index):
+        with trace_region("worktree.scan"):
+            return self._scan_worktree_files(index)
+
+    def _scan_worktree_files(self, index):
+        """Map every worktree file to its blob hash.
+
+        Uses and refreshes the stat cache in index["stat_cache"]. When the
+        fsmonitor is running and index["fsmonitor_token"] is still valid only
+        the paths changed since that token are stat'ed; otherwise the whole
+        tree is walked. The caller saves the index.
+        """
+        stat_cache = index.get("stat_cache", {})
+        rules = self._ignore_rules()
+        cone = self._sparse_cone()
+        monitored = None
+        token = None
+        if self._fsmonitor_journal().exists():
+            from pygit_fsmonitor import changed_since, current_token, sync
+            # Without the sync, a file written just before this scan could be missing from the journal
+            if sync(str(self.repo_path), str(self.worktree_dir)):
+                monitored = changed_since(str(self.worktree_dir), index.get("fsmonitor_token"))
+            if monitored and ".pygitignore" in monitored[1]:
+                monitored = None
+            # Taken before walking, so changes made during the walk replay next time
+            token = monitored[0] if monitored else current_token(str(self.worktree_dir))
+
+        new_cache = {}
+        current_files = {}
+        if monitored:
+            changed = monitored[1]
+            candidates = set(stat_cache)
+            to_check = set()
+            for rel_path in changed:
+                full_path = self.repo_path / rel_path
+                if rel_path in (".", ".pygitignore") or self._path_ignored(rel_path, rules):
+                    continue
+                if full_path.is_dir():
+                    if self._in_sparse_cone(rel_path, True, cone):
+                        to_check.update(path for path, _ in self._walk_worktree(rules, rel_path, cone=cone))
+                    prefix = rel_path + "/"
+                    candidates.difference_update([path for path in candidates if path.startswith(prefix)])
+                elif full_path.exists():
+                    if self._in_sparse_cone(rel_path, False, cone):
+                        to_check.add(rel_path)
+                else:
+                    candidates.discard(rel_path)
+                    prefix = rel_path + "/"
+                    candidates.difference_update([path for path in candidates if path.startswith(prefix)])
+            for rel_path in candidates | to_check:
+                cached = stat_cache.get(rel_path)
+                if rel_path not in to_check and cached and cached[2]:
+                    current_files[rel_path] = cached[2]
+                    new_cache[rel_path] = cached
+                    continue
+                try:
+                    st = os.stat(self.repo_path / rel_path)
+                except FileNotFoundError:
+                    continue
+                obj_hash, new_cache[rel_path] = self._hash_worktree_file(rel_path, st, cached)
+                if obj_hash:
+                    current_files[rel_path] = obj_hash
+        else:
+            untracked_cache = index.get("untracked_cache", {})
+            for rel_path, st in self._walk_worktree(rules, "", untracked_cache, self._ignore_rules_hash(), cone):
+                obj_hash, new_cache[rel_path] = self._hash_worktree_file(rel_path, st, stat_cache.get(rel_path))
+                if obj_hash:
+                    current_files[rel_path] = obj_hash
+
+        index["stat_cache"] = new_cache
+        if not monitored:
+            index["untracked_cache"] = untracked_cache
+        if token:
+            index["fsmonitor_token"] = token
+        else:
+            index.pop("fsmonitor_token", None)
+        return current_files
+
     def status(self):
         """Show working directory status"""
-        if not self.is_initialized():
-            print("Not a PyGit repository! Please run 'init' first.")
+        from pygit_api import PyGitError, Repository
+        try:
+            status = Repository(pygit=self).status()
+        except PyGitError as e:
+            print(e)
             return
 
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-
-        print(f"On branch {index['current_branch']}")
-        
-        committed_files = {}
-        current_head = index["branches"][index["current_branch"]]
-        if current_head:
-            with open(self.commits_dir / current_head, 'r') as f:
-                last_commit = json.load(f)
-            committed_files = last_commit["files"]
-
-        current_files = {}
-        for file_path in self.repo_path.glob("*"):
-            if (file_path.is_file() and 
-                file_path.name != ".pygit" and 
-                file_path.name != ".pygitignore"):
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                current_files[str(file_path)] = self.hash_object(content)
-
-        staged = index["staged"]
-        if staged:
+        print(f"On branch {status.branch}")
+        if status.staged:
             print("Changes staged for commit:")
             print("  (use 'commit' to commit these changes)")
-            for file_path, hash_val in staged.items():
+            for file_path in status.staged:
                 print(f"    staged: {file_path}")
             print()
 
-        modified = []
-        for file_path, current_hash in current_files.items():
-            committed_hash = committed_files.get(file_path)
-            staged_hash = staged.get(file_path)
-            if (committed_hash and committed_hash != current_hash and 
-                not (staged_hash and staged_hash == current_hash)):
-                modified.append(file_path)
-
-        if modified:
+        if status.modified:
             print("Changes not staged for commit:")
             print("  (use 'add' to stage these changes)")
-            for file_path in modified:
+            for file_path in status.modified:
                 print(f"    modified: {file_path}")
             print()
 
-        untracked = [fp for fp in current_files.keys() 
-                    if fp not in committed_files and fp not in staged]
-        if untracked:
+        if status.untracked:
             print("Untracked files:")
             print("  (use 'add' to track these files)")
-            for file_path in untracked:
+            for file_path in status.untracked:
                 print(f"    {file_path}")
             print()
 
-        if not (staged or modified or untracked):
+        if status.clean:
             print("Nothing to commit, working directory clean")
 
     def branch(self, *args):
         """Handle branch operations: create, delete, rename, list"""
-        if not self.is_initialized():
-            print("Not a PyGit repository! Please run 'init' first.")
-            return
-
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-
-        if not args:
-            for branch_name, commit_hash in index["branches"].items():
-                prefix = "*" if branch_name == index["current_branch"] else " "
-                commit_info = commit_hash[:7] if commit_hash else "no commits"
-                print(f"{prefix} {branch_name} ({commit_info})")
-            return
-
-        if len(args) == 1 and args[0] != "-d" and args[0] != "-m":
-            branch_name = args[0]
-            if branch_name in index["branches"]:
-                print(f"Branch '{branch_name}' already exists!")
-                return
-            index["branches"][branch_name] = index["branches"][index["current_branch"]]
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
-            print(f"Created branch '{branch_name}'")
-        
-        elif len(args) == 2 and args[0] == "-d":
-            branch_name = args[1]
-            if branch_name not in index["branches"]:
-                print(f"Branch '{branch_name}' does not exist!")
-                return
-            if branch_name == index["current_branch"]:
-                print("Cannot delete the current branch!")
-                return
-            del index["branches"][branch_name]
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
-            print(f"Deleted branch '{branch_name}'")
-        
-        elif len(args) == 3 and args[0] == "-m":
-            old_name, new_name = args[1], args[2]
-            if old_name not in index["branches"]:
-                print(f"Branch '{old_name}' does not exist!")
-                return
-            if new_name in index["branches"]:
-                print(f"Branch '{new_name}' already exists!")
-                return
-            index["branches"][new_name] = index["branches"][old_name]
-            del index["branches"][old_name]
-            if index["current_branch"] == old_name:
-                index["current_branch"] = new_name
-            with open(self.index_file, 'w') as f:
-                json.dump(index, f)
-            print(f"Renamed branch '{old_name}' to '{new_name}'")
-        
-        else:
-            print("Invalid branch command usage")
-
-    def _get_working_dir_changes(self):
-        """Check for staged or unstaged changes in working directory"""
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
-
-        committed_files = {}
-        current_head = index["branches"][index["current_branch"]]
-        if current_head:
-            with open(self.commits_dir / current_head, 'r') as f:
-                last_commit = json.load(f)
-            committed_files = last_commit["files"]
-
-        current_files = {}
-        for file_path in self.repo_path.glob("*"):
-            if (file_path.is_file() and 
-                file_path.name != ".pygit" and 
-                file_path.name != ".pygitignore"):
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                current_files[str(file_path)] = self.hash_object(content)
-
-        has_staged = bool(index["staged"])
-        has_modified = False
-        for file_path, current_hash in current_files.items():
-            committed_hash = committed_files.get(file_path)
-            staged_hash = index["staged"].get(file_path)
-            if (committed_hash and committed_hash != current_hash and 
-                not (staged_hash and staged_hash == current_hash)):
-                has_modified = True
-                break
+        from pygit_api import PyGitError, Repository
+        repo = Repository(pygit=self)
+        try:
+            if not args:
+                for branch in repo.branches():
+                    prefix = "*" if branch.current else " "
+                    commit_info = branch.commit[:7] if branch.commit else "no commits"
+                    print(f"{prefix} {branch.name} ({commit_info})")
+            elif len(args) == 1 and args[0] != "-d" and args[0] != "-m":
+                repo.create_branch(args[0])
+                print(f"Created branch '{args[0]}'")
+            elif len(args) == 2 and args[0] == "-d":
+                repo.delete_branch(args[1])
+                print(f"Deleted branch '{args[1]}'")
+            elif len(args) == 3 and args[0] == "-m":
+                repo.rename_branch(args[1], args[2])
+                print(f"Renamed branch '{args[1]}' to '{args[2]}'")
+            else:
+                print("Invalid branch command usage")
+        except PyGitError as e:
+            print(e)
 
-        return has_staged, has_modified
+    def _restore_branch_state(self, branch_name, previous_commit=None):
+        """Restore working directory to match branch state.
 
-    def _restore_branch_state(self, branch_name):
-        """Restore working directory to match branch state"""
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
+        Files of previous_commit (the HEAD being left) and files in the stat
+        cache that the branch doesn't have are removed, along with any
+        directories that leaves empty.
+        """
+        index = self._load_index()
 
         target_commit = index["branches"][branch_name]
         target_files = {}
         if target_commit:
-            with open(self.commits_dir / target_commit, 'r') as f:
-                commit = json.load(f)
+            commit = self._read_commit(target_commit)
             target_files = commit["files"]
 
-        for file_path in self.repo_path.glob("*"):
-            if (file_path.is_file() and 
-                file_path.name != ".pygit" and 
-                file_path.name != ".pygitignore"):
-                file_str = str(file_path)
-                if file_str not in target_files:
-                    os.remove(file_path)
-
+        # Binary files are never tracked, so the stat cache entries marking them are left out
+        outgoing = {path for path, entry in index.get("stat_cache", {}).items() if len(entry) < 4}
+        if previous_commit:
+            outgoing.update(self._read_commit(previous_commit)["files"])
+        for file_str in sorted(outgoing):
+            if file_str in target_files or file_str == ".pygitignore":
+                continue
+            file_path = self.repo_path / file_str
+            if not file_path.is_file():
+                continue
+            os.remove(file_path)
+            parent = file_path.parent
+            while parent != self.repo_path:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+        cone = self._sparse_cone()
+        zero_copy_min = self._zero_copy_min_size()
         for file_path, obj_hash in target_files.items():
-            with open(self.objects_dir / obj_hash, 'r') as f:
-                content = f.read()
-            with open(file_path, 'w') as f:
-                f.write(content)
+            if not self._in_sparse_cone(file_path, False, cone):
+                continue
+            self._checkout_blob(obj_hash, self.repo_path / file_path, zero_copy_min)
+
+    def _zero_copy_min_size(self):
+        """Size from which checkout copies blobs in the kernel, or None when checkout.zeroCopy is off"""
+        config = self._read_config()
+        # `pygit config` stores strings, config.json edited by hand may hold a boolean
+        if config.get("checkout.zeroCopy") not in (True, "true", "1", "yes"):
+            return None
+        return int(config.get("checkout.zeroCopyMinSize", DEFAULT_ZERO_COPY_MIN_SIZE))
+
+    def _checkout_blob(self, obj_hash, target, zero_copy_min=None):
+        """Write a blob to a worktree file.
+
+        Large blobs, when zero_copy_min is set, go straight from the loose
+        object or the pack to the file without passing through Python.
+        """
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if zero_copy_min is not None:
+            size = self._object_size("blob", obj_hash)
+            if size is not None and size >= zero_copy_min:
+                loose = self._object_file("blob", obj_hash)
+                if loose.exists():
+                    self._copy_file_range(loose, 0, size, target)
+                    return
+                packed = self._find_packed(obj_hash)
+                if packed:
+                    self._copy_file_range(packed[0], packed[2], size, target)
+                    return
+        # The blob's bytes as stored, like the zero-copy path: text mode would rewrite line endings
+        content = self.object_cache.get("raw", obj_hash)
+        if content is None:
+            content = self._read_raw("blob", obj_hash)
+            if len(content) <= OBJECT_CACHE_MAX_BLOB:
+                self.object_cache.put("raw", obj_hash, content, len(content))
+        with open(target, 'wb') as f:
+            f.write(content)
+
+    def _copy_file_range(self, src, offset, size, dst):
+        """Copy size bytes at offset in src to a new dst: a reflink for whole
+        files, then copy_file_range (which itself reflinks on btrfs/XFS when
+        the range allows), then sendfile, then a buffered copy"""
+        with trace_region("checkout.copy"), open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            if offset == 0 and size == os.fstat(fsrc.fileno()).st_size:
+                try:
+                    import fcntl
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    trace_count("checkout_reflinked")
+                    return
+                except (ImportError, OSError):
+                    pass
+            copied = 0
+            for method in ("copy_file_range", "sendfile"):
+                if not hasattr(os, method):
+                    continue
+                try:
+                    while copied < size:
+                        count = min(size - copied, COPY_CHUNK)
+                        if method == "copy_file_range":
+                            sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), count, offset + copied)
+                        else:
+                            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset + copied, count)
+                        if not sent:
+                            break
+                        copied += sent
+                except OSError:
+                    # Unsupported here (old kernel, cross-filesystem, special file); carry on
+                    # from where it stopped with the next method
+                    fdst.seek(copied)
+                    continue
+                if copied == size:
+                    trace_count(f"checkout_{method}")
+                    return
+            fsrc.seek(offset + copied)
+            fdst.seek(copied)
+            while copied < size:
+                chunk = fsrc.read(min(size - copied, COPY_CHUNK))
+                if not chunk:
+                    raise ValueError(f"{src} is shorter than expected")
+                fdst.write(chunk)
+                copied += len(chunk)
+            trace_count("checkout_buffered")
 
     def checkout(self, branch_name):
         """Switch to a branch with warnings and file restoration"""
+        from pygit_api import PyGitError, Repository, UncommittedChangesError
+        try:
+            Repository(pygit=self).checkout(branch_name)
+        except UncommittedChangesError as e:
+            print("Warning: You have uncommitted changes!")
+            if e.staged:
+                print("- Staged changes will be lost")
+            if e.modified:
+                print("- Unstaged modifications will be lost")
+            print("Please commit or stash your changes before switching branches.")
+            return
+        except PyGitError as e:
+            print(e)
+            return
+        print(f"Switched to branch '{branch_name}'")
+
+    def _apply_sparse_checkout(self):
+        """Write missing files inside the cone and remove unmodified ones outside it.
+
+        Returns (files written, files removed, modified files kept outside the cone).
+        """
+        index = self._load_index()
+        head = index["branches"][index["current_branch"]]
+        files = self._read_commit(head)["files"] if head else {}
+        cone = self._sparse_cone()
+        zero_copy_min = self._zero_copy_min_size()
+        written, removed, kept = 0, 0, []
+        for file_path, obj_hash in files.items():
+            target = self.repo_path / file_path
+            if self._in_sparse_cone(file_path, False, cone):
+                if not target.exists():
+                    self._checkout_blob(obj_hash, target, zero_copy_min)
+                    written += 1
+                continue
+            if not target.exists():
+                continue
+            # Bytes as checked out, so line endings count
+            with open(target, 'rb') as f:
+                current = hashlib.sha1(f.read()).hexdigest()
+            if current != obj_hash and index["staged"].get(file_path) != current:
+                kept.append(file_path)
+                continue
+            os.remove(target)
+            removed += 1
+            parent = target.parent
+            while parent != self.repo_path and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        # The fsmonitor journal says nothing about paths that just entered the cone
+        index.pop("fsmonitor_token", None)
+        self._save_index(index)
+        return written, removed, kept
+
+    def _worktrees(self):
+        """(working tree path, per-worktree dir) for the main tree and each linked worktree"""
+        worktrees = [(self.git_dir.parent.resolve(), self.git_dir)]
+        worktrees_dir = self.git_dir / "worktrees"
+        if worktrees_dir.is_dir():
+            for admin_dir in sorted(worktrees_dir.iterdir()):
+                try:
+                    with open(admin_dir / "gitdir", 'r') as f:
+                        worktrees.append((Path(f.read().strip()).parent, admin_dir))
+                except FileNotFoundError:
+                    continue
+        return worktrees
+
+    def _worktree_indexes(self, exclude_self=False):
+        """Yield (path, raw index) per worktree; branches are only in the main one"""
+        for path, admin_dir in self._worktrees():
+            if exclude_self and admin_dir == self.worktree_dir:
+                continue
+            try:
+                with open(admin_dir / "index.json", 'r') as f:
+                    yield path, json.load(f)
+            except FileNotFoundError:
+                continue
+
+    def _is_bare(self):
+        """A repository that is only pushed to: its working tree is never checked out"""
+        return self._read_config().get("core.bare") in (True, "true")
+
+    def _checked_out_at(self, branch_name, index):
+        """Working tree a ref update of branch_name would leave behind, or None.
+
+        That is this tree when the branch is its (born) current branch, or a
+        linked worktree that has it checked out; bare repositories have none.
+        """
+        if self._is_bare():
+            return None
+        if branch_name == index["current_branch"] and index["branches"].get(branch_name):
+            return self.repo_path.resolve()
+        return self._branch_worktree(branch_name)
+
+    def _branch_worktree(self, branch_name):
+        """Path of another worktree that has branch_name checked out, if any"""
+        for path, index in self._worktree_indexes(exclude_self=True):
+            if index.get("current_branch", "main") == branch_name:
+                return path
+        return None
+
+    def worktree(self, *args):
+        """Manage extra working trees that share this repository: add, list, remove, prune"""
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
 
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
+        if len(args) == 3 and args[0] == "add":
+            path, branch_name = Path(args[1]).resolve(), args[2]
+            if path.exists() and (not path.is_dir() or any(path.iterdir())):
+                print(f"'{path}' already exists and is not an empty directory")
+                return
+            index = self._load_index()
+            if branch_name not in index["branches"]:
+                index["branches"][branch_name] = index["branches"][index["current_branch"]]
+                self._save_index(index)
+                print(f"Created branch '{branch_name}'")
+            elif index["current_branch"] == branch_name:
+                print(f"Branch '{branch_name}' is already checked out in worktree {self.repo_path.resolve()}")
+                return
+            else:
+                checked_out = self._branch_worktree(branch_name)
+                if checked_out:
+                    print(f"Branch '{branch_name}' is already checked out in worktree {checked_out}")
+                    return
+
+            name = path.name
+            suffix = 0
+            while (self.git_dir / "worktrees" / name).exists():
+                suffix += 1
+                name = f"{path.name}-{suffix}"
+            admin_dir = self.git_dir / "worktrees" / name
+            admin_dir.mkdir(parents=True)
+            with open(admin_dir / "gitdir", 'w') as f:
+                f.write(str(path / ".pygit") + "\n")
+            with open(admin_dir / "index.json", 'w') as f:
+                json.dump({"staged": {}, "head": index["branches"][branch_name],
+                           "current_branch": branch_name}, f)
+            path.mkdir(parents=True, exist_ok=True)
+            with open(path / ".pygit", 'w') as f:
+                f.write(f"pygitdir: {admin_dir.resolve()}\n")
+            with open(path / ".pygitignore", 'w') as f:
+                f.write(".pygit\n")
+            PyGit(path)._restore_branch_state(branch_name)
+            print(f"Prepared worktree '{path}' on branch '{branch_name}'")
+
+        elif args == ("list",):
+            for path, index in self._worktree_indexes():
+                head = index.get("head")
+                missing = "" if path.exists() else " (missing)"
+                print(f"{path}  {head[:7] if head else 'no commits'} [{index.get('current_branch', 'main')}]{missing}")
+
+        elif args[:1] == ("remove",) and len([arg for arg in args[1:] if arg != "--force"]) == 1:
+            path = Path(next(arg for arg in args[1:] if arg != "--force")).resolve()
+            admin_dir = next((admin for wt_path, admin in self._worktrees()[1:] if wt_path.resolve() == path), None)
+            if admin_dir is None:
+                print(f"'{path}' is not a linked worktree")
+                return
+            if "--force" not in args and path.exists():
+                from pygit_api import Repository
+                status = Repository(pygit=PyGit(path)).status()
+                if status.staged or status.modified:
+                    print("Worktree has uncommitted changes; use --force to remove it anyway")
+                    return
+                if status.untracked:
+                    print("Worktree has untracked files; use --force to remove it anyway")
+                    return
+            if path.exists():
+                import shutil
+                try:
+                    shutil.rmtree(path)
+                except OSError as e:
+                    print(f"Could not remove worktree '{path}': {e}")
+                    return
+            self._remove_worktree_dir(admin_dir)
+            print(f"Removed worktree '{path}'")
+
+        elif args == ("prune",):
+            pruned = 0
+            for path, admin_dir in self._worktrees()[1:]:
+                if not (path / ".pygit").is_file():
+                    self._remove_worktree_dir(admin_dir)
+                    pruned += 1
+            print(f"Pruned {pruned} stale worktree entries")
 
-        if branch_name not in index["branches"]:
-            print(f"Branch '{branch_name}' does not exist!")
+        else:
+            print("Usage: pygit worktree add <path> <branch> | list | remove [--force] <path> | prune")
+
+    def _remove_worktree_dir(self, admin_dir):
+        import shutil
+        shutil.rmtree(admin_dir)
+        worktrees_dir = self.git_dir / "worktrees"
+        if not any(worktrees_dir.iterdir()):
+            # Without linked worktrees, index writes need no lock again
+            worktrees_dir.rmdir()
+
+    def sparse_checkout(self, *args):
+        """Limit the working tree to a cone of directories: set, list or disable"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
             return
 
-        if branch_name == index["current_branch"]:
-            print(f"Already on branch '{branch_name}'")
+        if len(args) >= 2 and args[0] == "set":
+            dirs = sorted({arg.strip("/").removeprefix("./") for arg in args[1:]} - {"", "."})
+            if any(part == ".." for d in dirs for part in d.split("/")):
+                print("Sparse checkout directories must be inside the repository")
+                return
+            self.sparse_file.parent.mkdir(exist_ok=True)
+            with open(self.sparse_file, 'w') as f:
+                f.writelines(d + "\n" for d in dirs)
+        elif args == ("disable",):
+            if not self.sparse_file.exists():
+                print("Sparse checkout is not enabled")
+                return
+            os.remove(self.sparse_file)
+        elif args == ("list",):
+            cone = self._sparse_cone()
+            if cone is None:
+                print("Sparse checkout is not enabled")
+            for d in sorted(cone[0]) if cone else []:
+                print(d)
             return
-
-        has_staged, has_modified = self._get_working_dir_changes()
-        if has_staged or has_modified:
-            print("Warning: You have uncommitted changes!")
-            if has_staged:
-                print("- Staged changes will be lost")
-            if has_modified:
-                print("- Unstaged modifications will be lost")
-            print("Please commit or stash your changes before switching branches.")
+        else:
+            print("Usage: pygit sparse-checkout set <dir>... | list | disable")
             return
 
-        index["current_branch"] = branch_name
-        index["head"] = index["branches"][branch_name]
-        self._restore_branch_state(branch_name)
-        
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
-        
-        print(f"Switched to branch '{branch_name}'")
+        written, removed, kept = self._apply_sparse_checkout()
+        print(f"Updated working tree: {written} files written, {removed} removed")
+        for file_path in kept:
+            print(f"Kept modified file outside the cone: {file_path}")
     
 
     # Configure user details email and username
@@ -420,28 +2033,743 @@ class PyGit:
             json.dump({"username": username, "token": token}, f)
         print(f"Logged in as {username}")
 
-    #push
-    def push(self):
-        commit_hash = self.get_latest_commit_hash()
-        if not commit_hash:
+    def _remote_api(self, remote_url):
+        """Base API URL for a remote of the form http://host/username/repoName"""
+        from urllib.parse import urlparse
+        parsed = urlparse(remote_url)
+        parts = parsed.path.strip("/").split("/")
+        if len(parts) != 2:
+            return None
+        username, repo_name = parts
+        return f"{parsed.scheme}://{parsed.netloc}/api/repos/{username}/{repo_name}"
+
+    def _local_remote_path(self, remote_url):
+        """Filesystem path of a file:// or plain-path remote, or None for HTTP remotes"""
+        from urllib.parse import urlparse
+        if remote_url.startswith("file://"):
+            return Path(urlparse(remote_url).path)
+        if "://" not in remote_url:
+            return Path(remote_url)
+        return None
+
+    def _link_file(self, src, dst):
+        """Hardlink src to dst, falling back to a reflink and then to a plain copy"""
+        import shutil
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+        try:
+            import fcntl
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except (ImportError, OSError):
+            pass
+        shutil.copy2(src, dst)
+
+    def _copy_objects_from(self, source, objects):
+        """Bring objects over from another repository on this machine; returns how many were new"""
+        copied = 0
+        packs_needed = set()
+        for kind, obj_hash in objects:
+            if self._has_object(kind, obj_hash):
+                continue
+            src = source._object_file(kind, obj_hash)
+            if src.exists():
+                self._link_file(src, self._object_file(kind, obj_hash))
+                copied += 1
+                continue
+            packed = source._find_packed(obj_hash)
+            if packed:
+                # Packed objects can't be linked one by one, so link the whole pack
+                packs_needed.add(packed[0])
+                copied += 1
+        for pack_path in packs_needed:
+            self.packs_dir.mkdir(exist_ok=True)
+            for suffix in (".pack", ".idx", ".bitmap"):
+                dst = self.packs_dir / pack_path.with_suffix(suffix).name
+                if not dst.exists() and pack_path.with_suffix(suffix).exists():
+                    self._link_file(pack_path.with_suffix(suffix), dst)
+        if packs_needed:
+            self._update_multi_pack_index()
+        return copied
+
+    def _push_local(self, remote_path):
+        """Push the current branch straight into a repository on this machine"""
+        remote = PyGit(remote_path)
+        if not remote.is_initialized():
+            print(f"No PyGit repository at {remote_path}")
+            return
+
+        index = self._load_index()
+        branch = index["current_branch"]
+        local_tip = index["branches"][branch]
+        if not local_tip:
             print("No commits to push.")
             return
 
-        commit_file = self.commits_dir / commit_hash
-        with open(commit_file, 'r') as f:
-            commit_data = json.load(f)
+        remote_index = remote._load_index()
+        remote_tip = remote_index["branches"].get(branch)
+        if remote_tip == local_tip:
+            print("Everything up-to-date")
+            return
+        if remote_tip and not self._is_ancestor(remote_tip, local_tip):
+            print(f"Push rejected: '{branch}' on the remote is not an ancestor of your branch (non-fast-forward).")
+            return
+        checked_out = remote._checked_out_at(branch, remote_index)
+        if checked_out:
+            print(f"Push rejected: '{branch}' is checked out in {checked_out} and its files would not match. "
+                  "Check out another branch there, or set \"core.bare\": true in the .pygit/config.json "
+                  "of a repository that is only pushed to.")
+            return
 
-        with open(self.config_path, 'r') as f:
-            config = json.load(f)
+        objects, _ = self._collect_objects([local_tip], [remote_tip] if remote_tip else [])
+        copied = remote._copy_objects_from(self, objects)
+        remote_index["branches"][branch] = local_tip
+        is_current = remote_index["current_branch"] == branch
+        if is_current:
+            remote_index["head"] = local_tip
+        remote._save_index(remote_index)
+        # An unborn current branch just got its first commit; check it out
+        if is_current and not remote._is_bare():
+            remote._restore_branch_state(branch)
+        print(f"Pushed {copied} objects: {branch} -> {local_tip[:7]}")
+
+    def _clone_local(self, source_path, depth=None, filter_spec=None):
+        """Clone a repository on this machine by linking its objects"""
+        source = PyGit(source_path)
+        if not source.is_initialized():
+            print(f"No PyGit repository at {source_path}")
+            return
+        repo_name = source_path.resolve().name
+        if Path(repo_name).exists() and any(Path(repo_name).iterdir()):
+            print(f"Destination '{repo_name}' already exists and is not empty.")
+            return
+        if filter_spec:
+            print("Note: --filter is ignored for local clones; objects are linked, not copied")
 
-        password = getpass.getpass("Password: ")
+        with open(source.index_file, 'r') as f:
+            index = json.load(f)
+        index = source._ensure_branch_structure(index)
+        tips = [h for h in index["branches"].values() if h]
+        objects, shallow = source._collect_objects(tips, depth=depth)
 
-        # Extract repo name from remote URL
+        cloned = PyGit(repo_name)
+        cloned.repo_path.mkdir(exist_ok=True)
+        cloned.git_dir.mkdir()
+        cloned.objects_dir.mkdir()
+        cloned.commits_dir.mkdir()
+        copied = cloned._copy_objects_from(source, objects)
+
+        current_branch = index["current_branch"]
+        with open(cloned.index_file, 'w') as f:
+            json.dump({
+                "staged": {},
+                "head": index["branches"][current_branch],
+                "branches": dict(index["branches"]),
+                "current_branch": current_branch
+            }, f)
+        if shallow:
+            with open(cloned.git_dir / "shallow", 'w') as f:
+                f.write("".join(f"{commit_hash}\n" for commit_hash in shallow))
+        with open(cloned.config_path, 'w') as f:
+            json.dump({"remote": str(source_path.resolve())}, f)
+        with open(cloned.ignore_file, 'w') as f:
+            f.write(".pygit\n")
+
+        cloned._restore_branch_state(current_branch)
+        print(f"Repository '{repo_name}' cloned successfully ({copied} objects linked).")
+
+    def _resolve_rev(self, rev, index):
+        """Turn a branch name, origin/<branch> or (abbreviated) commit hash into a commit hash"""
+        if rev in index["branches"]:
+            return index["branches"][rev]
+        if rev in index.get("remote_branches", {}):
+            return index["remote_branches"][rev]
+        if rev == "HEAD":
+            return index["branches"][index["current_branch"]]
+        if len(rev) >= 4 and self.commits_dir.exists():
+            matches = {p.name for p in self.commits_dir.iterdir() if p.name.startswith(rev)}
+            for _, pack_index in self._packs():
+                matches.update(h for h, kind, _, _ in pack_index if kind == "commit" and h.startswith(rev))
+            if len(matches) == 1:
+                return matches.pop()
+        return None
+
+    def bundle(self, *args):
+        """Create, verify or unpack a bundle file: a ref list plus a pack"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+        if len(args) >= 3 and args[0] == "create":
+            self._bundle_create(args[1], args[2:])
+        elif len(args) == 2 and args[0] in ("unbundle", "verify"):
+            self._bundle_read(args[1], apply=args[0] == "unbundle")
+        else:
+            print("Usage: pygit bundle create <file> <rev-range>... | bundle verify <file> | bundle unbundle <file>")
+
+    def _bundle_create(self, bundle_path, revs):
+        index = self._load_index()
+
+        # "A..B" and "^A B" both mean: everything in B that A doesn't have
+        positive, negative = [], []
+        for rev in revs:
+            if rev == "--all":
+                positive.extend(name for name, tip in index["branches"].items() if tip)
+            elif ".." in rev:
+                base, tip = rev.split("..", 1)
+                negative.append(base)
+                positive.append(tip or "HEAD")
+            elif rev.startswith("^"):
+                negative.append(rev[1:])
+            else:
+                positive.append(rev)
+
+        # Each tip becomes a branch on unbundle: a branch keeps its name, HEAD
+        # takes the current branch's, and anything else needs "<rev>:<branch>"
+        refs = []
+        for rev in positive:
+            rev, _, name = rev.partition(":")
+            if not name:
+                if rev == "HEAD":
+                    name = index["current_branch"]
+                elif rev in index["branches"]:
+                    name = rev
+                else:
+                    print(f"'{rev}' is not a branch; name the branch it should become with '{rev}:<branch>'")
+                    return
+            commit_hash = self._resolve_rev(rev, index)
+            if not commit_hash:
+                print(f"Unknown revision '{rev}'")
+                return
+            refs.append((commit_hash, name))
+        prerequisites = []
+        for rev in negative:
+            commit_hash = self._resolve_rev(rev, index)
+            if not commit_hash:
+                print(f"Unknown revision '{rev}'")
+                return
+            prerequisites.append(commit_hash)
+        if not refs:
+            print("Refusing to create an empty bundle.")
+            return
+
+        objects, _ = self._collect_objects([h for h, _ in refs], prerequisites)
+        for kind, obj_hash in objects:
+            if kind == "blob" and not self._has_object(kind, obj_hash):
+                self._fetch_promised_object(obj_hash)
+
+        with open(bundle_path, 'wb') as f:
+            f.write(BUNDLE_SIGNATURE)
+            for commit_hash in prerequisites:
+                f.write(f"-{commit_hash}\n".encode())
+            for commit_hash, name in refs:
+                f.write(f"{commit_hash} {name}\n".encode())
+            f.write(b"\n")
+            for chunk in self._iter_pack(objects):
+                f.write(chunk)
+        print(f"Created bundle {bundle_path} with {len(objects)} objects")
+
+    def _bundle_read(self, bundle_path, apply):
+        if not os.path.exists(bundle_path):
+            print(f"Bundle {bundle_path} does not exist!")
+            return
+        with open(bundle_path, 'rb') as f:
+            if f.readline() != BUNDLE_SIGNATURE:
+                print(f"{bundle_path} is not a PyGit bundle")
+                return
+            prerequisites, refs = [], []
+            for line in iter(f.readline, b"\n"):
+                if not line:
+                    print(f"{bundle_path} is truncated")
+                    return
+                line = line.decode().strip()
+                if line.startswith("-"):
+                    prerequisites.append(line[1:])
+                else:
+                    commit_hash, name = line.split(" ", 1)
+                    refs.append((commit_hash, name))
+
+            missing = [h for h in prerequisites if not self._has_object("commit", h)]
+            if missing:
+                print("Repository lacks the commits this bundle builds on:")
+                for commit_hash in missing:
+                    print(f"    {commit_hash}")
+                return
+            if not apply:
+                print(f"{bundle_path} is okay")
+                for commit_hash, name in refs:
+                    print(f"{commit_hash} {name}")
+                return
+
+            received = self._unpack(f)
+
+        index = self._load_index()
+        current_head = index["branches"][index["current_branch"]]
+        for commit_hash, name in refs:
+            current = index["branches"].get(name)
+            if current == commit_hash:
+                print(f"{commit_hash[:7]} {name} (up to date)")
+            elif name == index["current_branch"] and current:
+                print(f"{commit_hash[:7]} {name} (checked out, not updated; merge or check out another branch first)")
+            elif current and not self._is_ancestor(current, commit_hash):
+                print(f"{commit_hash[:7]} {name} (not updated, non-fast-forward)")
+            else:
+                index["branches"][name] = commit_hash
+                if name == index["current_branch"]:
+                    index["head"] = commit_hash
+                print(f"{commit_hash[:7]} {name}")
+        self._save_index(index)
+        # An unborn current branch just got its first commit; check it out
+        if index["head"] and not current_head:
+            self._restore_branch_state(index["current_branch"])
+        print(f"Unbundled {len(received)} objects")
+
+    def fast_import(self, *args):
+        """Read a git fast-export stream on stdin and write its objects and branches in bulk"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+        force, import_marks, export_marks = False, None, None
+        for arg in args:
+            if arg == "--force":
+                force = True
+            elif arg.startswith("--import-marks="):
+                import_marks = arg.split("=", 1)[1]
+            elif arg.startswith("--export-marks="):
+                export_marks = arg.split("=", 1)[1]
+            else:
+                print("Usage: pygit fast-import [--force] [--import-marks=<file>] [--export-marks=<file>] < stream")
+                return
+
+        marks = {}
+        if import_marks and os.path.exists(import_marks):
+            with open(import_marks, 'r') as f:
+                for line in f:
+                    mark, obj_hash = line.split()
+                    marks[mark] = obj_hash
+
+        stream = FastImportStream(sys.stdin.buffer)
+        start = time.perf_counter()
+        try:
+            tips, commit_count, blob_count = self._fast_import(stream, marks)
+        except ValueError as e:
+            print(f"fast-import failed at line {stream.line_number}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+
+        # The one index write of the import: move the branches to their new tips
+        index = self._load_index()
+        current_head = index["branches"][index["current_branch"]]
+        for ref, commit_hash in tips.items():
+            short = commit_hash[:7] if commit_hash else "0000000"
+            current = index["branches"].get(ref)
+            if ref.startswith("refs/"):
+                print(f"{short} {ref} (not a branch, skipped)")
+            elif current == commit_hash:
+                print(f"{short} {ref} (up to date)")
+            elif ref == index["current_branch"] and current:
+                print(f"{short} {ref} (checked out, not updated; check out another branch first)")
+            elif self._branch_worktree(ref):
+                print(f"{short} {ref} (checked out in worktree {self._branch_worktree(ref)}, not updated)")
+            elif current and not force and not (commit_hash and self._is_ancestor(current, commit_hash)):
+                print(f"{short} {ref} (not updated, non-fast-forward; use --force)")
+            else:
+                index["branches"][ref] = commit_hash
+                if ref == index["current_branch"]:
+                    index["head"] = commit_hash
+                print(f"{short} {ref}")
+        self._save_index(index)
+        if export_marks:
+            tmp_path = f"{export_marks}.tmp"
+            with open(tmp_path, 'w') as f:
+                for mark, obj_hash in marks.items():
+                    f.write(f"{mark} {obj_hash}\n")
+            os.replace(tmp_path, export_marks)
+        # An unborn current branch just got its first commit; check it out
+        if index["head"] and not current_head:
+            self._restore_branch_state(index["current_branch"])
+
+        rate = commit_count / elapsed if elapsed else 0.0
+        print(f"Imported {commit_count} commits and {blob_count} blobs in {elapsed:.2f}s ({rate:.0f} commits/s)")
+
+    def _fast_import(self, stream, marks):
+        """Write a fast-export stream's blobs and commits into a new pack.
+
+        Neither the working tree nor the index is touched: each branch's file
+        map is kept in memory and updated in place by the stream's file
+        commands, and all objects go into one pack (a new one after each
+        `checkpoint`) with a single fsync. Returns ({ref: tip}, commit count,
+        blob count); marks is filled in as the stream defines them.
+        """
+        index = self._load_index()
+        tips = {}
+        # ref -> (its tip, that commit's files, their paths in sorted order,
+        # the JSON-encoded '"path": "hash"' entry of each), which the next
+        # commit on the ref starts from: it re-encodes only the paths it
+        # modifies, and re-sorts only when paths are added or removed
+        tip_files = {}
+        encoded_keys = {}
+        commit_count = blob_count = 0
+        writer = PackWriter(self.packs_dir)
+
+        def optional(prefix):
+            line = stream.readline()
+            if line is not None and line.startswith(prefix):
+                return line[len(prefix):]
+            stream.unread(line)
+            return None
+
+        def has(kind, obj_hash):
+            return obj_hash in writer or self._has_object(kind, obj_hash)
+
+        def marked(mark):
+            if mark not in marks:
+                raise ValueError(f"unknown mark {mark}")
+            return marks[mark]
+
+        def add_blob(data):
+            nonlocal blob_count
+            obj_hash = hashlib.sha1(data).hexdigest()
+            if not has("blob", obj_hash):
+                writer.add("blob", obj_hash, data, len(data))
+                blob_count += 1
+            return obj_hash
+
+        def branch(ref):
+            return ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+
+        def resolve(rev):
+            if rev.startswith(":"):
+                return marked(rev)
+            if branch(rev) in tips:
+                return tips[branch(rev)]
+            if branch(rev) in index["branches"]:
+                return index["branches"][branch(rev)]
+            if rev == "0" * 40:
+                return None
+            if len(rev) == 40 and has("commit", rev):
+                return rev
+            raise ValueError(f"cannot resolve {rev!r}")
+
+        def files_of(commit_hash):
+            """(files, sorted paths, entries) of a commit, as copies the caller may change"""
+            if commit_hash is None:
+                return {}, [], []
+            for tip, files, order, entries in tip_files.values():
+                if tip == commit_hash:
+                    return dict(files), list(order), list(entries)
+            raw = writer.read(commit_hash) if commit_hash in writer else self._read_raw("commit", commit_hash)
+            files = json.loads(raw)["files"]
+            # Commit file maps keep the order their files were staged in
+            return files, sorted(files), None
+
+        def encode(path, obj_hash):
+            """A file map entry as json.dumps writes it"""
+            key = encoded_keys.get(path)
+            if key is None:
+                key = encoded_keys[path] = json.dumps(path) + ": "
+            return f'{key}"{obj_hash}"'
+
+        def matching(files, path):
+            """Paths in files that are path itself or lie under it"""
+            if path in files:
+                return [path]
+            return [p for p in files if p.startswith(path + "/")]
+
+        try:
+            while True:
+                line = stream.next_command()
+                if line is None or line == "done":
+                    break
+                command, _, arg = line.partition(" ")
+                if command == "blob":
+                    mark = optional("mark ")
+                    optional("original-oid ")
+                    obj_hash = add_blob(stream.read_data())
+                    if mark:
+                        marks[mark] = obj_hash
+
+                elif command == "commit":
+                    ref = branch(arg)
+                    mark = optional("mark ")
+                    optional("original-oid ")
+                    optional("author ")
+                    committer = optional("committer ")
+                    if committer is None:
+                        raise ValueError(f"commit on {arg} has no committer")
+                    optional("encoding ")
+                    message = stream.read_data().decode("utf-8", "replace").rstrip("\n")
+                    parent_rev = optional("from ")
+                    merges = []
+                    merge = optional("merge ")
+                    while merge is not None:
+                        merges.append(resolve(merge))
+                        merge = optional("merge ")
+                    if parent_rev is not None:
+                        parent = resolve(parent_rev)
+                    else:
+                        parent = tips[ref] if ref in tips else index["branches"].get(ref)
+                    if ref in tip_files and tip_files[ref][0] == parent:
+                        _, files, order, entries = tip_files[ref]
+                    else:
+                        files, order, entries = files_of(parent)
+                    modified = []
+
+                    for line in iter(stream.readline, None):
+                        if line.startswith("M "):
+                            mode, dataref, path = line[2:].split(" ", 2)
+                            path = stream.path(path)
+                            if mode == "040000":
+                                raise ValueError("tree entries are not supported")
+                            # Submodules have no PyGit counterpart
+                            if mode == "160000":
+                                continue
+                            if dataref == "inline":
+                                obj_hash = add_blob(stream.read_data())
+                            elif dataref.startswith(":"):
+                                obj_hash = marked(dataref)
+                            elif has("blob", dataref):
+                                obj_hash = dataref
+                            else:
+                                raise ValueError(f"unknown blob {dataref}")
+                            if path not in files:
+                                order = None
+                            modified.append(path)
+                            files[path] = obj_hash
+                        elif line.startswith("D "):
+                            for path in matching(files, stream.path(line[2:])):
+                                del files[path]
+                                order = None
+                        elif line.startswith(("C ", "R ")):
+                            source, target = stream.split_path(line[2:])
+                            target = stream.path(target)
+                            for path in matching(files, source):
+                                files[target + path[len(source):]] = files[path]
+                                if line[0] == "R":
+                                    del files[path]
+                            order = None
+                        elif line == "deleteall":
+                            files.clear()
+                            order = None
+                        else:
+                            stream.unread(line)
+                            break
+
+                    # "Name <email> <seconds> <+hhmm>"
+                    seconds = int(committer.rsplit(">", 1)[1].split()[0])
+                    if order is None:
+                        order = sorted(files)
+                        entries = None
+                    if entries is None:
+                        entries = [encode(path, files[path]) for path in order]
+                    else:
+                        for path in modified:
+                            entries[bisect.bisect_left(order, path)] = encode(path, files[path])
+                    # Same bytes as json.dumps of the commit dict, keys in the
+                    # order Repository.commit writes them
+                    head = json.dumps({"timestamp": datetime.datetime.fromtimestamp(seconds).isoformat(),
+                                       "message": message})
+                    tail = {"parent": parent}
+                    # Commits have a single merge parent; octopus merges keep the first
+                    if merges:
+                        tail["merge_parent"] = merges[0]
+                    files_json = "{" + ", ".join(entries) + "}"
+                    raw = f'{head[:-1]}, "files": {files_json}, {json.dumps(tail)[1:]}'.encode()
+                    commit_hash = hashlib.sha1(raw).hexdigest()
+                    if not has("commit", commit_hash):
+                        writer.add("commit", commit_hash, raw, len(raw))
+                    commit_count += 1
+                    tips[ref] = commit_hash
+                    tip_files[ref] = (commit_hash, files, order, entries)
+                    if mark:
+                        marks[mark] = commit_hash
+
+                elif command == "reset":
+                    ref = branch(arg)
+                    parent_rev = optional("from ")
+                    tips[ref] = resolve(parent_rev) if parent_rev is not None else None
+                    tip_files.pop(ref, None)
+
+                elif command == "tag":
+                    # Tags have no PyGit counterpart; skip the whole block
+                    for prefix in ("from ", "original-oid ", "tagger "):
+                        optional(prefix)
+                    stream.read_data()
+                    print(f"Skipping tag {arg}")
+
+                elif command == "progress":
+                    print(arg)
+                elif command == "checkpoint":
+                    trace_count("objects_written", len(writer))
+                    writer.finish()
+                    self._update_multi_pack_index()
+                    writer = PackWriter(self.packs_dir)
+                elif command == "feature":
+                    if arg.split("=", 1)[0] not in ("done", "date-format", "force", "import-marks",
+                                                    "export-marks", "import-marks-if-exists"):
+                        raise ValueError(f"unsupported feature {arg}")
+                    if arg.startswith("date-format=") and arg != "date-format=raw":
+                        raise ValueError("only the raw date format is supported")
+                elif command != "option":
+                    raise ValueError(f"unsupported command {line!r}")
+
+            trace_count("objects_written", len(writer))
+            writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+        self._update_multi_pack_index()
+        return tips, commit_count, blob_count
+
+    def archive(self, rev, archive_format=None, output=None, prefix=""):
+        """Stream the files of a commit into a tar or zip archive without a checkout"""
+        import shutil
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+
+        index = self._load_index()
+        commit_hash = self._resolve_rev(rev, index)
+        if not commit_hash:
+            print(f"Unknown revision '{rev}'")
+            return
+        if archive_format is None:
+            archive_format = "zip" if output and output.endswith(".zip") else "tar"
+        if archive_format not in ("tar", "zip"):
+            print("Invalid archive format. Use 'tar' or 'zip'")
+            return
+
+        commit = self._read_commit(commit_hash)
+        mtime = datetime.datetime.fromisoformat(commit["timestamp"])
+        out = open(output, 'wb') if output else sys.stdout.buffer
+        try:
+            if archive_format == "tar":
+                import tarfile
+                # "w|" writes a pure stream, so stdout and pipes work
+                with tarfile.open(fileobj=out, mode="w|") as tar:
+                    for file_path, obj_hash in sorted(commit["files"].items()):
+                        with self._open_object(obj_hash) as src:
+                            info = tarfile.TarInfo(prefix + file_path)
+                            info.size = self._object_size("blob", obj_hash)
+                            info.mtime = mtime.timestamp()
+                            info.mode = 0o644
+                            tar.addfile(info, src)
+            else:
+                import zipfile
+                with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive_zip:
+                    for file_path, obj_hash in sorted(commit["files"].items()):
+                        with self._open_object(obj_hash) as src:
+                            info = zipfile.ZipInfo(prefix + file_path, mtime.timetuple()[:6])
+                            info.compress_type = zipfile.ZIP_DEFLATED
+                            info.external_attr = 0o644 << 16
+                            info.file_size = self._object_size("blob", obj_hash)
+                            with archive_zip.open(info, "w") as dest:
+                                shutil.copyfileobj(src, dest)
+        finally:
+            if output:
+                out.close()
+            else:
+                out.flush()
+        if output:
+            print(f"Wrote {archive_format} archive of {commit_hash[:7]} to {output}")
+
+    def _is_ancestor(self, ancestor, descendant):
+        """True if `ancestor` is reachable from `descendant` in the local history"""
+        pending = [descendant]
+        seen = set()
+        while pending:
+            commit_hash = pending.pop()
+            if commit_hash == ancestor:
+                return True
+            if not commit_hash or commit_hash in seen or not self._has_object("commit", commit_hash):
+                continue
+            seen.add(commit_hash)
+            commit = self._read_commit(commit_hash)
+            pending.extend(p for p in (commit.get("parent"), commit.get("merge_parent")) if p)
+        return False
+
+    def _push_pack(self, remote_url):
+        """Push the current branch with the pack protocol.
+
+        Returns False when the remote does not advertise receive-pack, so the
+        caller can fall back to the legacy upload.
+        """
+        import requests
+        api_url = self._remote_api(remote_url)
+        if not api_url:
+            return False
+        try:
+            with trace_region("network"):
+                response = requests.get(f"{api_url}/info/refs")
+        except requests.RequestException:
+            return False
+        if response.status_code != 200:
+            return False
+        refs = response.json()
+        if "receive-pack" not in refs.get("capabilities", []):
+            return False
+
+        index = self._load_index()
+        branch = index["current_branch"]
+        local_tip = index["branches"][branch]
+        if not local_tip:
+            print("No commits to push.")
+            return True
+        remote_tip = refs["branches"].get(branch)
+        if remote_tip == local_tip:
+            print("Everything up-to-date")
+            return True
+        if remote_tip and not self._is_ancestor(remote_tip, local_tip):
+            print(f"Push rejected: '{branch}' on the remote is not an ancestor of your branch (non-fast-forward).")
+            return True
+
+        objects, _ = self._collect_objects([local_tip], [remote_tip] if remote_tip else [])
+        update = {"branch": branch, "old": remote_tip, "new": local_tip}
+        header = json.dumps({"updates": [update]}).encode() + b"\n"
+        with trace_region("network"):
+            response = requests.post(
+                f"{api_url}/receive-pack",
+                data=itertools.chain([header], self._iter_pack(objects)),
+                headers={"Content-Type": "application/x-pygit-pack"}
+            )
+        if response.status_code == 200:
+            print(f"Pushed {len(objects)} objects: {branch} -> {local_tip[:7]}")
+        else:
+            print("Push failed:", response.status_code, response.text)
+        return True
+
+    #push
+    def push(self):
+        import getpass
+        import requests
+        from urllib.parse import urlparse
+        config = self._read_config()
         remote_url = config.get("remote", "")
         if not remote_url:
             print("No remote URL configured. Use 'remote add' first.")
             return
 
+        local_path = self._local_remote_path(remote_url)
+        if local_path is not None:
+            self._push_local(local_path)
+            return
+
+        if self._push_pack(remote_url):
+            return
+
+        commit_hash = self.get_latest_commit_hash()
+        if not commit_hash:
+            print("No commits to push.")
+            return
+
+        commit_data = self._read_commit(commit_hash)
+
+        password = getpass.getpass("Password: ")
+
+        # Extract repo name from remote URL
         try:
             repo_name = remote_url.rstrip("/").split("/")[-1]
         except:
@@ -451,11 +2779,10 @@ class PyGit:
         files_payload = []
 
         for file_path, obj_hash in commit_data["files"].items():
-            obj_file = self.objects_dir / obj_hash
-            if not obj_file.exists():
+            if not self._has_object("blob", obj_hash):
                 print(f"Missing object file for: {file_path}")
                 continue
-            files_payload.append(('files', (file_path, open(obj_file, 'rb'))))
+            files_payload.append(('files', (file_path, self._open_object(obj_hash))))
 
 
         if not files_payload:
@@ -470,12 +2797,14 @@ class PyGit:
             "commitHash": commit_hash
         }
 
+        parsed = urlparse(remote_url)
         try:
-            response = requests.post(
-                "http://localhost:5000/api/push-repository",
-                data=data,
-                files=files_payload  # this triggers multipart/form-data
-            )
+            with trace_region("network"):
+                response = requests.post(
+                    f"{parsed.scheme}://{parsed.netloc}/api/push-repository",
+                    data=data,
+                    files=files_payload  # this triggers multipart/form-data
+                )
             if response.status_code == 200:
                 print("Push successful:", response.json())
             else:
@@ -487,6 +2816,68 @@ class PyGit:
             for _, (_, file_obj) in files_payload:
                 file_obj.close()
 
+    def fetch(self):
+        """Download commits and objects the remote has and we don't"""
+        import requests
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+
+        config = self._read_config()
+        remote_url = config.get("remote", "")
+        if not remote_url:
+            print("No remote URL configured. Use 'remote add' first.")
+            return
+
+        local_path = self._local_remote_path(remote_url)
+        if local_path is not None:
+            remote = PyGit(local_path)
+            if not remote.is_initialized():
+                print(f"No PyGit repository at {local_path}")
+                return
+            with open(remote.index_file, 'r') as f:
+                remote_branches = remote._ensure_branch_structure(json.load(f))["branches"]
+        else:
+            api_url = self._remote_api(remote_url)
+            if not api_url:
+                print("Invalid remote URL format.")
+                return
+            with trace_region("network"):
+                response = requests.get(f"{api_url}/info/refs")
+            if response.status_code != 200:
+                print(f"Failed to fetch: {response.status_code} {response.text}")
+                return
+            remote_branches = response.json()["branches"]
+
+        index = self._load_index()
+
+        haves = list(index["branches"].values()) + list(index.get("remote_branches", {}).values())
+        wants = [h for h in remote_branches.values() if h and not self._has_object("commit", h)]
+        received = 0
+        if wants and local_path is not None:
+            objects, _ = remote._collect_objects(wants, haves)
+            received = self._copy_objects_from(remote, objects)
+        elif wants:
+            with trace_region("network"):
+                request = {"want": wants, "have": haves}
+                # A partial clone keeps leaving the same blobs on the remote
+                if config.get("partial_clone_filter"):
+                    request["filter"] = config["partial_clone_filter"]
+                response = requests.post(f"{api_url}/upload-pack", json=request, stream=True)
+            if response.status_code != 200:
+                print(f"Failed to fetch: {response.status_code} {response.text}")
+                return
+            received = len(self._unpack(io.BufferedReader(response.raw)))
+
+        index["remote_branches"] = {f"origin/{name}": commit_hash
+                                    for name, commit_hash in remote_branches.items()}
+        self._save_index(index)
+
+        print(f"Fetched {received} objects from origin")
+        for name, commit_hash in remote_branches.items():
+            print(f"    origin/{name} -> {commit_hash[:7] if commit_hash else 'no commits'}")
+        self._maybe_auto_maintenance()
+
 
 
     # def push(self):
@@ -552,7 +2943,30 @@ class PyGit:
     #         print("Push error:", e)
 
 
-    def clone(self, repo_url):
+    def _parse_filter_spec(self, filter_spec):
+        """Parse a --filter value into a dict upload-pack understands"""
+        if filter_spec == "blob:none":
+            return {"blob_limit": 0}
+        if filter_spec.startswith("blob:limit="):
+            size = filter_spec[len("blob:limit="):].lower()
+            units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+            multiplier = units.get(size[-1:], 1)
+            digits = size[:-1] if size[-1:] in units else size
+            if not digits.isdigit():
+                return None
+            return {"blob_limit": int(digits) * multiplier}
+        if filter_spec.startswith("path:"):
+            prefix = filter_spec[len("path:"):].strip("/")
+            return {"path": prefix} if prefix else None
+        return None
+
+    def clone(self, repo_url, depth=None, filter_spec=None):
+        import requests
+        from urllib.parse import urlparse
+        local_path = self._local_remote_path(repo_url)
+        if local_path is not None:
+            self._clone_local(local_path, depth, filter_spec)
+            return
         try:
             # Extract username and repoName from URL
             parsed = urlparse(repo_url)
@@ -561,37 +2975,81 @@ class PyGit:
                 print("Invalid clone URL format. Use: http://host/username/repoName")
                 return
 
+            blob_filter = self._parse_filter_spec(filter_spec) if filter_spec else {}
+            if blob_filter is None:
+                print("Invalid filter. Use blob:none, blob:limit=<size> or path:<dir>")
+                return
+
             username, repo_name = parts
-            api_url = f"{parsed.scheme}://{parsed.netloc}/api/repos/{username}/{repo_name}/clone"
+            if Path(repo_name).exists() and any(Path(repo_name).iterdir()):
+                print(f"Destination '{repo_name}' already exists and is not empty.")
+                return
+            api_url = f"{parsed.scheme}://{parsed.netloc}/api/repos/{username}/{repo_name}"
 
             print(f"Cloning from {api_url}...")
 
-            response = requests.get(api_url)
+            with trace_region("network"):
+                response = requests.get(f"{api_url}/info/refs")
             if response.status_code != 200:
                 print(f"Failed to clone: {response.status_code} {response.text}")
                 return
-
-            files = response.json().get("files", [])
-            if not files:
+            refs = response.json()
+            if "upload-pack" not in refs.get("capabilities", []):
+                print("Failed to clone: the remote does not support upload-pack")
+                return
+            tips = [h for h in refs["branches"].values() if h]
+            if not tips:
                 print("No files in repository.")
                 return
 
-            # Create repo directory
-            os.makedirs(repo_name, exist_ok=True)
-
-            for file in files:
-                file_path = os.path.join(repo_name, file["path"])
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-                content = file["content"]
-                if file["isBinary"]:
-                    with open(file_path, "wb") as f:
-                        f.write(base64.b64decode(content))
-                else:
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        f.write(content)
+            request = {"want": tips}
+            if depth:
+                request["depth"] = depth
+            if filter_spec:
+                request["filter"] = filter_spec
+            with trace_region("network"):
+                response = requests.post(f"{api_url}/upload-pack", json=request, stream=True)
+            if response.status_code != 200:
+                print(f"Failed to clone: {response.status_code} {response.text}")
+                return
 
-            print(f"Repository '{repo_name}' cloned successfully.")
+            cloned = PyGit(repo_name)
+            cloned.repo_path.mkdir(exist_ok=True)
+            cloned.git_dir.mkdir()
+            cloned.objects_dir.mkdir()
+            cloned.commits_dir.mkdir()
+            # Objects go straight from the response to disk, never all in memory
+            received = cloned._unpack(io.BufferedReader(response.raw))
+
+            current_branch = refs["head"]
+            with open(cloned.index_file, 'w') as f:
+                json.dump({
+                    "staged": {},
+                    "head": refs["branches"].get(current_branch),
+                    "branches": refs["branches"],
+                    "current_branch": current_branch
+                }, f)
+            # Commits whose parents were cut off by --depth
+            shallow = [h for h in response.headers.get("X-PyGit-Shallow", "").split(",") if h]
+            if shallow:
+                with open(cloned.git_dir / "shallow", 'w') as f:
+                    f.write("".join(f"{commit_hash}\n" for commit_hash in shallow))
+            config = {"remote": repo_url}
+            if filter_spec:
+                config["promisor"] = True
+                config["partial_clone_filter"] = filter_spec
+            with open(cloned.config_path, 'w') as f:
+                json.dump(config, f)
+            with open(cloned.ignore_file, 'w') as f:
+                f.write(".pygit\n")
+            # A path filter checks out only its directory, as a sparse cone
+            if blob_filter.get("path"):
+                cloned.sparse_file.parent.mkdir(exist_ok=True)
+                with open(cloned.sparse_file, 'w') as f:
+                    f.write(blob_filter["path"] + "\n")
+
+            cloned._restore_branch_state(current_branch)
+            print(f"Repository '{repo_name}' cloned successfully ({len(received)} objects).")
         except Exception as e:
             print(f"Error during clone: {e}")
 
@@ -601,57 +3059,498 @@ class PyGit:
 
     def merge(self, branch_name):
         """Merge another branch into current branch"""
+        from pygit_api import PyGitError, Repository, UncommittedChangesError
+        repo = Repository(pygit=self)
+        try:
+            repo.merge(branch_name)
+        except UncommittedChangesError:
+            print("You have uncommitted changes. Please commit or discard them first.")
+            return
+        except PyGitError as e:
+            print(e)
+            return
+        print(f"Merged '{branch_name}' into '{repo.current_branch}'")
+        self._maybe_auto_maintenance()
+
+    def stash(self, *args):
+        """Set uncommitted changes aside: push [-m <message>], list, apply, pop or drop [<n>]"""
+        from pygit_api import PyGitError, Repository
+        repo = Repository(pygit=self)
+        action = args[0] if args else "push"
+        rest = list(args[1:])
+        try:
+            if action == "push" and (not rest or (len(rest) == 2 and rest[0] == "-m")):
+                commit = repo.stash_push(rest[1] if rest else None)
+                print(f"Saved working directory and index state {commit.message}")
+            elif action == "list" and not rest:
+                for position, commit in enumerate(repo.stash_list()):
+                    print(f"stash@{{{position}}}: {commit.message}")
+            elif action in ("apply", "pop", "drop") and len(rest) <= 1:
+                spec = rest[0] if rest else "0"
+                if spec.startswith("stash@{") and spec.endswith("}"):
+                    spec = spec[len("stash@{"):-1]
+                if not spec.isdigit():
+                    print(f"Invalid stash entry '{rest[0]}'")
+                    return
+                position = int(spec)
+                if action == "drop":
+                    commit = repo.stash_drop(position)
+                    print(f"Dropped stash@{{{position}}} ({commit.hash[:7]})")
+                elif action == "apply":
+                    commit = repo.stash_apply(position)
+                    print(f"Applied stash@{{{position}}} ({commit.hash[:7]})")
+                else:
+                    commit = repo.stash_pop(position)
+                    print(f"Applied and dropped stash@{{{position}}} ({commit.hash[:7]})")
+            else:
+                print("Usage: pygit stash [push [-m <message>] | list | apply|pop|drop [<n>]]")
+        except PyGitError as e:
+            print(e)
+
+    def _ref_tips(self, index):
+        """Commits named by branches, remote-tracking branches, HEAD and stash entries"""
+        tips = list(index["branches"].values()) + list(index.get("remote_branches", {}).values())
+        tips.append(index.get("head"))
+        tips.extend(self._read_stash())
+        return [h for h in tips if h]
+
+    def _reachable_objects(self):
+        """Commits and blobs reachable from branches, remote-tracking refs, HEAD and the
+        staging area, including the HEAD and staging area of every other worktree"""
+        index = self._load_index()
+        tips = self._ref_tips(index)
+        staged = list(index["staged"].values())
+        for _, other in self._worktree_indexes(exclude_self=True):
+            tips.append(other.get("head"))
+            staged.extend(other.get("staged", {}).values())
+
+        objects, _ = self._collect_objects([h for h in tips if h])
+        commits = {obj_hash for kind, obj_hash in objects if kind == "commit"}
+        blobs = {obj_hash for kind, obj_hash in objects if kind == "blob"}
+        blobs.update(staged)
+        return commits, blobs
+
+    def _loose_objects(self):
+        """Yield (kind, hash, stat) for every loose blob and commit"""
+        for kind, directory in (("blob", self.objects_dir), ("commit", self.commits_dir)):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    yield kind, entry.name, entry.stat()
+
+    def _parse_expire(self, value):
+        """Seconds for --prune: 'now', 'never', or a number with an optional s/m/h/d/w unit"""
+        if value == "now":
+            return 0
+        if value == "never":
+            return None
+        units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+        multiplier = units.get(value[-1:], 1)
+        digits = value[:-1] if value[-1:] in units else value
+        if not digits.isdigit():
+            raise ValueError(f"Invalid prune expiry '{value}'")
+        return int(digits) * multiplier
+
+    def gc(self, dry_run=False, prune_expire=DEFAULT_PRUNE_EXPIRE, write_bitmap=None):
+        """Prune old unreachable objects and repack everything else into one pack"""
         if not self.is_initialized():
             print("Not a PyGit repository! Please run 'init' first.")
             return
+        # Two repacks of the same objects would delete each other's loose files and packs
+        if not self._acquire_maintenance_lock():
+            print("Maintenance is already running; try again when it has finished")
+            return
+        try:
+            self._gc(dry_run, prune_expire, write_bitmap)
+        finally:
+            os.remove(self.git_dir / "maintenance.lock")
+
+    def _gc(self, dry_run=False, prune_expire=DEFAULT_PRUNE_EXPIRE, write_bitmap=None):
+        if write_bitmap is None:
+            write_bitmap = self._read_config().get("pack.writeBitmaps", False)
+
+        commits, blobs = self._reachable_objects()
+
+        def is_reachable(kind, obj_hash):
+            return obj_hash in (commits if kind == "commit" else blobs)
+
+        cutoff = None if prune_expire is None else time.time() - prune_expire
+        to_pack = []
+        to_prune = []
+        for kind, obj_hash, stat in self._loose_objects():
+            if is_reachable(kind, obj_hash):
+                to_pack.append((kind, obj_hash))
+            elif cutoff is not None and stat.st_mtime < cutoff:
+                to_prune.append((self._object_file(kind, obj_hash), stat.st_size))
+            # Recent unreachable loose objects are left alone until they expire
+
+        old_packs = self._packs()
+        packed = []
+        to_explode = []
+        dropped_bytes = 0
+        dropped_count = 0
+        for pack_path, pack_index in old_packs:
+            pack_mtime = pack_path.stat().st_mtime
+            for obj_hash, kind, offset, size in pack_index:
+                if is_reachable(kind, obj_hash):
+                    packed.append((kind, obj_hash))
+                elif cutoff is None or pack_mtime >= cutoff:
+                    to_explode.append((pack_path, kind, obj_hash, offset, size, pack_mtime))
+                else:
+                    dropped_bytes += size
+                    dropped_count += 1
+
+        reclaimable = sum(size for _, size in to_prune) + dropped_bytes
+        removable = len(to_prune) + dropped_count
+        if dry_run:
+            print(f"Would remove {removable} unreachable objects, reclaiming {reclaimable} bytes")
+            print(f"Would pack {len(to_pack)} loose objects and {len(packed)} packed objects into one pack")
+            return
 
-        with open(self.index_file, 'r') as f:
-            index = json.load(f)
-        index = self._ensure_branch_structure(index)
+        writer = PackWriter(self.packs_dir)
+        try:
+            for kind, obj_hash in to_pack + packed:
+                with self._open_object(obj_hash, kind) as f:
+                    writer.add(kind, obj_hash, f, self._object_size(kind, obj_hash))
+            new_pack = writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+
+        # Unreachable objects still inside the grace period go back to loose
+        # form, keeping the pack's age so they expire on schedule
+        for pack_path, kind, obj_hash, offset, size, pack_mtime in to_explode:
+            target = self._object_file(kind, obj_hash)
+            if not target.exists():
+                import shutil
+                with ObjectSlice(pack_path, offset, size) as src, open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.utime(target, (pack_mtime, pack_mtime))
+
+        bitmap_count = 0
+        if new_pack and write_bitmap:
+            index = self._load_index()
+            bitmap_count = self._write_bitmaps(new_pack, self._ref_tips(index))
+
+        for pack_path, _ in old_packs:
+            if pack_path != new_pack:
+                if pack_path.with_suffix(".bitmap").exists():
+                    os.remove(pack_path.with_suffix(".bitmap"))
+                os.remove(pack_path.with_suffix(".idx"))
+                os.remove(pack_path)
+        for kind, obj_hash in to_pack:
+            os.remove(self._object_file(kind, obj_hash))
+        for obj_path, _ in to_prune:
+            os.remove(obj_path)
+        self._update_multi_pack_index()
+
+        print(f"Removed {removable} unreachable objects ({reclaimable} bytes)")
+        if new_pack:
+            print(f"Packed {len(writer)} objects into {new_pack.name}")
+        if bitmap_count:
+            print(f"Wrote reachability bitmaps for {bitmap_count} commits")
+
+    def _fsck_batches(self, batch_bytes=64 << 20):
+        """Split every stored object into hashing batches of roughly batch_bytes each"""
+        batch, batch_size = [], 0
+        for kind, obj_hash, stat in self._loose_objects():
+            batch.append((kind, obj_hash, str(self._object_file(kind, obj_hash))))
+            batch_size += stat.st_size + 4096
+            if batch_size >= batch_bytes:
+                yield ("loose", batch)
+                batch, batch_size = [], 0
+        if batch:
+            yield ("loose", batch)
+        for pack_path, pack_index in self._packs():
+            batch, batch_size = [], 0
+            for obj_hash, kind, offset, size in pack_index:
+                batch.append((kind, obj_hash, offset, size))
+                batch_size += size
+                if batch_size >= batch_bytes:
+                    yield ("pack", str(pack_path), batch)
+                    batch, batch_size = [], 0
+            if batch:
+                yield ("pack", str(pack_path), batch)
+
+    def fsck(self, as_json=False, jobs=None):
+        """Verify object hashes and commit connectivity; returns the number of errors"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return 0
 
-        if branch_name not in index["branches"]:
-            print(f"Branch '{branch_name}' does not exist!")
-            return
+        problems = []
 
-        has_staged, has_modified = self._get_working_dir_changes()
-        if has_staged or has_modified:
-            print("You have uncommitted changes. Please commit or discard them first.")
-            return
+        def report(problem, **details):
+            record = {"problem": problem, **details}
+            problems.append(record)
+            if as_json:
+                print(json.dumps(record))
+            else:
+                detail = ", ".join(f"{key}={value}" for key, value in details.items())
+                print(f"{problem}: {detail}")
+
+        # Content hashes, spread over a process pool for big stores
+        batches = list(self._fsck_batches())
+        if len(batches) > 1 and jobs != 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Forked workers would inherit locks held by the daemon's other
+            # threads; start them from a clean process instead
+            method = ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                      and not getattr(sys, "frozen", False) else "spawn")
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context(method)) as pool:
+                results = list(pool.map(_fsck_hash_batch, batches))
+        else:
+            results = [_fsck_hash_batch(batch) for batch in batches]
+        corrupt = set()
+        for result in results:
+            for kind, obj_hash, location, actual, error in result:
+                corrupt.add(obj_hash)
+                if error:
+                    report("unreadable", kind=kind, object=obj_hash, location=location, error=error)
+                else:
+                    report("hash-mismatch", kind=kind, object=obj_hash, location=location, actual=actual)
+
+        # Connectivity: every reference from a commit, branch or the index must resolve
+        commits = {obj_hash for kind, obj_hash, _ in self._loose_objects() if kind == "commit"}
+        blobs = {obj_hash for kind, obj_hash, _ in self._loose_objects() if kind == "blob"}
+        for _, pack_index in self._packs():
+            for obj_hash, kind, _, _ in pack_index:
+                (commits if kind == "commit" else blobs).add(obj_hash)
+
+        shallow = self._read_shallow()
+        promisor = self._read_config().get("promisor", False)
+        referenced_commits = set()
+        referenced_blobs = set()
+        for commit_hash in sorted(commits - corrupt):
+            try:
+                commit = self._read_commit(commit_hash)
+            except ValueError as e:
+                report("bad-commit", object=commit_hash, error=str(e))
+                continue
+            for field in ("parent", "merge_parent"):
+                parent = commit.get(field)
+                if not parent:
+                    continue
+                referenced_commits.add(parent)
+                if parent not in commits and commit_hash not in shallow:
+                    report(f"missing-{field.replace('_', '-')}", object=commit_hash, missing=parent)
+            for file_path, obj_hash in commit.get("files", {}).items():
+                referenced_blobs.add(obj_hash)
+                if obj_hash not in blobs and not promisor:
+                    report("missing-blob", object=commit_hash, path=file_path, missing=obj_hash)
+
+        index = self._load_index()
+        refs = dict(index["branches"])
+        refs.update(index.get("remote_branches", {}))
+        refs.update((f"stash@{{{position}}}", h) for position, h in enumerate(self._read_stash()))
+        for name, commit_hash in refs.items():
+            if commit_hash:
+                referenced_commits.add(commit_hash)
+                if commit_hash not in commits:
+                    report("missing-ref-target", ref=name, missing=commit_hash)
+        for file_path, obj_hash in index["staged"].items():
+            referenced_blobs.add(obj_hash)
+            if obj_hash not in blobs:
+                report("missing-staged-blob", path=file_path, missing=obj_hash)
+
+        errors = len(problems)
+        # Dangling objects are harmless (gc removes them) so they don't count as errors
+        for commit_hash in sorted(commits - referenced_commits):
+            report("dangling", kind="commit", object=commit_hash)
+        for obj_hash in sorted(blobs - referenced_blobs):
+            report("dangling", kind="blob", object=obj_hash)
+
+        if not as_json:
+            print(f"Checked {len(commits)} commits and {len(blobs)} blobs: "
+                  f"{errors} errors, {len(problems) - errors} dangling")
+        return errors
+
+    def _count_loose_objects(self, limit):
+        """Count loose objects, stopping early once `limit` is exceeded"""
+        count = 0
+        for directory in (self.objects_dir, self.commits_dir):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.startswith("."):
+                        count += 1
+                        if count > limit:
+                            return count
+        return count
+
+    def _maintenance_due(self):
+        """Name of the task auto maintenance should run now, or None"""
+        config = self._read_config()
+        if not config.get("maintenance.auto", True):
+            return None
+        pack_limit = config.get("maintenance.packLimit", DEFAULT_MAINTENANCE_PACK_LIMIT)
+        if pack_limit and len(list(self.packs_dir.glob("pack-*.pack"))) > pack_limit:
+            return "gc"
+        loose_limit = config.get("maintenance.looseObjects", DEFAULT_MAINTENANCE_LOOSE_OBJECTS)
+        if loose_limit and self._count_loose_objects(loose_limit) > loose_limit:
+            return "loose-objects"
+        return None
 
-        current_branch = index["current_branch"]
-        if branch_name == current_branch:
-            print("Cannot merge branch with itself!")
+    def _maybe_auto_maintenance(self):
+        """Start `maintenance run --auto` in a detached process if work is due"""
+        if not self._maintenance_due() or self._maintenance_lock_held():
+            return
+        if getattr(sys, "frozen", False):
+            command = [sys.executable, "maintenance", "run", "--auto"]
+        else:
+            command = [sys.executable, os.path.abspath(__file__), "maintenance", "run", "--auto"]
+        import subprocess
+        with open(self.git_dir / "maintenance.log", 'ab') as log:
+            subprocess.Popen(command, cwd=self.repo_path, stdin=subprocess.DEVNULL,
+                             stdout=log, stderr=log, start_new_session=True)
+        print("Auto-maintenance started in the background.")
+
+    def _maintenance_lock_held(self):
+        lock_path = self.git_dir / "maintenance.lock"
+        try:
+            with open(lock_path, 'r') as f:
+                pid = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return time.time() - lock_path.stat().st_mtime < MAINTENANCE_LOCK_TIMEOUT
+
+    def _acquire_maintenance_lock(self):
+        lock_path = self.git_dir / "maintenance.lock"
+        if lock_path.exists() and not self._maintenance_lock_held():
+            # Left behind by a crashed or timed-out run
+            os.remove(lock_path)
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _pack_loose_objects(self):
+        """Incremental repack: move loose objects older than LOOSE_PACK_GRACE into one new pack.
+
+        Each object is read once and its hash checked before it is packed;
+        only loose files that were packed intact are removed.
+        """
+        cutoff = time.time() - LOOSE_PACK_GRACE
+        loose = [(kind, obj_hash) for kind, obj_hash, stat in self._loose_objects() if stat.st_mtime < cutoff]
+        if not loose:
+            print("No loose objects to pack")
+            return None
+        writer = PackWriter(self.packs_dir)
+        packed = []
+        try:
+            for kind, obj_hash in loose:
+                try:
+                    with open(self._object_file(kind, obj_hash), 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    continue
+                if hashlib.sha1(data).hexdigest() != obj_hash:
+                    print(f"Skipping corrupt loose {kind} {obj_hash}")
+                    continue
+                writer.add(kind, obj_hash, data, len(data))
+                packed.append((kind, obj_hash))
+            pack_path = writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+        if pack_path is None:
+            print("No loose objects to pack")
+            return None
+        for kind, obj_hash in packed:
+            os.remove(self._object_file(kind, obj_hash))
+        self._update_multi_pack_index()
+        print(f"Packed {len(packed)} loose objects into {pack_path.name}")
+        return pack_path
+
+    def _maintain_multi_pack_index(self):
+        added = self._update_multi_pack_index()
+        print(f"Multi-pack index covers {len(self._pack_paths())} packs ({added} newly added)")
+
+    def maintenance(self, *args):
+        """Run housekeeping tasks, or only what is due with --auto"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+        if not args or args[0] != "run":
+            print("Usage: pygit maintenance run [--auto] [--task=<name>]")
             return
 
-        source_commit = index["branches"][branch_name]
-        if not source_commit:
-            print(f"Branch '{branch_name}' has no commits to merge!")
+        tasks = [arg[len("--task="):] for arg in args[1:] if arg.startswith("--task=")]
+        if "--auto" in args[1:]:
+            due = self._maintenance_due()
+            tasks = [due] if due else []
+        elif not tasks:
+            tasks = ["gc"]
+        unknown = [task for task in tasks if task not in MAINTENANCE_TASKS]
+        if unknown:
+            print(f"Unknown maintenance task '{unknown[0]}'. Tasks: {', '.join(MAINTENANCE_TASKS)}")
+            return
+        if not tasks:
             return
 
-        with open(self.commits_dir / source_commit, 'r') as f:
-            source_data = json.load(f)
+        if not self._acquire_maintenance_lock():
+            print("Maintenance is already running")
+            return
+        try:
+            for task in tasks:
+                getattr(self, MAINTENANCE_TASKS[task])()
+        finally:
+            os.remove(self.git_dir / "maintenance.lock")
 
-        commit = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "message": f"Merge branch '{branch_name}' into '{current_branch}'",
-            "files": source_data["files"],
-            "parent": index["branches"][current_branch],
-            "merge_parent": source_commit
-        }
-        
-        commit_hash = self.hash_object(json.dumps(commit))
-        commit_path = self.commits_dir / commit_hash
-        with open(commit_path, 'w') as f:
-            json.dump(commit, f)
-
-        index["branches"][current_branch] = commit_hash
-        index["head"] = commit_hash
-        self._restore_branch_state(current_branch)
-        
-        with open(self.index_file, 'w') as f:
-            json.dump(index, f)
-        
-        print(f"Merged '{branch_name}' into '{current_branch}'")
+    def fsmonitor(self, action="status"):
+        """Start, stop or report on the background inotify watcher used by status and add"""
+        if not self.is_initialized():
+            print("Not a PyGit repository! Please run 'init' first.")
+            return
+        import pygit_fsmonitor
+        journal = self._fsmonitor_journal()
+        token = pygit_fsmonitor.current_token(str(self.worktree_dir))
+        if action == "run":
+            pygit_fsmonitor.run(str(self.repo_path), str(self.worktree_dir))
+        elif action == "start":
+            if token:
+                print("Filesystem monitor is already running")
+                return
+            if not sys.platform.startswith("linux"):
+                print("Filesystem monitor needs Linux inotify; status will keep scanning the tree")
+                return
+            if getattr(sys, "frozen", False):
+                command = [sys.executable, "fsmonitor", "run"]
+            else:
+                command = [sys.executable, os.path.abspath(__file__), "fsmonitor", "run"]
+            import subprocess
+            subprocess.Popen(command, cwd=self.repo_path, stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            for _ in range(100):
+                if pygit_fsmonitor.current_token(str(self.worktree_dir)):
+                    print("Filesystem monitor started")
+                    return
+                time.sleep(0.05)
+            print("Filesystem monitor did not start")
+        elif action == "stop":
+            if not token:
+                print("Filesystem monitor is not running")
+                return
+            import signal
+            os.kill(int(token.split(":")[0]), signal.SIGTERM)
+            print("Filesystem monitor stopped")
+        elif action == "status":
+            if token:
+                print(f"Filesystem monitor running (pid {token.split(':')[0]}, journal {journal.stat().st_size} bytes)")
+            else:
+                print("Filesystem monitor is not running")
+        else:
+            print("Usage: pygit fsmonitor start|stop|status")
 
     def help(self):
         """Display list of all available commands"""
@@ -662,6 +3561,7 @@ class PyGit:
         print("  add <file|'.'>         Add file(s) to staging area")
         print("  commit <message>       Commit staged changes with a message")
         print("  log                    Show commit history of current branch")
+        print("  diff [<rev>] [<rev>]   Show changes from HEAD (or a rev) to the tree (or a rev)")
         print("  status                 Show working directory status")
         print("  branch                 List all branches")
         print("  branch <name>          Create a new branch")
@@ -669,40 +3569,114 @@ class PyGit:
         print("  branch -m <old> <new>  Rename a branch")
         print("  checkout <name>        Switch to a branch")
         print("  merge <name>           Merge a branch into current branch")
+        print("  clone [--depth <n>] [--filter=<spec>] <url>")
+        print("                         Clone a repository; --filter takes blob:none,")
+        print("                         blob:limit=<size> or path:<dir>")
+        print("  fetch                  Download new commits from origin")
+        print("  serve [--host <h>] [--port <p>] [--allow-create] [<root>]")
+        print("                         Serve repositories under <root> over HTTP")
+        print("  daemon [start|stop] [--socket <path>]")
+        print("                         Keep repositories warm and answer CLI commands over a socket")
+        print("  bundle create <file> <rev-range>[:<branch>]")
+        print("                         Write a ref list plus pack of the range to a file")
+        print("  bundle verify|unbundle <file>")
+        print("                         Check or import a bundle file")
+        print("  fast-import [--force] [--import-marks=<f>] [--export-marks=<f>]")
+        print("                         Import a git fast-export stream from stdin in bulk")
+        print("  archive [--format=tar|zip] [-o <file>] <rev>")
+        print("                         Export a commit as an archive without checking it out")
+        print("  gc [--dry-run] [--prune=<age>|now|never] [--write-bitmap]")
+        print("                         Prune unreachable objects and repack the rest")
+        print("  fsck [--json] [--jobs=<n>]")
+        print("                         Verify object hashes and commit references")
+        print("  stash [push [-m <msg>] | list | apply|pop|drop [<n>]]")
+        print("                         Set uncommitted changes aside and restore them later")
+        print("  worktree add <path> <branch> | list | remove [--force] <path> | prune")
+        print("                         Check out more branches in directories sharing this repository")
+        print("  sparse-checkout set <dir>... | list | disable")
+        print("                         Only check out and scan the given directories")
+        print("  fsmonitor start|stop|status")
+        print("                         Watch the tree with inotify so status only checks changed paths")
+        print("  maintenance run [--auto] [--task=<name>]")
+        print("                         Repack and prune; --auto only does what is due")
         print("  help                   Show this help message")
-
-def main():
-    import sys
-    if len(sys.argv) < 2:
+        print("\nPut --profile before a command for a cProfile report (--profile=<file> saves it);")
+        print("set PYGIT_TRACE=1 (stderr) or PYGIT_TRACE=<file> (JSON lines) to trace timings.")
+
+def main(argv=None, pygit=None):
+    """Run one CLI command; the daemon passes its own argv and a warm PyGit.
+
+    `--profile` before the command (or `--profile=<file>` to save pstats data) runs it
+    under cProfile; PYGIT_TRACE turns on region timers and counters.
+    """
+    global _tracer
+    argv = list(sys.argv if argv is None else argv)
+    # Only before the command name, where it can't be an argument of the command
+    profile = None
+    if len(argv) > 1 and (argv[1] == "--profile" or argv[1].startswith("--profile=")):
+        profile = argv.pop(1)
+    if len(argv) < 2:
         # Show help when no command is provided
         PyGit().help()
         return
 
-    pygit = PyGit()
-    command = sys.argv[1]
+    pygit = pygit or PyGit()
+    if os.environ.get("PYGIT_TRACE"):
+        _tracer = Tracer(os.environ["PYGIT_TRACE"])
+    try:
+        with trace_region(argv[1]):
+            if profile:
+                import cProfile
+                import pstats
+                profiler = cProfile.Profile()
+                try:
+                    profiler.runcall(_run_command, argv, pygit)
+                finally:
+                    if profile.startswith("--profile="):
+                        profiler.dump_stats(profile[len("--profile="):])
+                    else:
+                        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+            else:
+                _run_command(argv, pygit)
+    except MissingObjectError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if _tracer:
+            if pygit._object_cache is not None:
+                _tracer.count("object_cache_hits", pygit._object_cache.hits)
+                _tracer.count("object_cache_misses", pygit._object_cache.misses)
+            _tracer.finish(" ".join(argv[1:]))
+            _tracer = None
+
+
+def _run_command(argv, pygit):
+    command = argv[1]
 
     if command == "init":
         pygit.init()
-    elif command == "add" and len(sys.argv) == 3:
-        pygit.add(sys.argv[2])
-    elif command == "commit" and len(sys.argv) >= 3:
-        message = " ".join(sys.argv[2:])
+    elif command == "add" and len(argv) == 3:
+        pygit.add(argv[2])
+    elif command == "commit" and len(argv) >= 3:
+        message = " ".join(argv[2:])
         pygit.commit(message)
     elif command == "log":
         pygit.log()
+    elif command == "diff":
+        pygit.diff(*argv[2:])
     elif command == "status":
         pygit.status()
     elif command == "branch":
-        pygit.branch(*sys.argv[2:])
-    elif command == "checkout" and len(sys.argv) == 3:
-        pygit.checkout(sys.argv[2])
-    elif command == "merge" and len(sys.argv) == 3:
-        pygit.merge(sys.argv[2])
+        pygit.branch(*argv[2:])
+    elif command == "checkout" and len(argv) == 3:
+        pygit.checkout(argv[2])
+    elif command == "merge" and len(argv) == 3:
+        pygit.merge(argv[2])
     elif command == "help":
         pygit.help()
-    # elif command == "config" and len(sys.argv) == 4:
-    #     pygit.config(sys.argv[2], sys.argv[3])
-    elif command == "config" and len(sys.argv) == 4:
+    # elif command == "config" and len(argv) == 4:
+    #     pygit.config(argv[2], argv[3])
+    elif command == "config" and len(argv) == 4:
         pygit_config_path = Path(".pygit") / "config.json"
         if not pygit_config_path.exists():
             config = {}
@@ -710,7 +3684,7 @@ def main():
             with open(pygit_config_path, 'r') as f:
                 config = json.load(f)
         
-        key, value = sys.argv[2], sys.argv[3]
+        key, value = argv[2], argv[3]
         if key not in ["username", "email"]:
             print("Invalid config key. Use 'username' or 'email'")
         else:
@@ -726,37 +3700,143 @@ def main():
             with open(pygit_config_path, 'r') as f:
                 config = json.load(f)
 
-        if len(sys.argv) == 5 and sys.argv[2] == "add" and sys.argv[3] == "origin":
-            config["remote"] = sys.argv[4]
+        if len(argv) == 5 and argv[2] == "add" and argv[3] == "origin":
+            remote = argv[4]
+            # Local paths are stored absolute so they keep working from any cwd
+            if "://" not in remote:
+                remote = str(Path(remote).resolve())
+            config["remote"] = remote
             with open(pygit_config_path, 'w') as f:
                 json.dump(config, f)
-            print(f"Remote 'origin' set to {sys.argv[4]}")
-
-    elif len(sys.argv) == 3 and sys.argv[2] == "-v":
-        if "remote" in config:
-            print(f"origin\t{config['remote']}")
-        else:
-            print("No remote configured.")
+            print(f"Remote 'origin' set to {remote}")
 
-    elif len(sys.argv) == 4 and sys.argv[2] == "remove" and sys.argv[3] == "origin":
-        if "remote" in config:
-            del config["remote"]
-            with open(pygit_config_path, 'w') as f:
-                json.dump(config, f)
-            print("Remote 'origin' removed.")
-        else:
-            print("No remote to remove.")
+        elif len(argv) == 3 and argv[2] == "-v":
+            if "remote" in config:
+                print(f"origin\t{config['remote']}")
+            else:
+                print("No remote configured.")
+
+        elif len(argv) == 4 and argv[2] == "remove" and argv[3] == "origin":
+            if "remote" in config:
+                del config["remote"]
+                with open(pygit_config_path, 'w') as f:
+                    json.dump(config, f)
+                print("Remote 'origin' removed.")
+            else:
+                print("No remote to remove.")
     elif command == "push":
         pygit.push()
+    elif command == "fetch":
+        pygit.fetch()
+    elif command == "bundle":
+        pygit.bundle(*argv[2:])
+    elif command == "fast-import":
+        pygit.fast_import(*argv[2:])
+    elif command == "gc":
+        dry_run = "--dry-run" in argv[2:]
+        prune_expire = DEFAULT_PRUNE_EXPIRE
+        try:
+            for arg in argv[2:]:
+                if arg.startswith("--prune="):
+                    prune_expire = pygit._parse_expire(arg[len("--prune="):])
+        except ValueError as e:
+            print(e)
+        else:
+            pygit.gc(dry_run, prune_expire, True if "--write-bitmap" in argv[2:] else None)
+    elif command == "fsck":
+        jobs = None
+        for arg in argv[2:]:
+            if arg.startswith("--jobs="):
+                jobs = arg[len("--jobs="):]
+        if jobs is not None and (not jobs.isdigit() or int(jobs) == 0):
+            print("Usage: pygit fsck [--json] [--jobs=<n>] (n at least 1)")
+            sys.exit(2)
+        if pygit.fsck(as_json="--json" in argv[2:], jobs=int(jobs) if jobs else None):
+            sys.exit(1)
+    elif command == "stash":
+        pygit.stash(*argv[2:])
+    elif command == "worktree":
+        pygit.worktree(*argv[2:])
+    elif command == "sparse-checkout":
+        pygit.sparse_checkout(*argv[2:])
+    elif command == "fsmonitor" and len(argv) <= 3:
+        pygit.fsmonitor(*argv[2:])
+    elif command == "maintenance":
+        pygit.maintenance(*argv[2:])
+    elif command == "archive":
+        archive_format, output, prefix = None, None, ""
+        positional = []
+        args = iter(argv[2:])
+        for arg in args:
+            if arg.startswith("--format="):
+                archive_format = arg[len("--format="):]
+            elif arg.startswith("--prefix="):
+                prefix = arg[len("--prefix="):]
+            elif arg in ("-o", "--output"):
+                output = next(args, None)
+            else:
+                positional.append(arg)
+        if len(positional) != 1:
+            print("Usage: pygit archive [--format=tar|zip] [--prefix=<dir>/] [-o <file>] <rev>")
+        else:
+            pygit.archive(positional[0], archive_format, output, prefix)
+    elif command == "serve":
+        host, port, root, allow_create = "127.0.0.1", "5000", ".", False
+        args = iter(argv[2:])
+        for arg in args:
+            if arg == "--host":
+                host = next(args, host)
+            elif arg == "--port":
+                port = next(args, "")
+            elif arg == "--allow-create":
+                allow_create = True
+            else:
+                root = arg
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            print("Usage: pygit serve [--host <h>] [--port <1-65535>] [--allow-create] [<root>]")
+        else:
+            from pygit_server import serve
+            serve(root, host, int(port), allow_create)
+    elif command == "daemon":
+        from pygit_daemon import run_daemon
+        run_daemon(*argv[2:])
     elif command == "clone":
-        if len(sys.argv) != 3:
-            print("Usage: pygit clone <repo_url>")
+        depth = None
+        filter_spec = None
+        positional = []
+        args = iter(argv[2:])
+        for arg in args:
+            if arg == "--depth":
+                depth = next(args, None)
+            elif arg.startswith("--depth="):
+                depth = arg[len("--depth="):]
+            elif arg.startswith("--filter="):
+                filter_spec = arg[len("--filter="):]
+            else:
+                positional.append(arg)
+        if len(positional) != 1 or (depth is not None and not depth.isdigit()):
+            print("Usage: pygit clone [--depth <n>] [--filter=<spec>] <repo_url>")
         else:
-            pygit.clone(sys.argv[2])
+            pygit.clone(positional[0], int(depth) if depth else None, filter_spec)
 
     else:
         print("Unknown command or wrong arguments")
         print("Run 'pygit help' for a list of commands")
 
+    if os.environ.get("PYGIT_CACHE_STATS") and pygit._object_cache is not None:
+        stats = pygit._object_cache.stats()
+        print("object cache: " + ", ".join(f"{key}={value}" for key, value in stats.items()), file=sys.stderr)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if getattr(sys, "frozen", False):
+        # fsck's spawned workers start the frozen executable
+        import multiprocessing
+        multiprocessing.freeze_support()
+    # pygit_api imports this module by name; share it rather than load it twice
+    sys.modules.setdefault("pygit_v3", sys.modules["__main__"])
+    from pygit_client import forward
+    status = forward(sys.argv)
+    if status is None:
+        main()
+    else:
+        sys.exit(status)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+
+from pygit_v3 import FastImportStream, PyGit
+
+
+def stream(text):
+    return FastImportStream(io.BytesIO(text.encode()))
+
+
+class FastImportTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.git = PyGit(self._tmp.name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.git.init()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_parent_with_unsorted_file_keys(self):
+        blobs = {path: self.git._write_blob(path) for path in ("c.txt", "a.txt", "b.txt")}
+        # Written in staging order, as Repository.commit does
+        parent = {"timestamp": "2024-01-01T00:00:00", "message": "base",
+                  "files": {"c.txt": blobs["c.txt"], "a.txt": blobs["a.txt"], "b.txt": blobs["b.txt"]},
+                  "parent": None}
+        parent_hash = self.git.hash_object(json.dumps(parent))
+        self.git._write_commit(parent_hash, parent)
+
+        tips, commits, _ = self.git._fast_import(stream(
+            f"commit refs/heads/import\n"
+            f"committer A <a@example.com> 1700000000 +0000\n"
+            f"data 3\none\n"
+            f"from {parent_hash}\n"
+            f"M 100644 inline a.txt\ndata 4\nnew\n\n"
+            f"commit refs/heads/import\n"
+            f"committer A <a@example.com> 1700000001 +0000\n"
+            f"data 3\ntwo\n"
+            f"M 100644 inline a.txt\ndata 6\nnewer\n\n"
+            f"M 100644 inline c.txt\ndata 2\nc\n\n"
+        ), {})
+        self.assertEqual(commits, 2)
+
+        raw = self.git._read_raw("commit", tips["import"])
+        commit = json.loads(raw)
+        self.assertEqual(self.git.hash_object(raw.decode()), tips["import"])
+        self.assertEqual(list(commit["files"]), ["a.txt", "b.txt", "c.txt"])
+        self.assertEqual(self.git._read_object(commit["files"]["a.txt"]), "newer\n")
+        self.assertEqual(commit["files"]["b.txt"], blobs["b.txt"])
+        self.assertEqual(self.git._read_object(commit["files"]["c.txt"]), "c\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from pygit_api import PyGitError, Repository
+
+
+class SparseStashTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.repo = Repository(self.root)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.repo.git.init()
+        for path, text in {"top.txt": "top\n", "src/a.txt": "a\n", "docs/b.txt": "b\n"}.items():
+            (self.root / path).parent.mkdir(exist_ok=True)
+            (self.root / path).write_text(text)
+        self.repo.add(".")
+        self.head = self.repo.commit("Initial")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.repo.git.sparse_checkout("set", "src")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_clean_sparse_checkout_has_nothing_to_stash(self):
+        self.assertFalse((self.root / "docs/b.txt").exists())
+        with self.assertRaisesRegex(PyGitError, "No local changes to save"):
+            self.repo.stash_push()
+
+    def test_push_and_apply_round_trip(self):
+        (self.root / "src/a.txt").write_text("changed\n")
+        stash = self.repo.stash_push()
+        self.assertEqual((self.root / "src/a.txt").read_text(), "a\n")
+        # Files outside the cone are recorded as in HEAD, not as deleted
+        self.assertEqual(stash.files["docs/b.txt"], self.head.files["docs/b.txt"])
+        self.assertEqual(self.repo.stash_list()[0].hash, stash.hash)
+
+        self.repo.stash_pop()
+        self.assertEqual((self.root / "src/a.txt").read_text(), "changed\n")
+        self.assertFalse((self.root / "docs/b.txt").exists())
+        self.assertEqual(self.repo.status().modified, ["src/a.txt"])
+        self.assertEqual(self.repo.stash_list(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()